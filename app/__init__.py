@@ -1,22 +1,100 @@
+import asyncio
+import logging
 import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.db import connect_db, disconnect_db
+from fastapi.responses import ORJSONResponse
+from app.auth import password_pool
+from app.config import settings
+from app.repositories import storage
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.dataloader import DataLoaderMiddleware
+from app.middleware.drain import DrainMiddleware, requests_in_flight
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.request_id import RequestIdMiddleware
 from app.routes import register_routers
+from app.services.bulk_recompute import recompute_jobs
+from app.services.character_service import (
+    autosave_buffer,
+    character_history,
+    character_stats,
+    check_catalog_references,
+    event_hub,
+    sheet_cache,
+)
+from app.services.login_throttle import login_throttle
+from app.services.session_service import revocation_sync
+from app.services.user_import import import_pool
+from app.utils import metrics
+from app.utils.log import log_pipeline
+
+logger = logging.getLogger(__name__)
+
+
+def check_worker_settings() -> None:
+    """
+    Refuse to start several workers that would not see each other's writes: cached sheets, character
+    counts, live updates and bulk recompute progress travel between workers over the event broker, and
+    the memory backend lives inside one process.
+    """
+    if settings.WEB_CONCURRENCY <= 1:
+        return
+    if not settings.EVENT_BROKER_URL:
+        raise RuntimeError("WEB_CONCURRENCY > 1 needs EVENT_BROKER_URL, e.g. redis://localhost:6379/0")
+    if settings.STORAGE_BACKEND == "memory":
+        raise RuntimeError("The memory storage backend serves a single worker, set WEB_CONCURRENCY=1")
 
 
 def create_app() -> FastAPI:
+    log_pipeline.configure(
+        level=settings.LOG_LEVEL,
+        json=settings.LOG_JSON,
+        queue_size=settings.LOG_QUEUE_SIZE,
+        sample_rates=settings.LOG_SAMPLE_RATES,
+        rate_limits=settings.LOG_RATE_LIMITS,
+        levels={"prisma": settings.PRISMA_LOG_LEVEL},
+    )
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        # Load database using prisma
-        await connect_db()
+        check_worker_settings()
+        # Load database using prisma, with the connection pool opened up front
+        await storage.connect()
+        await check_catalog_references()  # Every stored sheet has to read back
+        await revocation_sync.start()
+        await autosave_buffer.start()
+        await character_stats.start()
+        await character_history.start()
+        await event_hub.start()
+        await sheet_cache.start()
+        await recompute_jobs.start()
         yield  # Pause here until application is shut down
+        # Let in-flight requests finish their queries before anything below goes away
+        if not await requests_in_flight.drain(settings.SHUTDOWN_DRAIN_SECONDS):
+            logger.warning(
+                "Shutting down with %d requests still in flight", requests_in_flight.count
+            )
+        await recompute_jobs.stop()  # Cancelled between chunks, its lastId lets a new job carry on
+        await event_hub.stop()
+        await sheet_cache.stop()
+        await character_stats.stop()
+        # Record versions of the last edits and write out buffered saves before the connection goes away
+        await character_history.stop()
+        await autosave_buffer.stop()
+        await revocation_sync.stop()
         # Disconnect prisma after use
-        await disconnect_db()
+        await storage.disconnect()
+        await login_throttle.store.close()
+        # Stop password hashing workers, waiting for a running hash would block the event loop
+        await asyncio.to_thread(password_pool.shutdown)
+        await asyncio.to_thread(import_pool.shutdown)
 
-    app = FastAPI(title="FastApi Prisma dnd API", lifespan=lifespan)
+    app = FastAPI(
+        title="FastApi Prisma dnd API",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,  # orjson encoding for plain dict responses
+    )
 
     origins = ["http://localhost:5173"]
 
@@ -27,6 +105,20 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+    if settings.METRICS_ENABLED:
+        metrics.enabled = True
+        app.add_middleware(
+            MetricsMiddleware, n_plus_one_threshold=settings.N_PLUS_ONE_THRESHOLD
+        )
+    app.add_middleware(DataLoaderMiddleware)
+    app.add_middleware(RequestIdMiddleware)
+    app.add_middleware(DrainMiddleware)  # Outermost, counts a request until its response is sent
     register_routers(app)
 
     return app
@@ -1,15 +1,107 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 import bcrypt
+from fastapi import HTTPException, status
+from app.config import settings
+from app.utils.metrics import timed
 
 
-def hash_password(password: str) -> str:
+def hash_password(password: str, rounds: int | None = None) -> str:
     """Hashes password"""
-    salt = bcrypt.gensalt()  # Generate salt
+    salt = bcrypt.gensalt(
+        rounds=rounds or settings.PASSWORD_HASH_ROUNDS
+    )  # Generate salt with configured cost factor
     hashed_password = bcrypt.hashpw(password.encode("utf-8"), salt)
     return hashed_password.decode("utf-8")  # Return hashed password as a string
 
 
+def hash_passwords(passwords: list[str], rounds: int | None = None) -> list[str]:
+    """Hashes a chunk of passwords in one pool job, one round trip to a worker process per chunk"""
+    return [hash_password(password, rounds) for password in passwords]
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password"""
     return bcrypt.checkpw(
         plain_password.encode("utf-8"), hashed_password.encode("utf-8")
     )
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Check if a stored hash was made with a different cost factor than the configured one"""
+    try:
+        rounds = int(hashed_password.split("$")[2])  # Format is $2b$<rounds>$<salt+hash>
+    except (IndexError, ValueError):
+        return True
+    return rounds != settings.PASSWORD_HASH_ROUNDS
+
+
+class PasswordPool:
+    """
+    Bounded executor for bcrypt work.
+
+    bcrypt takes hundreds of milliseconds per call, so running it inline in an async route blocks the
+    whole event loop. Jobs are handed to a thread or process pool instead, and once every worker is busy
+    and the waiting queue is full, new jobs are rejected with a 503 rather than piling up.
+    """
+
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown password pool kind: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0  # Jobs running or waiting in the executor
+        self.rejected = 0
+        self._executor: Executor | None = None
+
+    def _get_executor(self) -> Executor:
+        # Created lazily so importing the module does not spawn workers
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password"
+                )
+        return self._executor
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool, shedding load with a 503 when the queue is full"""
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_pool = PasswordPool(
+    kind=settings.PASSWORD_POOL_KIND,
+    workers=settings.PASSWORD_POOL_WORKERS,
+    max_queue=settings.PASSWORD_POOL_MAX_QUEUE,
+)
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash password on the password pool"""
+    with timed("bcrypt"):  # Queueing on the pool included, that is what the request waits for
+        return await password_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify password on the password pool"""
+    with timed("bcrypt"):
+        return await password_pool.run(verify_password, plain_password, hashed_password)
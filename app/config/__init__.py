@@ -11,6 +11,118 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRE_HOURS: int = 24  # default 24
     ENVIRONMENT: str = "development"
 
+    # Password hashing, bcrypt work runs on a bounded pool off the event loop
+    PASSWORD_HASH_ROUNDS: int = 12  # bcrypt cost factor, hashes below this are upgraded on login
+    PASSWORD_POOL_KIND: str = "thread"  # "thread" or "process"
+    PASSWORD_POOL_WORKERS: int = 4
+    PASSWORD_POOL_MAX_QUEUE: int = 64  # Waiting jobs allowed before shedding with 503
+
+    # Verified JWT cache, entries never outlive the token's own exp
+    TOKEN_CACHE_SIZE: int = 10000  # 0 disables the cache
+    TOKEN_CACHE_TTL_SECONDS: int = 300
+
+    # Character autosave write-behind buffer. Pending saves live in the worker process, so they are only
+    # buffered with WEB_CONCURRENCY=1, more workers write every save through. Set false for several replicas
+    AUTOSAVE_ENABLED: bool = True
+    AUTOSAVE_DEBOUNCE_SECONDS: float = 2.0  # Flush a character once it has been quiet this long
+    AUTOSAVE_MAX_DELAY_SECONDS: float = 10.0  # ...or this long after its first unsaved change
+    AUTOSAVE_MAX_PENDING: int = 500  # Flush everything once this many characters are dirty
+    AUTOSAVE_BATCH_SIZE: int = 100  # Characters written per transaction
+
+    # Serialised character sheet cache behind ETag / If-None-Match
+    SHEET_CACHE_MAX_ENTRIES: int = 5000
+    SHEET_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    SHEET_CACHE_TTL_SECONDS: float = 300  # How long an unread entry is kept
+
+    # Batched user lookups (DataLoader), concurrent lookups within one event loop tick share a query
+    USER_LOADER_MAX_BATCH_SIZE: int = 100  # Keys per query
+    USER_LOADER_TTL_SECONDS: float = 0.0  # Reuse results across requests this long, 0 only coalesces
+
+    # Sign-in throttling, checked before any bcrypt work. Limits are per worker unless THROTTLE_STORE_URL is set
+    LOGIN_THROTTLE_ENABLED: bool = True
+    LOGIN_IP_RATE_PER_MINUTE: float = 30
+    LOGIN_IP_BURST: int = 10
+    LOGIN_EMAIL_RATE_PER_MINUTE: float = 10
+    LOGIN_EMAIL_BURST: int = 5
+    LOGIN_BACKOFF_AFTER_FAILURES: int = 5  # Wrong passwords before an account backs off
+    LOGIN_BACKOFF_BASE_SECONDS: float = 1.0  # Doubles with every further failure
+    LOGIN_BACKOFF_MAX_SECONDS: float = 900
+    LOGIN_FAILURE_WINDOW_SECONDS: float = 900  # Failure count resets after this long without one
+    LOGIN_MAX_CONCURRENT_VERIFICATIONS: int = 8  # Password checks in flight per worker, 503 beyond
+    THROTTLE_STORE_URL: str | None = None  # None for in-process, redis://... to share limits across workers
+    THROTTLE_MAX_KEYS: int = 100_000  # In-process store, keys tracked before the least recent are dropped
+    THROTTLE_SHARDS: int = 16
+
+    # Bulk user import (POST /users/import and python -m app.services.user_import)
+    USER_IMPORT_TOKEN: str | None = None  # X-Import-Token the endpoint requires, None disables the endpoint
+    USER_IMPORT_BATCH_SIZE: int = 500  # Rows validated, hashed and inserted together
+    USER_IMPORT_POOL_KIND: str = "process"  # Hashing pool, separate from the sign-in pool
+    USER_IMPORT_WORKERS: int = 4
+    USER_IMPORT_MAX_ERRORS: int = 1000  # Row errors listed in the report, the rest are only counted
+
+    # Bulk recompute of derived stats (POST /characters/recompute and python -m app.services.bulk_recompute_cli)
+    BULK_RECOMPUTE_TOKEN: str | None = None  # X-Recompute-Token the endpoint requires, None disables it
+
+    # Character search
+    CHARACTER_SEARCH_FUZZY_THRESHOLD: float = 0.3  # Trigram similarity a fuzzy match needs, Postgres honours 0.3 and up
+
+    # Character statistics, counted in memory, shared between workers over EVENT_BROKER_URL and replaced
+    # from the database this often
+    CHARACTER_STATS_RECONCILE_SECONDS: float = 60
+
+    # Character sheet history, JSON Patch deltas between versions with a full snapshot every so often
+    HISTORY_ENABLED: bool = True
+    HISTORY_SNAPSHOT_EVERY: int = 20  # Deltas after a snapshot at most, the patches rebuilding a version applies
+    HISTORY_COALESCE_SECONDS: float = 30.0  # Record a version once a character has been quiet this long
+    HISTORY_MAX_DELAY_SECONDS: float = 300.0  # ...or this long after its first unrecorded save
+    HISTORY_RETENTION_DAYS: float = 90  # Versions older than this are dropped, the newest one is always kept
+    HISTORY_MAX_VERSIONS: int = 1000  # Per character, older ones are dropped
+    HISTORY_COMPACT_SECONDS: float = 3600  # Drop expired versions this often
+    HISTORY_CACHE_ENTRIES: int = 1000  # Newest version of recently saved characters, saves rebuilding it
+
+    # Classes, races and sizes characters reference by id, loaded once at startup
+    RULES_CATALOG_PATH: str | None = None  # JSON classes, races, sizes and retired ones, None for app/rules/catalog.json
+    RULES_CATALOG_MAX_AGE_SECONDS: int = 86400  # Cache-Control max-age of GET /rules, then ETag revalidation
+
+    # Refresh token sessions, revocations are checked in memory and synced between workers
+    SESSION_SYNC_SECONDS: float = 5.0  # Pull revocations from the database this often (EVENT_BROKER_URL pushes at once)
+    SESSION_CLEANUP_SECONDS: float = 3600  # Delete expired sessions this often
+
+    # Response compression and MessagePack bodies on character endpoints
+    COMPRESSION_MIN_SIZE: int = 1024  # Bytes, smaller bodies are sent uncompressed
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    MSGPACK_ENABLED: bool = True
+
+    # Live character updates over WebSockets
+    EVENT_BROKER_URL: str | None = None  # None for in-process only, redis://... to share events across workers
+    EVENT_QUEUE_SIZE: int = 256  # Undelivered events per connection before it is dropped as too slow
+
+    # Storage backend, "prisma" (Postgres) or "memory" (embedded, single worker only)
+    STORAGE_BACKEND: str = "prisma"
+    STORAGE_SNAPSHOT_PATH: str | None = None  # memory backend: append-only log replayed at start, None keeps nothing
+    STORAGE_FSYNC: bool = False  # memory backend: fsync every snapshot write
+
+    # Database pool and server processes. Postgres needs WEB_CONCURRENCY * DB_POOL_SIZE connections
+    DB_POOL_SIZE: int = 10  # Query engine connections per worker process
+    DB_POOL_TIMEOUT: float = 10  # Seconds a query waits for a free connection
+    DB_CONNECT_TIMEOUT: float = 5  # Seconds to open a database connection
+    DB_QUERY_TIMEOUT: float = 30  # Seconds before a query is abandoned
+    WEB_CONCURRENCY: int = 1  # uvicorn worker processes, more than 1 needs EVENT_BROKER_URL and Postgres
+    SHUTDOWN_DRAIN_SECONDS: float = 30  # In-flight requests get this long to finish on shutdown
+
+    # Request, query and span metrics served at /metrics in the Prometheus text format
+    METRICS_ENABLED: bool = True  # Off skips the middleware and every timer
+    N_PLUS_ONE_THRESHOLD: int = 10  # Same query shape this often in one request is logged as a likely N+1
+    PRISMA_LOG_LEVEL: str = "WARNING"  # DEBUG logs every query, development only
+
+    # Logging, records go through a bounded queue and are written by a background thread
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True  # One JSON object per line, False for plain text during development
+    LOG_QUEUE_SIZE: int = 10000  # Records waiting to be written before new ones are dropped
+    LOG_SAMPLE_RATES: dict[str, float] = {}  # Logger -> share of records below WARNING kept, e.g. {"prisma": 0.01}
+    LOG_RATE_LIMITS: dict[str, float] = {}  # Logger -> max records per second, e.g. {"uvicorn.access": 200}
+
     class Config:  # Configuration of Settings class
         env_file = ".env"  # env source for Settings class
 
@@ -1,15 +1,72 @@
-import logging
+import asyncio
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from prisma import Prisma
+from app.config import settings
+from app.utils import metrics
 
-logging.basicConfig(level=logging.INFO)
-logging.getLogger("prisma").setLevel(logging.DEBUG)
 
-db = Prisma()
+def pooled_url(url: str) -> str:
+    """
+    Add the query engine's pool parameters to a database URL.
+    Parameters already present in DATABASE_URL take precedence over Settings.
+    """
+    parts = urlsplit(url)
+    params = dict(parse_qsl(parts.query))
+    params.setdefault("connection_limit", str(settings.DB_POOL_SIZE))
+    params.setdefault("pool_timeout", f"{settings.DB_POOL_TIMEOUT:g}")
+    params.setdefault("connect_timeout", f"{settings.DB_CONNECT_TIMEOUT:g}")
+    return urlunsplit(parts._replace(query=urlencode(params)))
+
+
+class InstrumentedPrisma(Prisma):
+    """Prisma client timing every query into app.utils.metrics, used when METRICS_ENABLED"""
+
+    async def _execute(self, *, method, arguments, model=None, root_selection=None):
+        started = time.perf_counter()
+        try:
+            return await super()._execute(
+                method=method, arguments=arguments, model=model, root_selection=root_selection
+            )
+        finally:
+            elapsed = time.perf_counter() - started
+            model_name = model.__name__ if model is not None else "raw"
+            if "query" in arguments:  # Raw SQL, the text itself is the shape
+                shape = (method, arguments["query"])
+            else:  # Same model, method and filtered fields, whatever the values
+                shape = (method, model_name, tuple(sorted(arguments.get("where") or ())))
+            metrics.record_query(method, model_name, shape, elapsed)
+
+
+db = (InstrumentedPrisma if settings.METRICS_ENABLED else Prisma)(
+    datasource={"url": pooled_url(settings.DATABASE_URL)},
+    http={"timeout": settings.DB_QUERY_TIMEOUT},  # Requests to the query engine, i.e. per query
+)
 
 
 async def connect_db():
-    """Connect to Prisma database."""
+    """Connect to Prisma database and open the pool's connections up front."""
     await db.connect()
+    await warm_pool()
+
+
+async def warm_pool() -> None:
+    """
+    Run DB_POOL_SIZE concurrent queries so the engine opens every pooled connection now,
+    instead of the first requests after a deploy paying for it.
+    """
+    await asyncio.gather(*(db.query_raw("SELECT 1") for _ in range(settings.DB_POOL_SIZE)))
+
+
+async def ping(timeout: float) -> bool:
+    """True if the database answers a trivial query within timeout seconds"""
+    if not db.is_connected():
+        return False
+    try:
+        await asyncio.wait_for(db.query_raw("SELECT 1"), timeout=timeout)
+        return True
+    except Exception:
+        return False
 
 
 async def disconnect_db():
@@ -0,0 +1,116 @@
+import gzip
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.services.sheet_cache import coded_etag
+
+try:  # Optional, gzip only without it
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+def _accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """Parse Accept-Encoding into encoding -> q value"""
+    encodings = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            encodings[name.strip().lower()] = quality
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    Negotiated brotli / gzip response compression.
+
+    Brotli is preferred when the client accepts it and the brotli package is installed, gzip otherwise.
+    Bodies below minimum_size, already encoded responses and streaming responses are passed through as is.
+    The ETag of a compressed response gets the encoding appended ('"abc"' -> '"abc-br"') since the bytes
+    on the wire differ per encoding, so a strong ETag stays strong. A 304 answering an If-None-Match
+    carrying that form echoes it back, and If-None-Match handling maps it to the identity form's ETag.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose(self, accept_encoding: str) -> str | None:
+        accepted = _accepted_encodings(accept_encoding)
+        if brotli is not None and accepted.get("br", 0) > 0:
+            return "br"
+        if accepted.get("gzip", 0) > 0:
+            return "gzip"
+        return None
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        # No timestamp in the header, the same body always compresses to the same bytes behind its ETag
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = self._choose(request_headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Message | None = None
+        started = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, started
+            if message["type"] == "http.response.start":
+                start_message = message  # Hold until the body size is known
+                return
+            if message["type"] != "http.response.body" or started:
+                await send(message)
+                return
+
+            started = True
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            etag = headers.get("etag")
+            if start_message["status"] == 304 and etag:
+                # The client revalidated the compressed form it holds, answer with that form's ETag
+                if coded_etag(etag, encoding) in request_headers.get("if-none-match", ""):
+                    headers["ETag"] = coded_etag(etag, encoding)
+                    headers.add_vary_header("Accept-Encoding")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+            ):
+                await send(start_message)
+                await send(message)
+                return
+
+            body = self._compress(encoding, body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            if etag:
+                headers["ETag"] = coded_etag(etag, encoding)
+            message["body"] = body
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
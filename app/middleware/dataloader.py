@@ -0,0 +1,19 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.utils.dataloader import loader_scope
+
+
+class DataLoaderMiddleware:
+    """
+    Gives every HTTP request its own set of DataLoaders, so lookups repeated or run concurrently while
+    handling it are batched and fetched once. WebSocket connections live too long for a request cache.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with loader_scope():
+            await self.app(scope, receive, send)
@@ -0,0 +1,54 @@
+import asyncio
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class InFlightRequests:
+    """Count of HTTP requests being handled, so shutdown can wait for them before closing the database"""
+
+    def __init__(self):
+        self.count = 0
+        self.draining = False  # Set at shutdown, readiness reports not ready from then on
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def started(self) -> None:
+        self.count += 1
+        self._idle.clear()
+
+    def finished(self) -> None:
+        self.count -= 1
+        if self.count == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop reporting ready and wait for in-flight requests, False if some were still running at timeout"""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+requests_in_flight = InFlightRequests()
+
+
+class DrainMiddleware:
+    """
+    Tracks in-flight HTTP requests in an InFlightRequests.
+    WebSocket connections are long lived and not counted, they are closed by the server at shutdown.
+    """
+
+    def __init__(self, app: ASGIApp, tracker: InFlightRequests = requests_in_flight) -> None:
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.tracker.started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.tracker.finished()
@@ -0,0 +1,73 @@
+import logging
+import time
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.utils import metrics
+from app.utils.metrics import RequestStats, current_request
+
+logger = logging.getLogger(__name__)
+
+
+def _route(scope: Scope) -> str:
+    """Route template, e.g. /characters/{character_id}, so paths with ids share one series"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    Per-route latency, status codes and in-flight requests, plus each request's database queries.
+
+    Every response carries a Server-Timing header with the request's db, bcrypt and jwt spans.
+    A request running the same query shape n_plus_one_threshold times or more is logged as a likely N+1.
+    """
+
+    def __init__(self, app: ASGIApp, n_plus_one_threshold: int = 10) -> None:
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+        metrics.http_in_flight.inc()
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timings = [f'db;dur={stats.db_seconds * 1e3:.1f};desc="{stats.db_queries} queries"']
+                timings.extend(f"{name};dur={seconds * 1e3:.1f}" for name, seconds in stats.spans.items())
+                MutableHeaders(scope=message).append("Server-Timing", ", ".join(timings))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            metrics.http_in_flight.dec()
+            method, route = scope["method"], _route(scope)
+            metrics.http_latency.observe(elapsed, (method, route))
+            metrics.http_requests.inc((method, route, str(status_code)))
+            metrics.db_queries_per_request.observe(stats.db_queries, (route,))
+            repeated = [
+                (shape, count)
+                for shape, count in stats.query_shapes.items()
+                if count >= self.n_plus_one_threshold
+            ]
+            if repeated:
+                metrics.db_n_plus_one.inc((route,))
+                shape, count = max(repeated, key=lambda item: item[1])
+                logger.warning(
+                    "Possible N+1 on %s %s: %s ran %d times in one request",
+                    method,
+                    route,
+                    shape,
+                    count,
+                )
@@ -0,0 +1,5 @@
+-- CreateIndex
+CREATE INDEX "User_created_at_id_idx" ON "User"("created_at", "id");
+
+-- CreateIndex
+CREATE INDEX "Character_userId_createdAt_id_idx" ON "Character"("userId", "createdAt", "id");
@@ -0,0 +1,27 @@
+-- CreateTable
+CREATE TABLE "RefreshSession" (
+    "id" UUID NOT NULL,
+    "familyId" UUID NOT NULL,
+    "userId" UUID NOT NULL,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "expiresAt" TIMESTAMP(3) NOT NULL,
+    "usedAt" TIMESTAMP(3),
+    "revokedAt" TIMESTAMP(3),
+
+    CONSTRAINT "RefreshSession_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "RefreshSession_familyId_idx" ON "RefreshSession"("familyId");
+
+-- CreateIndex
+CREATE INDEX "RefreshSession_userId_idx" ON "RefreshSession"("userId");
+
+-- CreateIndex
+CREATE INDEX "RefreshSession_revokedAt_idx" ON "RefreshSession"("revokedAt");
+
+-- CreateIndex
+CREATE INDEX "RefreshSession_expiresAt_idx" ON "RefreshSession"("expiresAt");
+
+-- AddForeignKey
+ALTER TABLE "RefreshSession" ADD CONSTRAINT "RefreshSession_userId_fkey" FOREIGN KEY ("userId") REFERENCES "User"("id") ON DELETE CASCADE ON UPDATE CASCADE;
@@ -0,0 +1,16 @@
+-- Trigram similarity for fuzzy name search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- CreateIndex
+-- Prefix search and keyset order of names. C collation compares bytes, so LIKE 'prefix%' can use it
+CREATE INDEX "Character_name_search_idx" ON "Character"((lower("characterName") COLLATE "C"), "id");
+
+-- CreateIndex
+-- Fuzzy name search, candidates for the % similarity operator
+CREATE INDEX "Character_name_trgm_idx" ON "Character" USING GIN (lower("characterName") gin_trgm_ops);
+
+-- CreateIndex
+CREATE INDEX "Character_class_level_idx" ON "Character"("class", "level");
+
+-- CreateIndex
+CREATE INDEX "Character_race_level_idx" ON "Character"("race", "level");
@@ -0,0 +1,14 @@
+-- CreateTable
+CREATE TABLE "CharacterVersion" (
+    "characterId" UUID NOT NULL,
+    "version" INTEGER NOT NULL,
+    "snapshot" BOOLEAN NOT NULL,
+    "data" JSONB NOT NULL,
+    "size" INTEGER NOT NULL,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "CharacterVersion_pkey" PRIMARY KEY ("characterId","version")
+);
+
+-- AddForeignKey
+ALTER TABLE "CharacterVersion" ADD CONSTRAINT "CharacterVersion_characterId_fkey" FOREIGN KEY ("characterId") REFERENCES "Character"("id") ON DELETE CASCADE ON UPDATE CASCADE;
@@ -0,0 +1,34 @@
+from app.config import settings
+from app.repositories.base import DuplicateError, Storage
+
+""" Storage backend selected by Settings.STORAGE_BACKEND, services reach users and characters through it """
+
+
+def create_storage(backend: str) -> Storage:
+    if backend == "prisma":
+        from app.repositories.prisma_backend import PrismaStorage
+
+        return PrismaStorage()
+    if backend == "memory":
+        from app.repositories.memory import MemoryStorage
+
+        return MemoryStorage(settings.STORAGE_SNAPSHOT_PATH, fsync=settings.STORAGE_FSYNC)
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}, expected 'prisma' or 'memory'")
+
+
+storage = create_storage(settings.STORAGE_BACKEND)
+users = storage.users
+characters = storage.characters
+sessions = storage.sessions
+character_versions = storage.character_versions
+
+__all__ = [
+    "DuplicateError",
+    "Storage",
+    "character_versions",
+    "characters",
+    "create_storage",
+    "sessions",
+    "storage",
+    "users",
+]
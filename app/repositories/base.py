@@ -0,0 +1,334 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
+
+""" Storage interfaces for users and characters, implemented by the Prisma and in-memory backends """
+
+# Columns search results carry, the denormalised summary of a character
+SEARCH_COLUMNS = ("id", "userId", "characterName", "characterClass", "race", "level")
+
+# Columns characters are counted by for statistics
+AGGREGATE_COLUMNS = ("characterClass", "race", "level", "userId")
+
+# Character columns holding a State section (or the inventory) as JSON
+JSON_COLUMNS = ("characterDetails", "stats", "status", "bonuses", "savingThrows", "skills", "inventory")
+
+
+class DuplicateError(ValueError):
+    """A unique field (user email or oauth_id) is already taken"""
+
+
+@dataclass
+class UserRecord:
+    """A stored user. The Prisma backend returns its generated User model, which has the same fields"""
+
+    id: str
+    username: str
+    email: str
+    password: str | None
+    oauth_provider: str
+    oauth_id: str | None
+    created_at: datetime
+    updated_at: datetime
+
+
+@dataclass
+class CharacterRecord:
+    """A stored character, JSON columns as plain dicts. Prisma returns its Character model instead"""
+
+    id: str
+    userId: str
+    characterName: str
+    characterClass: str
+    race: str
+    level: int
+    characterDetails: dict
+    stats: dict
+    status: dict
+    bonuses: dict
+    savingThrows: dict
+    skills: dict
+    createdAt: datetime
+    updatedAt: datetime
+    inventory: dict | None = field(default=None)
+
+
+@dataclass
+class CharacterFilters:
+    """Exact matches on the denormalised search columns, None matches anything"""
+
+    characterClass: str | None = None
+    race: str | None = None
+    min_level: int | None = None
+    max_level: int | None = None
+    userId: str | None = None
+
+    def matches(self, row: dict) -> bool:
+        return (
+            (self.characterClass is None or row["characterClass"] == self.characterClass)
+            and (self.race is None or row["race"] == self.race)
+            and (self.min_level is None or row["level"] >= self.min_level)
+            and (self.max_level is None or row["level"] <= self.max_level)
+            and (self.userId is None or row["userId"] == self.userId)
+        )
+
+
+@dataclass
+class SessionRecord:
+    """A refresh token. Tokens rotated from the same sign-in share a family"""
+
+    id: str
+    familyId: str
+    userId: str
+    createdAt: datetime
+    expiresAt: datetime
+    usedAt: datetime | None = None
+    revokedAt: datetime | None = None
+
+
+class UserRepository(ABC):
+    """
+    Contract every backend keeps:
+    - create() assigns id, created_at and updated_at and raises DuplicateError for a taken email or oauth_id.
+    - find_* return None when nothing matches, never raise.
+    - list_page() orders by (created_at, id) and returns up to limit rows strictly after the cursor key,
+      as dicts holding the requested fields plus created_at and id. Never the password.
+    """
+
+    @abstractmethod
+    async def create(self, data: dict):
+        ...
+
+    @abstractmethod
+    async def find_by_id(self, user_id: str):
+        ...
+
+    @abstractmethod
+    async def find_by_email(self, email: str):
+        ...
+
+    @abstractmethod
+    async def find_by_username(self, username: str):
+        ...
+
+    @abstractmethod
+    async def find_by_oauth_id(self, oauth_id: str):
+        ...
+
+    @abstractmethod
+    async def find_many(self, field: str, values: list[str]) -> list:
+        """
+        Users whose field (id, email, username or oauth_id) is one of values, in one query and in no
+        particular order. Missing values are simply absent from the result.
+        """
+
+    @abstractmethod
+    async def find_conflicts(self, emails: list[str], oauth_ids: list[str]) -> list:
+        """Users holding any of these emails or oauth_ids, in one query"""
+
+    @abstractmethod
+    async def create_many(self, rows: list[dict]) -> list[str]:
+        """
+        Insert rows in one statement, each with its id already assigned. A row whose email or
+        oauth_id is taken by then is skipped instead of failing the rest. Returns the inserted ids.
+        """
+
+    @abstractmethod
+    async def update(self, user_id: str, data: dict):
+        """Update fields and updated_at, returns the user or None if it does not exist"""
+
+    @abstractmethod
+    async def list_page(
+        self, limit: int, after: tuple[str, str] | None, fields: list[str]
+    ) -> list[dict]:
+        ...
+
+
+class CharacterRepository(ABC):
+    """
+    Contract every backend keeps:
+    - JSON columns are taken and returned as plain Python values, every read returns fresh objects
+      the caller may mutate.
+    - create() assigns id, createdAt and updatedAt, writes bump updatedAt.
+    - Writes to a character that no longer exists are ignored (update, update_many) or reported
+      (delete returns False), never raised, a concurrent delete is not an error.
+    - list_page() orders a user's characters by (createdAt, id) and returns up to limit rows strictly
+      after the cursor key, as dicts holding the requested fields plus createdAt and id.
+    """
+
+    @abstractmethod
+    async def create(self, data: dict):
+        ...
+
+    @abstractmethod
+    async def find_by_id(self, character_id: str):
+        ...
+
+    @abstractmethod
+    async def owner_of(self, character_id: str) -> str | None:
+        """userId of a character, None if it does not exist"""
+
+    @abstractmethod
+    async def get_column(self, character_id: str, column: str) -> tuple[str, object] | None:
+        """(userId, value of one column) or None if the character does not exist"""
+
+    @abstractmethod
+    async def list_page(
+        self, user_id: str, limit: int, after: tuple[str, str] | None, fields: list[str]
+    ) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def search(
+        self,
+        name: str | None,
+        fuzzy: bool,
+        filters: CharacterFilters,
+        limit: int,
+        after: tuple | None,
+        threshold: float,
+    ) -> list[dict]:
+        """
+        Up to limit characters matching filters, as dicts of SEARCH_COLUMNS plus their sort key, strictly
+        after the cursor key. Never touches the JSON columns.
+
+        - Prefix (fuzzy False): names starting with name, case-insensitive (any name when None), in
+          (nameKey, id) order where nameKey is the lowercased name.
+        - Fuzzy: names whose trigram similarity to name is at least threshold, by (score descending, id).
+        """
+
+    @abstractmethod
+    async def aggregate(self) -> dict:
+        """
+        Character counts in one pass over the summary columns:
+        {"total": n, "characterClass": {value: n}, "race": {...}, "level": {...}, "userId": {...}}
+        """
+
+    @abstractmethod
+    async def catalog_references(self, fields: list[str]) -> dict[str, set[str]]:
+        """Distinct string values of these characterDetails fields, the rules catalog ids rows reference"""
+
+    @abstractmethod
+    async def scan(
+        self, after_id: str | None, limit: int, columns: list[str], user_id: str | None = None
+    ) -> list[dict]:
+        """Characters in id order after after_id, as dicts of id plus the given columns, for batch jobs"""
+
+    @abstractmethod
+    async def update(self, character_id: str, columns: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def update_many(self, changes: list[tuple[str, dict]]) -> None:
+        """Apply (id, columns) changes atomically, all or none"""
+
+    @abstractmethod
+    async def delete(self, character_id: str) -> bool:
+        ...
+
+
+class SessionRepository(ABC):
+    """
+    Contract every backend keeps:
+    - rotate() is atomic: of any number of concurrent rotations of one session at most one succeeds.
+    - A revocation covers the whole family and is visible to revoked_since() from then on.
+    """
+
+    @abstractmethod
+    async def create(self, data: dict):
+        """Store a session with the given id, familyId, userId and expiresAt. DuplicateError for a taken id"""
+
+    @abstractmethod
+    async def find_by_id(self, session_id: str):
+        ...
+
+    @abstractmethod
+    async def rotate(self, session_id: str, data: dict) -> bool:
+        """
+        Mark a session used and create its successor, only if it was neither used nor revoked yet.
+        False means nothing was written, the token is being replayed or was revoked.
+        """
+
+    @abstractmethod
+    async def revoke_family(self, family_id: str) -> datetime | None:
+        """Revoke every session of a family, returns when its newest token expires (None if unknown)"""
+
+    @abstractmethod
+    async def revoke_user(self, user_id: str) -> list[tuple[str, datetime]]:
+        """Revoke every session of a user, returns (familyId, expiresAt) of each family revoked"""
+
+    @abstractmethod
+    async def revoked_since(self, since: datetime) -> list[tuple[str, datetime]]:
+        """(familyId, expiresAt) of families revoked at or after since whose tokens have not expired"""
+
+    @abstractmethod
+    async def delete_expired(self, before: datetime) -> int:
+        ...
+
+
+class CharacterVersionRepository(ABC):
+    """
+    Contract every backend keeps:
+    - A version's data is the whole sheet when snapshot is set, otherwise the JSON Patch operations
+      turning the previous version into it.
+    - Versions are returned as dicts of version, snapshot, data, size (bytes of data) and createdAt.
+    - The versions of a deleted character go with it.
+    """
+
+    @abstractmethod
+    async def append(self, row: dict) -> None:
+        """
+        Store a version given characterId, version, snapshot, data and size, createdAt is assigned.
+
+        Raises:
+            DuplicateError: If the character already has this version, another worker recorded it first.
+        """
+
+    @abstractmethod
+    async def chain(self, character_id: str, version: int | None = None) -> list[dict]:
+        """
+        What rebuilding a version (the newest if None) takes, oldest first: the closest snapshot at or
+        before it and every delta after that up to the version. Empty if there is no such snapshot.
+        """
+
+    @abstractmethod
+    async def list_page(self, character_id: str, limit: int, before: int | None) -> list[dict]:
+        """Versions older than before (newest first), without their data"""
+
+    @abstractmethod
+    async def compaction_candidates(
+        self, cutoff: datetime, max_versions: int, limit: int
+    ) -> list[tuple[str, int]]:
+        """
+        (character id, oldest version to keep) of characters with versions to drop: versions recorded
+        before cutoff or more than max_versions behind the newest. The newest one is always kept.
+        """
+
+    @abstractmethod
+    async def compact(self, character_id: str, floor: int, sheet: dict, size: int) -> int:
+        """Store version floor as a snapshot of sheet and delete the versions before it, returns how many"""
+
+    @abstractmethod
+    async def usage(self) -> dict:
+        """Counts of characters, versions and snapshots, bytes held by snapshots and by deltas"""
+
+
+class Storage(ABC):
+    """A backend: its repositories plus connection lifecycle"""
+
+    users: UserRepository
+    characters: CharacterRepository
+    sessions: SessionRepository
+    character_versions: CharacterVersionRepository
+
+    @abstractmethod
+    async def connect(self) -> None:
+        ...
+
+    @abstractmethod
+    async def disconnect(self) -> None:
+        ...
+
+    @abstractmethod
+    async def ping(self, timeout: float) -> bool:
+        """True if the backend can serve queries"""
@@ -0,0 +1,715 @@
+import logging
+import os
+import uuid
+from bisect import bisect_right, insort
+from collections import Counter
+from operator import itemgetter
+from typing import Callable
+from dataclasses import asdict, replace
+from datetime import datetime, timezone
+import orjson
+from app.repositories.base import (
+    AGGREGATE_COLUMNS,
+    JSON_COLUMNS,
+    SEARCH_COLUMNS,
+    CharacterFilters,
+    CharacterRecord,
+    CharacterRepository,
+    CharacterVersionRepository,
+    DuplicateError,
+    SessionRecord,
+    SessionRepository,
+    Storage,
+    UserRecord,
+    UserRepository,
+)
+from app.utils.search import NameIndex, name_key
+
+""" Embedded in-process storage for single node deployments, tests and benchmarks """
+
+logger = logging.getLogger(__name__)
+
+_USER_DATES = ("created_at", "updated_at")
+_CHARACTER_DATES = ("createdAt", "updatedAt")
+_SESSION_DATES = ("createdAt", "expiresAt", "usedAt", "revokedAt")
+_FILTER_COLUMNS = ("characterClass", "race")  # Exact search filters with an id set per value
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _cursor_key(after: tuple[str, str]) -> tuple[datetime, str]:
+    created_at, row_id = after
+    created = datetime.fromisoformat(created_at)
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return created, row_id
+
+
+class SnapshotLog:
+    """
+    Optional durability: every change is appended to a JSON lines file and replayed at start.
+    Replaying compacts the file into one line per live row, so it does not grow without bound.
+    """
+
+    def __init__(self, path: str | None, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self._file = None
+
+    def append(self, entry: dict) -> None:
+        if self._file is None:
+            return
+        self._file.write(orjson.dumps(entry, default=str) + b"\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def replay(self) -> list[dict]:
+        if not self.path or not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, "rb") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    entries.append(orjson.loads(line))
+                except orjson.JSONDecodeError:  # Torn last write after a crash
+                    logger.warning("Skipping unreadable snapshot line %d in %s", number, self.path)
+        return entries
+
+    def open(self, live_entries: list[dict]) -> None:
+        """Rewrite the file as just the live rows, then keep appending to it"""
+        if not self.path:
+            return
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "wb") as f:
+            for entry in live_entries:
+                f.write(orjson.dumps(entry, default=str) + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self._file = open(self.path, "ab")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class MemoryUserRepository(UserRepository):
+    """Users by id, with unique indexes on email and oauth_id and a (created_at, id) ordered index"""
+
+    def __init__(self, log: SnapshotLog):
+        self._log = log
+        self._rows: dict[str, UserRecord] = {}
+        self._by_email: dict[str, str] = {}
+        self._by_oauth_id: dict[str, str] = {}
+        self._by_username: dict[str, set[str]] = {}
+        self._ordered: list[tuple[datetime, str]] = []
+
+    def _index(self, user: UserRecord) -> None:
+        self._rows[user.id] = user
+        self._by_email[user.email] = user.id
+        if user.oauth_id:
+            self._by_oauth_id[user.oauth_id] = user.id
+        self._by_username.setdefault(user.username, set()).add(user.id)
+
+    def _unindex(self, user: UserRecord) -> None:
+        self._by_email.pop(user.email, None)
+        if user.oauth_id:
+            self._by_oauth_id.pop(user.oauth_id, None)
+        self._by_username.get(user.username, set()).discard(user.id)
+
+    def _check_unique(self, user_id: str | None, email: str, oauth_id: str | None) -> None:
+        if self._by_email.get(email, user_id) != user_id:
+            raise DuplicateError("Email already in use")
+        if oauth_id and self._by_oauth_id.get(oauth_id, user_id) != user_id:
+            raise DuplicateError("OAuth account already linked")
+
+    def load(self, row: dict) -> None:
+        """Restore a logged user, a later entry for the same id replaces the earlier one"""
+        for key in _USER_DATES:
+            row[key] = datetime.fromisoformat(row[key])
+        user = UserRecord(**row)
+        previous = self._rows.get(user.id)
+        if previous is not None:
+            self._unindex(previous)
+        else:
+            insort(self._ordered, (user.created_at, user.id))
+        self._index(user)
+
+    async def create(self, data: dict):
+        self._check_unique(None, data["email"], data.get("oauth_id"))
+        now = _now()
+        user = UserRecord(
+            id=str(uuid.uuid4()),
+            username=data["username"],
+            email=data["email"],
+            password=data.get("password"),
+            oauth_provider=data.get("oauth_provider") or "manual",
+            oauth_id=data.get("oauth_id"),
+            created_at=now,
+            updated_at=now,
+        )
+        self._index(user)
+        insort(self._ordered, (user.created_at, user.id))
+        self._log.append({"user": asdict(user)})
+        return replace(user)
+
+    async def find_by_id(self, user_id: str):
+        user = self._rows.get(user_id)
+        return replace(user) if user else None
+
+    async def find_by_email(self, email: str):
+        return await self.find_by_id(self._by_email.get(email))
+
+    async def find_by_username(self, username: str):
+        ids = self._by_username.get(username)
+        return await self.find_by_id(next(iter(ids))) if ids else None
+
+    async def find_by_oauth_id(self, oauth_id: str):
+        return await self.find_by_id(self._by_oauth_id.get(oauth_id))
+
+    async def find_many(self, field: str, values: list[str]) -> list:
+        if field == "id":
+            ids = values
+        elif field == "email":
+            ids = [self._by_email.get(value) for value in values]
+        elif field == "oauth_id":
+            ids = [self._by_oauth_id.get(value) for value in values]
+        elif field == "username":
+            ids = [user_id for value in values for user_id in self._by_username.get(value, ())]
+        else:
+            raise ValueError(f"Unknown lookup field {field}")
+        return [
+            replace(self._rows[user_id]) for user_id in dict.fromkeys(ids) if user_id in self._rows
+        ]
+
+    async def find_conflicts(self, emails: list[str], oauth_ids: list[str]) -> list:
+        ids = [self._by_email.get(email) for email in emails]
+        ids += [self._by_oauth_id.get(oauth_id) for oauth_id in oauth_ids]
+        return [
+            replace(self._rows[user_id]) for user_id in dict.fromkeys(ids) if user_id in self._rows
+        ]
+
+    async def create_many(self, rows: list[dict]) -> list[str]:
+        inserted = []
+        for row in rows:
+            try:
+                self._check_unique(None, row["email"], row.get("oauth_id"))
+            except DuplicateError:
+                continue
+            now = _now()
+            user = UserRecord(
+                id=row["id"],
+                username=row["username"],
+                email=row["email"],
+                password=row.get("password"),
+                oauth_provider=row.get("oauth_provider") or "manual",
+                oauth_id=row.get("oauth_id"),
+                created_at=now,
+                updated_at=now,
+            )
+            self._index(user)
+            insort(self._ordered, (user.created_at, user.id))
+            self._log.append({"user": asdict(user)})
+            inserted.append(user.id)
+        return inserted
+
+    async def update(self, user_id: str, data: dict):
+        user = self._rows.get(user_id)
+        if user is None:
+            return None
+        updated = replace(user, **data, updated_at=_now())
+        self._check_unique(user_id, updated.email, updated.oauth_id)
+        self._unindex(user)
+        self._index(updated)
+        self._log.append({"user": asdict(updated)})
+        return replace(updated)
+
+    async def list_page(self, limit, after, fields):
+        start = bisect_right(self._ordered, _cursor_key(after)) if after else 0
+        rows = []
+        for _, user_id in self._ordered[start : start + limit]:
+            user = self._rows[user_id]
+            rows.append({key: getattr(user, key) for key in (*fields, "created_at", "id")})
+        return rows
+
+    def live_entries(self) -> list[dict]:
+        return [{"user": asdict(user)} for user in self._rows.values()]
+
+
+class MemoryCharacterRepository(CharacterRepository):
+    """
+    Characters by id with a per-user (createdAt, id) ordered index, and for search a name index plus
+    id sets per class and per race.
+    JSON columns are held serialised, every read decodes fresh objects the caller is free to mutate.
+    """
+
+    def __init__(self, log: SnapshotLog):
+        self._log = log
+        self._rows: dict[str, dict] = {}  # id -> columns, JSON columns as bytes
+        self._by_user: dict[str, list[tuple[datetime, str]]] = {}
+        self._names = NameIndex()
+        self._by_value: dict[tuple[str, str], set[str]] = {}  # (column, value) -> ids
+        self.on_delete: Callable[[str], None] | None = None  # Cascades to rows referencing the character
+
+    @staticmethod
+    def _encode(columns: dict) -> dict:
+        # Copied out, orjson's bytes keep its whole output buffer (4 KB and up) allocated
+        return {
+            column: memoryview(orjson.dumps(value)).tobytes() if column in JSON_COLUMNS else value
+            for column, value in columns.items()
+        }
+
+    @staticmethod
+    def _decode(row: dict, columns) -> dict:
+        decoded = {}
+        for column in columns:
+            value = row.get(column)
+            if column in JSON_COLUMNS and value is not None:
+                value = orjson.loads(value)
+            decoded[column] = value
+        return decoded
+
+    def _index_search(self, row: dict) -> None:
+        self._names.add(row["id"], row["characterName"])
+        for column in _FILTER_COLUMNS:
+            self._by_value.setdefault((column, row[column]), set()).add(row["id"])
+
+    def _unindex_search(self, row: dict) -> None:
+        self._names.remove(row["id"])
+        for column in _FILTER_COLUMNS:
+            ids = self._by_value.get((column, row[column]))
+            if ids is not None:
+                ids.discard(row["id"])
+                if not ids:
+                    del self._by_value[(column, row[column])]
+
+    def _record(self, row: dict) -> CharacterRecord:
+        return CharacterRecord(**self._decode(row, row.keys()))
+
+    def _log_row(self, row: dict) -> dict:
+        return {"character": self._decode(row, row.keys())}
+
+    def load(self, row: dict) -> None:
+        """Restore a logged character"""
+        for key in _CHARACTER_DATES:
+            row[key] = datetime.fromisoformat(row[key])
+        self.unload(row["id"])
+        row = self._encode(row)
+        self._rows[row["id"]] = row
+        insort(self._by_user.setdefault(row["userId"], []), (row["createdAt"], row["id"]))
+        self._index_search(row)
+
+    def load_update(self, character_id: str, columns: dict, updated_at: str) -> None:
+        """Restore a logged partial update"""
+        row = self._rows.get(character_id)
+        if row is not None:
+            self._unindex_search(row)
+            row.update(self._encode(columns))
+            row["updatedAt"] = datetime.fromisoformat(updated_at)
+            self._index_search(row)
+
+    def unload(self, character_id: str) -> None:
+        row = self._rows.pop(character_id, None)
+        if row is None:
+            return
+        self._unindex_search(row)
+        ordered = self._by_user.get(row["userId"], [])
+        key = (row["createdAt"], character_id)
+        index = bisect_right(ordered, key) - 1
+        if index >= 0 and ordered[index] == key:
+            del ordered[index]
+
+    async def create(self, data: dict):
+        now = _now()
+        row = self._encode(
+            {"inventory": None, **data, "id": str(uuid.uuid4()), "createdAt": now, "updatedAt": now}
+        )
+        self._rows[row["id"]] = row
+        insort(self._by_user.setdefault(row["userId"], []), (now, row["id"]))
+        self._index_search(row)
+        self._log.append(self._log_row(row))
+        return self._record(row)
+
+    async def find_by_id(self, character_id: str):
+        row = self._rows.get(character_id)
+        return self._record(row) if row else None
+
+    async def owner_of(self, character_id: str) -> str | None:
+        row = self._rows.get(character_id)
+        return row["userId"] if row else None
+
+    async def get_column(self, character_id: str, column: str):
+        row = self._rows.get(character_id)
+        if row is None:
+            return None
+        return row["userId"], self._decode(row, [column])[column]
+
+    async def list_page(self, user_id, limit, after, fields):
+        ordered = self._by_user.get(user_id, [])
+        start = bisect_right(ordered, _cursor_key(after)) if after else 0
+        columns = list(dict.fromkeys([*fields, "createdAt", "id"]))
+        return [
+            self._decode(self._rows[character_id], columns)
+            for _, character_id in ordered[start : start + limit]
+        ]
+
+    def _prefix_ids(self, prefix: str, filters: CharacterFilters, after):
+        """
+        Candidate ids in (nameKey, id) order. Walks the name index unless an exact filter narrows
+        things to under 1/64 of all characters, then that set is sorted instead: either way at most
+        about 64 rows are looked at per result.
+        """
+        sets = [
+            self._by_value.get((column, value), set())
+            for column, value in (("characterClass", filters.characterClass), ("race", filters.race))
+            if value is not None
+        ]
+        if filters.userId is not None:
+            sets.append({character_id for _, character_id in self._by_user.get(filters.userId, [])})
+        smallest = min(sets, key=len) if sets else None
+        if smallest is None or len(smallest) * 64 >= len(self._names):
+            return self._names.prefixed(prefix, after)
+        prefix = name_key(prefix)
+        keyed = sorted((self._names.key_of(character_id), character_id) for character_id in smallest)
+        return (
+            character_id
+            for key, character_id in keyed
+            if key.startswith(prefix) and (after is None or (key, character_id) > after)
+        )
+
+    async def search(self, name, fuzzy, filters, limit, after, threshold):
+        if fuzzy:
+            scored = self._names.fuzzy(name, threshold)
+            if after:
+                scored = [(s, i) for s, i in scored if (-s, i) > (-after[0], after[1])]
+            candidates = ((character_id, {"score": score}) for score, character_id in scored)
+        else:
+            candidates = (
+                (character_id, {"nameKey": self._names.key_of(character_id)})
+                for character_id in self._prefix_ids(name or "", filters, after)
+            )
+        rows = []
+        for character_id, key in candidates:
+            row = self._rows[character_id]
+            if filters.matches(row):
+                rows.append({**self._decode(row, SEARCH_COLUMNS), **key})
+                if len(rows) == limit:
+                    break
+        return rows
+
+    async def aggregate(self) -> dict:
+        counts = {column: Counter() for column in AGGREGATE_COLUMNS}
+        for row in self._rows.values():
+            for column, counter in counts.items():
+                counter[row[column]] += 1
+        return {"total": len(self._rows), **{column: dict(c) for column, c in counts.items()}}
+
+    async def catalog_references(self, fields):
+        references = {field: set() for field in fields}
+        for row in self._rows.values():
+            details = orjson.loads(row["characterDetails"])
+            for field in fields:
+                if isinstance(details.get(field), str):
+                    references[field].add(details[field])
+        return references
+
+    async def scan(self, after_id, limit, columns, user_id=None):
+        if user_id:
+            ids = sorted(character_id for _, character_id in self._by_user.get(user_id, []))
+        else:
+            ids = sorted(self._rows)
+        start = bisect_right(ids, after_id) if after_id else 0
+        return [self._decode(self._rows[i], ["id", *columns]) for i in ids[start : start + limit]]
+
+    def _apply(self, character_id: str, columns: dict) -> None:
+        row = self._rows.get(character_id)
+        if row is None:
+            return
+        reindex = not columns.keys().isdisjoint(SEARCH_COLUMNS)
+        if reindex:
+            self._unindex_search(row)
+        row.update(self._encode(columns))
+        if reindex:
+            self._index_search(row)
+        row["updatedAt"] = _now()
+        self._log.append({"update": character_id, "columns": columns, "updatedAt": row["updatedAt"]})
+
+    async def update(self, character_id: str, columns: dict) -> None:
+        self._apply(character_id, columns)
+
+    async def update_many(self, changes: list[tuple[str, dict]]) -> None:
+        # Nothing awaits in between, so the batch is applied without interleaving
+        for character_id, columns in changes:
+            self._apply(character_id, columns)
+
+    async def delete(self, character_id: str) -> bool:
+        if character_id not in self._rows:
+            return False
+        self.unload(character_id)
+        self._log.append({"delete": character_id})
+        if self.on_delete:
+            self.on_delete(character_id)
+        return True
+
+    def live_entries(self) -> list[dict]:
+        return [self._log_row(row) for row in self._rows.values()]
+
+
+class MemorySessionRepository(SessionRepository):
+    """Sessions by id with per-family and per-user indexes and the revoked families in revocation order"""
+
+    def __init__(self, log: SnapshotLog):
+        self._log = log
+        self._rows: dict[str, SessionRecord] = {}
+        self._by_family: dict[str, list[str]] = {}
+        self._families_by_user: dict[str, set[str]] = {}
+        self._revoked: dict[str, datetime] = {}  # family id -> revoked at, insertion ordered
+
+    def _index(self, session: SessionRecord) -> None:
+        if session.id not in self._rows:
+            self._by_family.setdefault(session.familyId, []).append(session.id)
+            self._families_by_user.setdefault(session.userId, set()).add(session.familyId)
+        self._rows[session.id] = session
+        if session.revokedAt and session.familyId not in self._revoked:
+            self._revoked[session.familyId] = session.revokedAt
+
+    def _store(self, session: SessionRecord) -> None:
+        self._index(session)
+        self._log.append({"session": asdict(session)})
+
+    def load(self, row: dict) -> None:
+        """Restore a logged session, a later entry for the same id replaces the earlier one"""
+        for key in _SESSION_DATES:
+            if row.get(key):
+                row[key] = datetime.fromisoformat(row[key])
+        self._index(SessionRecord(**row))
+
+    async def create(self, data: dict):
+        if data["id"] in self._rows:
+            raise DuplicateError(f"Session {data['id']} exists")
+        session = SessionRecord(createdAt=_now(), **data)
+        self._store(session)
+        return replace(session)
+
+    async def find_by_id(self, session_id: str):
+        session = self._rows.get(session_id)
+        return replace(session) if session else None
+
+    async def rotate(self, session_id: str, data: dict) -> bool:
+        # Nothing awaits in between, so the check and both writes happen without interleaving
+        session = self._rows.get(session_id)
+        if session is None or session.usedAt or session.revokedAt:
+            return False
+        self._store(replace(session, usedAt=_now()))
+        self._store(SessionRecord(createdAt=_now(), **data))
+        return True
+
+    def _newest_expiry(self, family_id: str) -> datetime | None:
+        ids = self._by_family.get(family_id)
+        return max(self._rows[i].expiresAt for i in ids) if ids else None
+
+    async def revoke_family(self, family_id: str) -> datetime | None:
+        now = _now()
+        for session_id in self._by_family.get(family_id, []):
+            session = self._rows[session_id]
+            if session.revokedAt is None:
+                self._store(replace(session, revokedAt=now))
+        return self._newest_expiry(family_id)
+
+    async def revoke_user(self, user_id: str) -> list[tuple[str, datetime]]:
+        revoked = []
+        now = _now()
+        for family_id in self._families_by_user.get(user_id, set()):
+            expires_at = self._newest_expiry(family_id)
+            if family_id not in self._revoked and expires_at and expires_at > now:
+                await self.revoke_family(family_id)
+                revoked.append((family_id, expires_at))
+        return revoked
+
+    async def revoked_since(self, since: datetime) -> list[tuple[str, datetime]]:
+        now = _now()
+        revoked = []
+        for family_id, revoked_at in reversed(self._revoked.items()):
+            if revoked_at < since:
+                break  # Older from here on
+            expires_at = self._newest_expiry(family_id)
+            if expires_at and expires_at > now:
+                revoked.append((family_id, expires_at))
+        return revoked
+
+    async def delete_expired(self, before: datetime) -> int:
+        expired = [session for session in self._rows.values() if session.expiresAt < before]
+        for session in expired:
+            del self._rows[session.id]
+            family = self._by_family[session.familyId]
+            family.remove(session.id)
+            if not family:
+                del self._by_family[session.familyId]
+                self._revoked.pop(session.familyId, None)
+                self._families_by_user.get(session.userId, set()).discard(session.familyId)
+        return len(expired)
+
+    def live_entries(self) -> list[dict]:
+        return [{"session": asdict(session)} for session in self._rows.values()]
+
+
+class MemoryCharacterVersionRepository(CharacterVersionRepository):
+    """Versions per character in version order, data held serialised like the character JSON columns"""
+
+    def __init__(self, log: SnapshotLog):
+        self._log = log
+        self._rows: dict[str, list[dict]] = {}  # character id -> versions, oldest first
+
+    @staticmethod
+    def _decode(row: dict, with_data: bool = True) -> dict:
+        decoded = {column: row[column] for column in ("version", "snapshot", "size", "createdAt")}
+        if with_data:
+            decoded["data"] = orjson.loads(row["data"])
+        return decoded
+
+    def _store(self, character_id: str, row: dict) -> None:
+        versions = self._rows.setdefault(character_id, [])
+        index = bisect_right(versions, row["version"], key=itemgetter("version"))
+        if index and versions[index - 1]["version"] == row["version"]:
+            versions[index - 1] = row
+        else:
+            versions.insert(index, row)
+
+    def load(self, row: dict) -> None:
+        """Restore a logged version"""
+        self._store(
+            row["characterId"],
+            {
+                **row,
+                "data": memoryview(orjson.dumps(row["data"])).tobytes(),
+                "createdAt": datetime.fromisoformat(row["createdAt"]),
+            },
+        )
+
+    def load_compact(self, character_id: str, floor: int, sheet: dict, size: int) -> int:
+        """Restore a logged compaction"""
+        versions = self._rows.get(character_id, [])
+        index = bisect_right(versions, floor - 1, key=itemgetter("version"))
+        del versions[:index]
+        if versions and versions[0]["version"] == floor and not versions[0]["snapshot"]:
+            versions[0].update(snapshot=True, data=memoryview(orjson.dumps(sheet)).tobytes(), size=size)
+        return index
+
+    def drop(self, character_id: str) -> None:
+        """Forget a deleted character's versions, what the foreign key cascade does in Postgres"""
+        self._rows.pop(character_id, None)
+
+    async def append(self, row: dict) -> None:
+        versions = self._rows.get(row["characterId"], [])
+        index = bisect_right(versions, row["version"], key=itemgetter("version"))
+        if index and versions[index - 1]["version"] == row["version"]:
+            raise DuplicateError(f"Version {row['version']} of character {row['characterId']} exists")
+        row = {**row, "createdAt": _now()}
+        self._log.append({"characterVersion": row})
+        self._store(row["characterId"], {**row, "data": memoryview(orjson.dumps(row["data"])).tobytes()})
+
+    async def chain(self, character_id, version=None):
+        versions = self._rows.get(character_id, [])
+        end = len(versions)
+        if version is not None:
+            end = bisect_right(versions, version, key=itemgetter("version"))
+        for start in range(end - 1, -1, -1):
+            if versions[start]["snapshot"]:
+                return [self._decode(row) for row in versions[start:end]]
+        return []
+
+    async def list_page(self, character_id, limit, before):
+        versions = self._rows.get(character_id, [])
+        end = len(versions)
+        if before is not None:
+            end = bisect_right(versions, before - 1, key=itemgetter("version"))
+        return [self._decode(row, with_data=False) for row in reversed(versions[max(0, end - limit) : end])]
+
+    async def compaction_candidates(self, cutoff, max_versions, limit):
+        candidates = []
+        for character_id, versions in self._rows.items():
+            newest = versions[-1]["version"]
+            recent = next((row["version"] for row in versions if row["createdAt"] >= cutoff), newest)
+            floor = min(newest, max(newest - max_versions + 1, recent))
+            if versions[0]["version"] < floor:
+                candidates.append((character_id, floor))
+                if len(candidates) >= limit:
+                    break
+        return candidates
+
+    async def compact(self, character_id, floor, sheet, size):
+        self._log.append({"compactVersions": character_id, "floor": floor, "data": sheet, "size": size})
+        return self.load_compact(character_id, floor, sheet, size)
+
+    async def usage(self) -> dict:
+        counts = Counter()
+        for versions in self._rows.values():
+            for row in versions:
+                kind = "snapshot" if row["snapshot"] else "delta"
+                counts[f"{kind}s"] += 1
+                counts[f"{kind}_bytes"] += row["size"]
+        return {
+            "characters": len(self._rows),
+            "versions": counts["snapshots"] + counts["deltas"],
+            "snapshots": counts["snapshots"],
+            "snapshot_bytes": counts["snapshot_bytes"],
+            "delta_bytes": counts["delta_bytes"],
+        }
+
+    def live_entries(self) -> list[dict]:
+        return [
+            {"characterVersion": {"characterId": character_id, **self._decode(row)}}
+            for character_id, versions in self._rows.items()
+            for row in versions
+        ]
+
+
+class MemoryStorage(Storage):
+    """
+    Everything in this process. Fast, but only for a single worker: other processes never see the data.
+    With snapshot_path set, changes survive restarts through an append-only log.
+    """
+
+    def __init__(self, snapshot_path: str | None = None, fsync: bool = False):
+        self.log = SnapshotLog(snapshot_path, fsync)
+        self.users = MemoryUserRepository(self.log)
+        self.characters = MemoryCharacterRepository(self.log)
+        self.sessions = MemorySessionRepository(self.log)
+        self.character_versions = MemoryCharacterVersionRepository(self.log)
+        self.characters.on_delete = self.character_versions.drop
+
+    async def connect(self) -> None:
+        for entry in self.log.replay():
+            if "user" in entry:
+                self.users.load(entry["user"])
+            elif "character" in entry:
+                self.characters.load(entry["character"])
+            elif "update" in entry:
+                self.characters.load_update(entry["update"], entry["columns"], entry["updatedAt"])
+            elif "delete" in entry:
+                self.characters.unload(entry["delete"])
+                self.character_versions.drop(entry["delete"])
+            elif "session" in entry:
+                self.sessions.load(entry["session"])
+            elif "characterVersion" in entry:
+                self.character_versions.load(entry["characterVersion"])
+            elif "compactVersions" in entry:
+                self.character_versions.load_compact(
+                    entry["compactVersions"], entry["floor"], entry["data"], entry["size"]
+                )
+        self.log.open(
+            self.users.live_entries()
+            + self.characters.live_entries()
+            + self.sessions.live_entries()
+            + self.character_versions.live_entries()
+        )
+
+    async def disconnect(self) -> None:
+        self.log.close()
+
+    async def ping(self, timeout: float) -> bool:
+        return True
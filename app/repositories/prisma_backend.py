@@ -0,0 +1,455 @@
+import json
+from datetime import datetime, timezone
+from prisma import Json
+from prisma.errors import UniqueViolationError
+from app.db import connect_db, db, disconnect_db, ping
+from app.repositories.base import (
+    AGGREGATE_COLUMNS,
+    JSON_COLUMNS,
+    SEARCH_COLUMNS,
+    CharacterRepository,
+    CharacterVersionRepository,
+    DuplicateError,
+    SessionRepository,
+    Storage,
+    UserRepository,
+)
+
+""" Postgres through the Prisma client """
+
+# Projectable columns, name -> SQL select expression. Never the password hash.
+USER_COLUMNS = {
+    "id": '"id"',
+    "username": '"username"',
+    "email": '"email"',
+    "oauth_provider": '"oauth_provider"',
+    "created_at": '"created_at"',
+    "updated_at": '"updated_at"',
+}
+LOOKUP_FIELDS = ("id", "email", "username", "oauth_id")
+CHARACTER_COLUMNS = {
+    "id": '"id"',
+    "userId": '"userId"',
+    "characterName": '"characterName"',
+    "characterClass": '"class" AS "characterClass"',
+    "race": '"race"',
+    "level": '"level"',
+    "createdAt": '"createdAt"',
+    "updatedAt": '"updatedAt"',
+    **{column: f'"{column}"' for column in JSON_COLUMNS},
+}
+
+
+# Search expressions, each matches an expression index of the character_search migration
+_NAME_KEY = 'lower("characterName") COLLATE "C"'  # Prefix match and order, byte order like Python str
+_NAME_TRGM = 'lower("characterName")'  # Trigram similarity
+
+
+def _like_prefix(prefix: str) -> str:
+    """LIKE pattern for names starting with prefix, its own wildcards escaped"""
+    escaped = prefix.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def _select(allowed: dict[str, str], columns: list[str], key_columns: list[str]) -> str:
+    """SELECT list from whitelisted expressions only, plus the keyset columns"""
+    return ", ".join(allowed[column] for column in dict.fromkeys(columns + key_columns))
+
+
+def _json_data(columns: dict) -> dict:
+    return {
+        column: Json(value) if column in JSON_COLUMNS else value
+        for column, value in columns.items()
+    }
+
+
+def _decode_json(row: dict) -> dict:
+    """Raw queries may hand back JSON columns as text"""
+    for column in JSON_COLUMNS:
+        if isinstance(row.get(column), str):
+            row[column] = json.loads(row[column])
+    return row
+
+
+class PrismaUserRepository(UserRepository):
+    async def create(self, data: dict):
+        try:
+            return await db.user.create(data=data)
+        except UniqueViolationError as e:
+            raise DuplicateError(str(e))
+
+    async def find_by_id(self, user_id: str):
+        return await db.user.find_unique(where={"id": user_id})
+
+    async def find_by_email(self, email: str):
+        return await db.user.find_unique(where={"email": email})
+
+    async def find_by_username(self, username: str):
+        return await db.user.find_first(where={"username": username})  # Not unique
+
+    async def find_by_oauth_id(self, oauth_id: str):
+        return await db.user.find_unique(where={"oauth_id": oauth_id})
+
+    async def find_many(self, field: str, values: list[str]) -> list:
+        if field not in LOOKUP_FIELDS:
+            raise ValueError(f"Unknown lookup field {field}")
+        return await db.user.find_many(where={field: {"in": values}})
+
+    async def find_conflicts(self, emails: list[str], oauth_ids: list[str]) -> list:
+        return await db.user.find_many(
+            where={"OR": [{"email": {"in": emails}}, {"oauth_id": {"in": oauth_ids}}]}
+        )
+
+    async def create_many(self, rows: list[dict]) -> list[str]:
+        ids = [row["id"] for row in rows]
+        count = await db.user.create_many(data=rows, skip_duplicates=True)
+        if count == len(rows):
+            return ids
+        # Some rows lost a race for their email or oauth_id, find out which ones made it
+        return [user.id for user in await db.user.find_many(where={"id": {"in": ids}})]
+
+    async def update(self, user_id: str, data: dict):
+        return await db.user.update(where={"id": user_id}, data=data)
+
+    async def list_page(self, limit, after, fields):
+        columns = _select(USER_COLUMNS, fields, ["created_at", "id"])
+        if after:
+            created_at, user_id = after
+            return await db.query_raw(
+                f'SELECT {columns} FROM "User" '
+                'WHERE ("created_at", "id") > ($1::timestamp, $2::uuid) '
+                'ORDER BY "created_at", "id" LIMIT $3',
+                created_at,
+                user_id,
+                limit,
+            )
+        return await db.query_raw(
+            f'SELECT {columns} FROM "User" ORDER BY "created_at", "id" LIMIT $1', limit
+        )
+
+
+class PrismaCharacterRepository(CharacterRepository):
+    async def create(self, data: dict):
+        return await db.character.create(data=_json_data(data))
+
+    async def find_by_id(self, character_id: str):
+        return await db.character.find_unique(where={"id": character_id})
+
+    async def owner_of(self, character_id: str) -> str | None:
+        row = await db.query_first(
+            'SELECT "userId" FROM "Character" WHERE "id" = $1::uuid', character_id
+        )
+        return row["userId"] if row else None
+
+    async def get_column(self, character_id: str, column: str):
+        # Column name is checked against the whitelist, never user input in the SQL
+        if column not in CHARACTER_COLUMNS:
+            raise ValueError(f"Unknown column {column}")
+        row = await db.query_first(
+            f'SELECT "userId", {CHARACTER_COLUMNS[column]} FROM "Character" WHERE "id" = $1::uuid',
+            character_id,
+        )
+        if not row:
+            return None
+        _decode_json(row)
+        return row["userId"], row[column]
+
+    async def list_page(self, user_id, limit, after, fields):
+        columns = _select(CHARACTER_COLUMNS, fields, ["createdAt", "id"])
+        if after:
+            created_at, character_id = after
+            rows = await db.query_raw(
+                f'SELECT {columns} FROM "Character" WHERE "userId" = $1::uuid '
+                'AND ("createdAt", "id") > ($2::timestamp, $3::uuid) '
+                'ORDER BY "createdAt", "id" LIMIT $4',
+                user_id,
+                created_at,
+                character_id,
+                limit,
+            )
+        else:
+            rows = await db.query_raw(
+                f'SELECT {columns} FROM "Character" WHERE "userId" = $1::uuid '
+                'ORDER BY "createdAt", "id" LIMIT $2',
+                user_id,
+                limit,
+            )
+        return [_decode_json(row) for row in rows]
+
+    async def search(self, name, fuzzy, filters, limit, after, threshold):
+        params: list = []
+
+        def param(value, cast: str = "") -> str:
+            params.append(value)
+            return f"${len(params)}{cast}"
+
+        selected = _select(CHARACTER_COLUMNS, list(SEARCH_COLUMNS), [])
+        where = []
+        if fuzzy:
+            query = param(name)
+            # % finds candidates through the trigram index, at pg_trgm's own threshold (0.3 by default)
+            score = f"similarity({_NAME_TRGM}, {query})"
+            where += [f"{_NAME_TRGM} % {query}", f"{score} >= {param(threshold, '::real')}"]
+            if after:
+                last, last_id = param(after[0], "::real"), param(after[1], "::uuid")
+                where.append(f'({score} < {last} OR ({score} = {last} AND "id" > {last_id}))')
+            key, order = f'{score} AS "score"', '"score" DESC, "id"'
+        else:
+            if name:  # Prefix match on the C collated name index
+                where.append(f"{_NAME_KEY} LIKE {param(_like_prefix(name))}")
+            if after:
+                last, last_id = param(after[0], "::text"), param(after[1], "::uuid")
+                where.append(f'({_NAME_KEY}, "id") > ({last} COLLATE "C", {last_id})')
+            key, order = f'{_NAME_KEY} AS "nameKey"', f'{_NAME_KEY}, "id"'
+        for column, value, operator in (
+            ('"class"', filters.characterClass, "="),
+            ('"race"', filters.race, "="),
+            ('"level"', filters.min_level, ">="),
+            ('"level"', filters.max_level, "<="),
+        ):
+            if value is not None:
+                where.append(f"{column} {operator} {param(value)}")
+        if filters.userId is not None:
+            where.append(f'"userId" = {param(filters.userId, "::uuid")}')
+
+        return await db.query_raw(
+            f'SELECT {selected}, {key} FROM "Character" '
+            f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+            f"ORDER BY {order} LIMIT {param(limit)}",
+            *params,
+        )
+
+    async def aggregate(self) -> dict:
+        # One scan for every count, GROUPING() tells which set a row belongs to
+        rows = await db.query_raw(
+            'SELECT "class" AS "characterClass", "race", "level", "userId", count(*) AS "count", '
+            'GROUPING("class") AS "gc", GROUPING("race") AS "gr", GROUPING("level") AS "gl", '
+            'GROUPING("userId") AS "gu" FROM "Character" '
+            'GROUP BY GROUPING SETS (("class"), ("race"), ("level"), ("userId"), ())'
+        )
+        result = {"total": 0, **{column: {} for column in AGGREGATE_COLUMNS}}
+        for row in rows:
+            count = int(row["count"])
+            grouped = [
+                column
+                for column, flag in zip(AGGREGATE_COLUMNS, ("gc", "gr", "gl", "gu"))
+                if not row[flag]
+            ]
+            if grouped:
+                result[grouped[0]][row[grouped[0]]] = count
+            else:
+                result["total"] = count
+        return result
+
+    async def catalog_references(self, fields):
+        # One pass over the table, keys compared as parameters
+        keys = ", ".join(f"${n}" for n in range(1, len(fields) + 1))
+        rows = await db.query_raw(
+            'SELECT DISTINCT f.key AS "field", f.value #>> \'{}\' AS "id" '
+            'FROM "Character", jsonb_each("characterDetails") AS f '
+            f"WHERE f.key IN ({keys}) AND jsonb_typeof(f.value) = 'string'",
+            *fields,
+        )
+        references = {field: set() for field in fields}
+        for row in rows:
+            references[row["field"]].add(row["id"])
+        return references
+
+    async def scan(self, after_id, limit, columns, user_id=None):
+        selected = _select(CHARACTER_COLUMNS, ["id"] + columns, [])
+        after_id = after_id or "00000000-0000-0000-0000-000000000000"
+        if user_id:
+            rows = await db.query_raw(
+                f'SELECT {selected} FROM "Character" '
+                'WHERE "id" > $1::uuid AND "userId" = $2::uuid ORDER BY "id" LIMIT $3',
+                after_id,
+                user_id,
+                limit,
+            )
+        else:
+            rows = await db.query_raw(
+                f'SELECT {selected} FROM "Character" WHERE "id" > $1::uuid ORDER BY "id" LIMIT $2',
+                after_id,
+                limit,
+            )
+        return [_decode_json(row) for row in rows]
+
+    async def update(self, character_id: str, columns: dict) -> None:
+        # update_many, a character deleted in the meantime is not an error
+        await db.character.update_many(where={"id": character_id}, data=_json_data(columns))
+
+    async def update_many(self, changes: list[tuple[str, dict]]) -> None:
+        async with db.batch_() as batcher:  # One transaction
+            for character_id, columns in changes:
+                batcher.character.update_many(
+                    where={"id": character_id}, data=_json_data(columns)
+                )
+
+    async def delete(self, character_id: str) -> bool:
+        return await db.character.delete_many(where={"id": character_id}) > 0
+
+
+# Prisma stores DateTime as UTC in timestamp without time zone columns
+_NOW = "(now() AT TIME ZONE 'UTC')"
+
+
+def _timestamp(value) -> datetime:
+    """Raw queries hand timestamps back as ISO strings"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class PrismaSessionRepository(SessionRepository):
+    async def create(self, data: dict):
+        try:
+            return await db.refreshsession.create(data=data)
+        except UniqueViolationError:
+            raise DuplicateError(f"Session {data['id']} exists")
+
+    async def find_by_id(self, session_id: str):
+        return await db.refreshsession.find_unique(where={"id": session_id})
+
+    async def rotate(self, session_id: str, data: dict) -> bool:
+        async with db.tx() as tx:
+            # Conditional update, concurrent rotations of the same token serialise on the row lock
+            # and only the first still sees usedAt null
+            used = await tx.refreshsession.update_many(
+                where={"id": session_id, "usedAt": None, "revokedAt": None},
+                data={"usedAt": datetime.now(timezone.utc)},
+            )
+            if not used:
+                return False
+            await tx.refreshsession.create(data=data)
+        return True
+
+    async def revoke_family(self, family_id: str) -> datetime | None:
+        await db.refreshsession.update_many(
+            where={"familyId": family_id, "revokedAt": None},
+            data={"revokedAt": datetime.now(timezone.utc)},
+        )
+        newest = await db.refreshsession.find_first(
+            where={"familyId": family_id}, order={"expiresAt": "desc"}
+        )
+        return newest.expiresAt if newest else None
+
+    async def revoke_user(self, user_id: str) -> list[tuple[str, datetime]]:
+        rows = await db.query_raw(
+            f'UPDATE "RefreshSession" SET "revokedAt" = {_NOW} '
+            f'WHERE "userId" = $1::uuid AND "revokedAt" IS NULL AND "expiresAt" > {_NOW} '
+            'RETURNING "familyId", "expiresAt"',
+            user_id,
+        )
+        return _newest_per_family(rows)
+
+    async def revoked_since(self, since: datetime) -> list[tuple[str, datetime]]:
+        rows = await db.query_raw(
+            'SELECT "familyId", "expiresAt" FROM "RefreshSession" '
+            f'WHERE "revokedAt" >= $1::timestamp AND "expiresAt" > {_NOW}',
+            since.astimezone(timezone.utc).replace(tzinfo=None).isoformat(),
+        )
+        return _newest_per_family(rows)
+
+    async def delete_expired(self, before: datetime) -> int:
+        return await db.refreshsession.delete_many(where={"expiresAt": {"lt": before}})
+
+
+def _newest_per_family(rows: list[dict]) -> list[tuple[str, datetime]]:
+    newest: dict[str, datetime] = {}
+    for row in rows:
+        expires_at = _timestamp(row["expiresAt"])
+        if row["familyId"] not in newest or expires_at > newest[row["familyId"]]:
+            newest[row["familyId"]] = expires_at
+    return list(newest.items())
+
+
+_LAST_VERSION = 2**31 - 1  # Int column
+
+
+def _decode_version(row: dict) -> dict:
+    if isinstance(row.get("data"), str):
+        row["data"] = json.loads(row["data"])
+    row["createdAt"] = _timestamp(row["createdAt"])
+    return row
+
+
+class PrismaCharacterVersionRepository(CharacterVersionRepository):
+    async def append(self, row: dict) -> None:
+        try:
+            await db.characterversion.create(data={**row, "data": Json(row["data"])})
+        except UniqueViolationError:
+            raise DuplicateError(f"Version {row['version']} of character {row['characterId']} exists")
+
+    async def chain(self, character_id, version=None):
+        # Both bounds come from the primary key (characterId, version)
+        rows = await db.query_raw(
+            'SELECT "version", "snapshot", "data", "size", "createdAt" FROM "CharacterVersion" '
+            'WHERE "characterId" = $1::uuid AND "version" <= $2 AND "version" >= ('
+            '  SELECT max("version") FROM "CharacterVersion" '
+            '  WHERE "characterId" = $1::uuid AND "snapshot" AND "version" <= $2'
+            ') ORDER BY "version"',
+            character_id,
+            _LAST_VERSION if version is None else version,
+        )
+        return [_decode_version(row) for row in rows]
+
+    async def list_page(self, character_id, limit, before):
+        rows = await db.query_raw(
+            'SELECT "version", "snapshot", "size", "createdAt" FROM "CharacterVersion" '
+            'WHERE "characterId" = $1::uuid AND "version" < $2 ORDER BY "version" DESC LIMIT $3',
+            character_id,
+            _LAST_VERSION + 1 if before is None else before,
+            limit,
+        )
+        return [_decode_version(row) for row in rows]
+
+    async def compaction_candidates(self, cutoff, max_versions, limit):
+        rows = await db.query_raw(
+            'SELECT "characterId", "floor" FROM ('
+            '  SELECT "characterId", min("version") AS "oldest", least(max("version"), greatest('
+            '    max("version") - $2 + 1,'
+            '    coalesce(min("version") FILTER (WHERE "createdAt" >= $1::timestamp), max("version"))'
+            '  )) AS "floor" FROM "CharacterVersion" GROUP BY "characterId"'
+            ') AS "kept" WHERE "oldest" < "floor" LIMIT $3',
+            cutoff.astimezone(timezone.utc).replace(tzinfo=None).isoformat(),
+            max_versions,
+            limit,
+        )
+        return [(row["characterId"], int(row["floor"])) for row in rows]
+
+    async def compact(self, character_id, floor, sheet, size):
+        async with db.tx() as tx:
+            await tx.characterversion.update_many(
+                where={"characterId": character_id, "version": floor, "snapshot": False},
+                data={"snapshot": True, "data": Json(sheet), "size": size},
+            )
+            return await tx.characterversion.delete_many(
+                where={"characterId": character_id, "version": {"lt": floor}}
+            )
+
+    async def usage(self) -> dict:
+        row = await db.query_first(
+            'SELECT count(DISTINCT "characterId") AS "characters", count(*) AS "versions", '
+            'count(*) FILTER (WHERE "snapshot") AS "snapshots", '
+            'coalesce(sum("size") FILTER (WHERE "snapshot"), 0) AS "snapshot_bytes", '
+            'coalesce(sum("size") FILTER (WHERE NOT "snapshot"), 0) AS "delta_bytes" '
+            'FROM "CharacterVersion"'
+        )
+        return {key: int(value) for key, value in row.items()}  # Counts and sums come back as bigint
+
+
+class PrismaStorage(Storage):
+    def __init__(self):
+        self.users = PrismaUserRepository()
+        self.characters = PrismaCharacterRepository()
+        self.sessions = PrismaSessionRepository()
+        self.character_versions = PrismaCharacterVersionRepository()
+
+    async def connect(self) -> None:
+        await connect_db()
+
+    async def disconnect(self) -> None:
+        await disconnect_db()
+
+    async def ping(self, timeout: float) -> bool:
+        return await ping(timeout)
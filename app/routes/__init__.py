@@ -1,10 +1,21 @@
 from fastapi import FastAPI
+from app.config import settings
 from .users import router as users_router
 from .characters import router as characters_router
 from .auth import router as auth_router
+from .health import router as health_router
+from .stats import router as stats_router
+from .rules import router as rules_router
 
 
 def register_routers(app: FastAPI) -> None:
     app.include_router(users_router, prefix="/users", tags=["Users"])
     app.include_router(characters_router, prefix="/characters", tags=["Characters"])
     app.include_router(auth_router, prefix="/auth", tags=["Auth"])
+    app.include_router(health_router, prefix="/health", tags=["Health"])
+    app.include_router(stats_router, prefix="/stats", tags=["Stats"])
+    app.include_router(rules_router, prefix="/rules", tags=["Rules"])
+    if settings.METRICS_ENABLED:
+        from .metrics import router as metrics_router
+
+        app.include_router(metrics_router, prefix="/metrics", tags=["Metrics"])
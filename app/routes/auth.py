@@ -1,13 +1,19 @@
-from fastapi import APIRouter, HTTPException, Response, Request
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Response, Request
 from fastapi.responses import JSONResponse
 from datetime import datetime, timedelta, timezone
-from app.db import db
 from app.schemas.users import UserSignIn
-from app.auth import verify_password
+from app.auth import hash_password_async, needs_rehash, verify_password_async
+from app.services.login_throttle import login_throttle
+from app.services.session_service import (
+    end_all_sessions,
+    end_session,
+    rotate_session,
+    start_session,
+)
+from app.services.user_service import get_user_by_email, update_password
 from app.utils.auth import (
     create_access_token,
-    create_refresh_token,
-    verify_refresh_token,
     verify_access_token,
     verify_session,
 )
@@ -18,11 +24,27 @@ ACCESS_TOKEN_EXPIRE_MINUTES: int = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 REFRESH_TOKEN_EXPIRE_HOURS: int = settings.REFRESH_TOKEN_EXPIRE_HOURS
 secure_cookie = settings.ENVIRONMENT == "production"
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
+def _set_refresh_cookie(response: Response, refresh_token: str) -> None:
+    # Set refresh_token securely.
+    response.set_cookie(
+        key="refresh_token",
+        value=refresh_token,
+        httponly=True,  # Cannot be accessed by javascript
+        secure=secure_cookie,  # Can only be set over HTTPS (for production, not dev)
+        max_age=REFRESH_TOKEN_EXPIRE_HOURS * 3600,  # Cookie expiration, in seconds
+        expires=timedelta(hours=REFRESH_TOKEN_EXPIRE_HOURS)
+        + datetime.now(timezone.utc),  # Same as max_age
+        samesite="Strict",  # Prevent Cross site tracking
+    )
+
+
 @router.post("/signin")
-async def signin(user: UserSignIn, response: Response):
+async def signin(user: UserSignIn, request: Request, response: Response):
     """
     Login endpoint: Authenticate a user based on email and password or OAuth credentials.
 
@@ -38,6 +60,8 @@ async def signin(user: UserSignIn, response: Response):
             - If the password is required but not provided for manual login (400).
             - If the password does not match the stored hash for manual login (400).
             - If OAuth credentials (OAuth ID) are invalid for OAuth login (400).
+            - If the client or the account is over its sign-in rate, or backing off after failures (429).
+            - If too many passwords are being verified or the password pool is saturated (503).
 
     Returns:
         dict: A dictionary containing the access token (`access_token`) and the token type (`token_type`, which is always "bearer").
@@ -53,7 +77,10 @@ async def signin(user: UserSignIn, response: Response):
     Returned dict is then stored in the user frontend securely, refresh tokens are then generated as needed for consistent access.
     """
 
-    db_user = await db.user.find_unique(where={"email": user.email})
+    # Throttle before anything costly, clients behind a proxy need uvicorn's --proxy-headers
+    await login_throttle.admit(request.client.host if request.client else "unknown", user.email)
+
+    db_user = await get_user_by_email(user.email)
 
     # Validate user  exists
     if not db_user:
@@ -65,10 +92,19 @@ async def signin(user: UserSignIn, response: Response):
             raise HTTPException(
                 status_code=400, detail="Password is required for manual account types"
             )
-        if not verify_password(
-            user.password, db_user.password
-        ):  # Verify password with database hash
+        async with login_throttle.verification():  # Global cap on bcrypt verifications
+            valid = await verify_password_async(
+                user.password, db_user.password
+            )  # Verify password with database hash, off the event loop
+        if not valid:
+            await login_throttle.failed(user.email)
             raise HTTPException(status_code=400, detail="Invalid password")
+        await login_throttle.succeeded(user.email)
+        if needs_rehash(db_user.password):  # Cost factor changed, upgrade hash
+            try:
+                await update_password(db_user.id, await hash_password_async(user.password))
+            except Exception as e:  # Best effort, login still succeeds
+                logger.warning("Password rehash failed for user %s: %s", db_user.id, e)
 
     # Oauth login (google or discord)
     elif db_user.oauth_provider in ["google", "discord"]:
@@ -78,19 +114,8 @@ async def signin(user: UserSignIn, response: Response):
     # Generate JWT token after access authentication
     username = db_user.username
     access_token = create_access_token(data={"sub": str(db_user.id)})
-    refresh_token = create_refresh_token(user_id=str(db_user.id))
-
-    # Set refresh_token securely.
-    response.set_cookie(
-        key="refresh_token",
-        value=refresh_token,
-        httponly=True,  # Cannot be accessed by javascript
-        secure=secure_cookie,  # Can only be set over HTTPS (for production, not dev)
-        max_age=timedelta(hours=REFRESH_TOKEN_EXPIRE_HOURS),  # Cookie expiration
-        expires=timedelta(hours=REFRESH_TOKEN_EXPIRE_HOURS)
-        + datetime.now(timezone.utc),  # Same as max_age
-        samesite="Strict",  # Prevent Cross site tracking
-    )
+    refresh_token = await start_session(str(db_user.id))  # New session family
+    _set_refresh_cookie(response, refresh_token)
 
     return {
         "username": username,
@@ -100,13 +125,14 @@ async def signin(user: UserSignIn, response: Response):
 
 
 @router.post("/refresh")
-async def refresh_token(request: Request):
+async def refresh_token(request: Request, response: Response):
     """
     Refresh endpoint: issue a new access token using a valid refresh token extracted from cookies.
 
     This endpoint allows users to refresh their access by providing a valid refresh token
     The refresh token must be valid and not expired, if expired, a new login will be required, and user will be rerouted to login
-    If valid, the user will be issued a new access token
+    If valid, the user will be issued a new access token, and the refresh token cookie is replaced by its successor.
+    Every refresh token works once, replaying a used one revokes the session and requires a new login.
 
     Args:
         refresh_token(str): Refresh token to be validated and used to issue a new token
@@ -119,19 +145,40 @@ async def refresh_token(request: Request):
         raise HTTPException(
             status_code=401, detail="No valid refresh token found in cookies"
         )
-    user_id = verify_refresh_token(refresh_token)
+    user_id, rotated_token = await rotate_session(refresh_token)
+    _set_refresh_cookie(response, rotated_token)
     access_token = create_access_token(data={"sub": user_id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.post("/logout")
+async def logout(request: Request, response: Response):
+    """
+    Logout endpoint: revoke the session of the refresh token cookie and clear the cookie.
+    Access tokens already issued stay valid until they expire (ACCESS_TOKEN_EXPIRE_MINUTES).
+    """
+    refresh_token = request.cookies.get("refresh_token")
+    if refresh_token:
+        await end_session(refresh_token)
+    response.delete_cookie("refresh_token", httponly=True, secure=secure_cookie, samesite="Strict")
+    return {"detail": "Signed out"}
+
+
+@router.post("/logout-all")
+async def logout_all(response: Response, user_id: str = Depends(verify_access_token)):
+    """
+    Revoke every session of the signed in user, on every device, e.g. after a suspected compromise.
+    """
+    revoked = await end_all_sessions(user_id)
+    response.delete_cookie("refresh_token", httponly=True, secure=secure_cookie, samesite="Strict")
+    return {"detail": "Signed out everywhere", "sessions_revoked": revoked}
+
+
 @router.post("/verify")
-async def verify_token(refresh_token: str):
+async def verify_token(valid: bool = Depends(verify_session)):
     """
     Validation endpoint for verifying all token validities.
+    Takes the refresh_token query parameter and the access token from the Authorization header.
     """
-    try:
-        if verify_session(refresh_token):
-            return {"valid": True}
-    except Exception as e:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return {"valid": valid}
 
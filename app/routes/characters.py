@@ -1,9 +1,494 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+import secrets
+import time
+from uuid import UUID
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from app.config import settings
+from app.repositories.base import CharacterFilters
+from app.schemas.characters import BulkRecompute, CharacterSection, PatchDocument, State
+from app.services.bulk_recompute import recompute_jobs
+from app.services.character_service import (
+    create_character,
+    delete_character,
+    diff_versions,
+    event_hub,
+    get_character_cached,
+    get_section,
+    get_version,
+    list_characters,
+    list_versions,
+    patch_section,
+    replace_character,
+    restore_version,
+    search_characters,
+    sheet_cache,
+    update_section,
+    watch_character,
+)
+from app.services.events import Subscriber
+from app.services.sheet_cache import etag_matches
+from app.utils.auth import decode_token, verify_access_token
+from app.utils.serialization import (
+    negotiated_response,
+    request_body,
+    validated_body,
+    wants_msgpack,
+)
 
+""" Character sheet routes, every route acts on behalf of the authenticated user.
+Bodies and responses are JSON, or MessagePack with Content-Type / Accept application/msgpack """
 router = APIRouter()
 
 
-# Testing route
 @router.get("")
-async def get_characters():
-    return {"Message": "This is all the characters (placeholder)"}
+async def get_characters(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    fields: str | None = None,
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    Retrieve a page of the authenticated user's characters, oldest first.
+
+    Args:
+        limit (int): Page size, 1-200.
+        cursor (str, optional): `next_cursor` from the previous page.
+        fields (str, optional): Comma separated projection, e.g. "id,characterName,status".
+            Defaults to id, characterName, characterClass, race, level and updatedAt.
+
+    Returns:
+        dict: {"items": [...], "next_cursor": str | None}, next_cursor is None on the last page.
+    """
+    return negotiated_response(
+        request, await list_characters(user_id, limit, cursor, fields)
+    )
+
+
+@router.get("/search")
+async def search(
+    request: Request,
+    q: str | None = Query(None, max_length=100),
+    fuzzy: bool = False,
+    character_class: str | None = Query(None, alias="class"),
+    race: str | None = None,
+    min_level: int | None = Query(None, ge=0),
+    max_level: int | None = Query(None, ge=0),
+    mine: bool = False,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    Search characters by name, for campaign browsers and GM tools.
+
+    Only the summary of each character is returned: id, userId, characterName, characterClass, race and level.
+
+    Args:
+        q (str, optional): Name prefix, case-insensitive. Without it every character matching the filters is listed.
+        fuzzy (bool): Match q by trigram similarity instead, tolerating typos. Best matches come first, each with a score.
+        class (str, optional): Exact class, e.g. "Fighter".
+        race (str, optional): Exact race.
+        min_level (int, optional), max_level (int, optional): Level range, inclusive.
+        mine (bool): Only the authenticated user's characters.
+        limit (int): Page size, 1-100.
+        cursor (str, optional): `next_cursor` from the previous page of the same search.
+
+    Returns:
+        dict: {"items": [...], "next_cursor": str | None}, next_cursor is None on the last page.
+    """
+    filters = CharacterFilters(
+        characterClass=character_class,
+        race=race,
+        min_level=min_level,
+        max_level=max_level,
+        userId=user_id if mine else None,
+    )
+    return negotiated_response(
+        request, await search_characters(q, fuzzy, filters, limit, cursor)
+    )
+
+
+@router.post("", status_code=status.HTTP_201_CREATED)
+async def create(
+    request: Request,
+    state: State = Depends(validated_body(State)),
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    Create a new character from a full State object.
+
+    Args:
+        state (State): The complete character sheet, validated from the raw body by the State Pydantic model.
+
+    Returns:
+        dict: The created character, its id and every State section.
+    """
+    return negotiated_response(
+        request,
+        await create_character(user_id, state),
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+def _check_recompute_token(x_recompute_token: str | None) -> None:
+    if not settings.BULK_RECOMPUTE_TOKEN or not secrets.compare_digest(
+        (x_recompute_token or "").encode(), settings.BULK_RECOMPUTE_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Bulk recompute is not allowed")
+
+
+@router.post("/recompute", status_code=status.HTTP_202_ACCEPTED)
+async def bulk_recompute(job: BulkRecompute, x_recompute_token: str | None = Header(None)):
+    """
+    Start recomputing derived stats of every character, or one user's, after a house rule change or a
+    party level-up, column-wise in chunks with one transaction per chunk. Runs in the background, poll
+    GET /characters/recompute/{id} for its progress.
+
+    Runs in this server process so that its pending autosaves are merged into each chunk and its cached
+    sheets are invalidated.
+
+    Args:
+        x_recompute_token (str): Must match BULK_RECOMPUTE_TOKEN, the endpoint is disabled while that is unset.
+
+    Raises:
+        HTTPException: 403 when bulk recompute is disabled or the token does not match, 409 while another
+            job is running.
+
+    Returns:
+        dict: The job: id, status "running", rows scanned and updated so far and lastId.
+    """
+    _check_recompute_token(x_recompute_token)
+    return recompute_jobs.submit(
+        classes={name: override.model_dump(exclude_none=True) for name, override in job.classes.items()},
+        sizes=job.sizes,
+        level_delta=job.levelUp,
+        user_id=job.userId,
+        chunk_size=job.chunkSize,
+        after_id=job.afterId,
+    )
+
+
+@router.get("/recompute/{job_id}")
+async def bulk_recompute_status(job_id: str, x_recompute_token: str | None = Header(None)):
+    """
+    Progress of a bulk recompute: status ("running", "done", "failed" or "cancelled"), rows scanned and
+    updated, lastId (pass it as afterId to carry on after a failed or cancelled job) and error.
+
+    Raises:
+        HTTPException: 403 as for starting one, 404 for a job unknown or long finished.
+    """
+    _check_recompute_token(x_recompute_token)
+    job = recompute_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Bulk recompute job not found")
+    return job
+
+
+@router.websocket("/ws")
+async def watch(websocket: WebSocket, token: str = Query(...)):
+    """
+    Live character updates, e.g. a GM keeping the whole party's sheets open.
+
+    Connect with ?token=<access token>, then send {"subscribe": [ids]} or {"unsubscribe": [ids]}.
+    Only the caller's own characters can be watched, the same rule as reading them: there is no party
+    or GM permission sharing a sheet with other users, so a GM watches a party only when the GM's
+    account holds its sheets. Any other id is answered with
+        {"type": "error", "characterId": id, "detail": "Character belongs to another user"}
+    and not watched.
+    Every write to a watched character is pushed as
+        {"characterId": id, "type": "patch", "ops": [...]}
+    with JSON Patch operations relative to the State, derived values included. "reload" means the
+    whole sheet was replaced and should be fetched again, "deleted" that the character is gone.
+
+    A connection more than EVENT_QUEUE_SIZE events behind is closed with code 1013,
+    the client reconnects and refetches the sheets it shows. One still open when its access token
+    expires is closed with code 1008, the client reconnects with a refreshed token.
+    """
+    try:
+        user_id = verify_access_token(token)
+        expires_at = float(decode_token(token)["exp"])  # Access tokens always carry one
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscriber = event_hub.subscriber()
+    expiry = asyncio.create_task(asyncio.sleep(expires_at - time.time()))
+    tasks = [
+        asyncio.create_task(_receive_commands(websocket, subscriber, user_id)),
+        asyncio.create_task(_send_events(websocket, subscriber)),
+        asyncio.create_task(subscriber.dropped.wait()),
+        expiry,
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        if subscriber.dropped.is_set():
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Too slow")
+        elif expiry.done():
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Access token expired")
+    except (WebSocketDisconnect, RuntimeError):  # Client already gone
+        pass
+    finally:
+        event_hub.remove(subscriber)
+        for task in tasks:
+            task.cancel()
+
+
+async def _receive_commands(websocket: WebSocket, subscriber: Subscriber, user_id: str) -> None:
+    try:
+        while True:
+            try:
+                command = json.loads(await websocket.receive_text())
+                subscribe = [str(UUID(i)) for i in command.get("subscribe", [])]
+                unsubscribe = [str(UUID(i)) for i in command.get("unsubscribe", [])]
+            except (ValueError, TypeError, AttributeError, KeyError):
+                await websocket.send_json({"type": "error", "detail": "Invalid command"})
+                continue
+            for character_id in unsubscribe:
+                event_hub.unsubscribe(subscriber, character_id)
+            for character_id in subscribe:
+                try:
+                    await watch_character(subscriber, character_id, user_id)
+                except HTTPException as e:
+                    await websocket.send_json(
+                        {"type": "error", "characterId": character_id, "detail": e.detail}
+                    )
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+async def _send_events(websocket: WebSocket, subscriber: Subscriber) -> None:
+    try:
+        while True:
+            await websocket.send_text(await subscriber.queue.get())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+@router.get("/{character_id}")
+async def get_one(
+    request: Request,
+    character_id: UUID,
+    if_none_match: str | None = Header(default=None),
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    Retrieve a full character sheet by its ID.
+
+    Responses carry a strong ETag. Send it back in If-None-Match to get a 304 Not Modified when the sheet
+    is unchanged, served from the in-process cache without querying the database.
+
+    Raises:
+        HTTPException: 404 if the character does not exist, 403 if it belongs to another user.
+    """
+    entry = await get_character_cached(str(character_id), user_id)
+    if wants_msgpack(request):
+        body, etag = entry.msgpack()
+        media_type = "application/msgpack"
+    else:
+        body, etag = entry.body, entry.etag
+        media_type = "application/json"
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+    if etag_matches(if_none_match, etag):
+        sheet_cache.record_not_modified(entry)
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+@router.put("/{character_id}")
+async def replace(
+    request: Request,
+    character_id: UUID,
+    state: State = Depends(validated_body(State)),
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    Overwrite a character with a full State object.
+    Prefer the section routes below for small edits, this re-validates and rewrites every section.
+    """
+    return negotiated_response(
+        request, await replace_character(str(character_id), user_id, state)
+    )
+
+
+@router.delete("/{character_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete(character_id: UUID, user_id: str = Depends(verify_access_token)):
+    """Delete a character"""
+    await delete_character(str(character_id), user_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/{character_id}/history")
+async def history(
+    request: Request,
+    character_id: UUID,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    Retrieve a page of a character's versions, newest first.
+
+    A version is recorded once the sheet has been left alone for HISTORY_COALESCE_SECONDS, so a burst
+    of autosaves is one version. Saves not recorded yet are recorded before listing, the newest version
+    is always the current sheet.
+
+    Args:
+        limit (int): Page size, 1-200.
+        cursor (str, optional): `next_cursor` from the previous page.
+
+    Returns:
+        dict: {"items": [{"version", "createdAt", "snapshot", "size"}, ...], "next_cursor": str | None}
+    """
+    return negotiated_response(
+        request, await list_versions(str(character_id), user_id, limit, cursor)
+    )
+
+
+@router.get("/{character_id}/history/{version}")
+async def history_version(
+    request: Request,
+    character_id: UUID,
+    version: int,
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    Retrieve the whole sheet as it was at a version, e.g. as of the last session.
+
+    Raises:
+        HTTPException: 404 if the version does not exist or was dropped by retention.
+
+    Returns:
+        dict: version, createdAt and every State section.
+    """
+    return negotiated_response(request, await get_version(str(character_id), user_id, version))
+
+
+@router.get("/{character_id}/history/{version}/diff")
+async def history_diff(
+    request: Request,
+    character_id: UUID,
+    version: int,
+    base: int | None = Query(None, alias="from"),
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    What changed between two versions, as JSON Patch operations on the State.
+
+    Args:
+        version (int): The version to compare to.
+        from (int, optional): The version to compare from, the one before by default.
+
+    Returns:
+        dict: {"from": int, "to": int, "ops": [...]}
+    """
+    return negotiated_response(
+        request, await diff_versions(str(character_id), user_id, version, base)
+    )
+
+
+@router.post("/{character_id}/history/{version}/restore")
+async def history_restore(
+    request: Request,
+    character_id: UUID,
+    version: int,
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    Overwrite a character with an earlier version, undo being a restore of the version before the newest.
+    The restore is recorded as a new version itself, nothing is removed from the history.
+
+    Returns:
+        dict: The restored character, its id and every State section.
+    """
+    return negotiated_response(
+        request, await restore_version(str(character_id), user_id, version)
+    )
+
+
+@router.get("/{character_id}/{section}")
+async def get_one_section(
+    request: Request,
+    character_id: UUID,
+    section: CharacterSection,
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    Retrieve a single section of a character sheet, e.g. status or skills.
+    """
+    return negotiated_response(
+        request, await get_section(str(character_id), user_id, section)
+    )
+
+
+@router.put("/{character_id}/{section}")
+async def replace_section(
+    request: Request,
+    character_id: UUID,
+    section: CharacterSection,
+    data: bytes = Depends(request_body),
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    Replace a single section of a character sheet.
+
+    Only the given section is validated. Derived values depending on it are recomputed server side,
+    so sections holding them (e.g. savingThrows after a stats change) may be written too.
+
+    Args:
+        section (CharacterSection): The State section to replace.
+        data (bytes): The new section content, validated straight from the raw body (or decoded MessagePack) by that section's Pydantic model.
+
+    Returns:
+        dict: Every section written, keyed by State field.
+    """
+    return negotiated_response(
+        request, await update_section(str(character_id), user_id, section, data)
+    )
+
+
+@router.patch("/{character_id}/{section}")
+async def patch_one_section(
+    request: Request,
+    character_id: UUID,
+    section: CharacterSection,
+    operations: PatchDocument = Depends(validated_body(PatchDocument)),
+    user_id: str = Depends(verify_access_token),
+):
+    """
+    Apply JSON Patch operations inside a single section.
+
+    Paths are relative to the section, so a HP tick is a PATCH to /characters/{id}/status with
+        [{"op": "replace", "path": "/health/currentHealth", "value": 7}]
+
+    Raises:
+        HTTPException:
+            - 409 if an operation cannot be applied (missing path, failed test operation).
+            - 422 if the patched section fails validation.
+
+    Returns:
+        dict: Every section written, keyed by State field, the patched one plus any with recomputed derived values.
+    """
+    if not operations.root:
+        raise HTTPException(status_code=400, detail="No patch operations provided")
+    return negotiated_response(
+        request,
+        await patch_section(
+            str(character_id),
+            user_id,
+            section,
+            [op.model_dump(by_alias=True, exclude_unset=True) for op in operations.root],
+        ),
+    )
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, status
+from fastapi.responses import ORJSONResponse
+from app.config import settings
+from app.repositories import storage
+from app.middleware.drain import requests_in_flight
+
+""" Probes for the container orchestrator / load balancer """
+router = APIRouter()
+
+
+@router.get("/live")
+async def live():
+    """
+    Liveness, the process is up and its event loop responsive.
+    Deliberately independent of the database so an outage does not get every worker restarted.
+    """
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready():
+    """
+    Readiness, this worker can serve traffic: the database answers and the worker is not shutting down.
+
+    Returns:
+        503 while draining on shutdown or when the database does not answer within DB_CONNECT_TIMEOUT.
+    """
+    if requests_in_flight.draining:
+        return ORJSONResponse(
+            {"status": "draining", "in_flight": requests_in_flight.count},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    if not await storage.ping(timeout=settings.DB_CONNECT_TIMEOUT):
+        return ORJSONResponse(
+            {"status": "unavailable", "database": "unreachable"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    return {"status": "ready", "database": "ok"}
@@ -0,0 +1,53 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.auth import password_pool
+from app.middleware.drain import requests_in_flight
+from app.services.character_service import (
+    autosave_buffer,
+    character_history,
+    character_stats,
+    event_hub,
+    sheet_cache,
+)
+from app.services.login_throttle import login_throttle
+from app.services.session_service import revocation_sync
+from app.services.user_import import import_pool
+from app.services.user_service import user_loader_stats
+from app.utils.auth import token_cache
+from app.utils.log import log_pipeline
+from app.utils.metrics import registry
+
+""" Prometheus scrape endpoint, registered only when METRICS_ENABLED """
+router = APIRouter()
+
+registry.add_collector("token_cache", "Verified JWT cache", token_cache.stats)
+registry.add_collector("sheet_cache", "Serialised character sheet cache", sheet_cache.stats)
+registry.add_collector("autosave", "Character autosave write-behind buffer", autosave_buffer.stats)
+registry.add_collector("user_loader", "Batched user lookups", user_loader_stats.stats)
+registry.add_collector("login_throttle", "Sign-in admission control", login_throttle.stats)
+registry.add_collector("sessions", "Refresh session revocations", revocation_sync.stats)
+registry.add_collector("character_stats", "Character statistics", character_stats.stats)
+registry.add_collector("character_history", "Character sheet versions", character_history.stats)
+registry.add_collector("character_events", "Live character update fan-out", event_hub.stats)
+registry.add_collector(
+    "password_pool",
+    "bcrypt worker pool",
+    lambda: {"pending": password_pool.pending, "rejected": password_pool.rejected},
+)
+registry.add_collector(
+    "user_import_pool",
+    "bcrypt worker pool of bulk user imports",
+    lambda: {"pending": import_pool.pending},
+)
+registry.add_collector("logging", "Queued log pipeline", log_pipeline.stats)
+registry.add_collector(
+    "server",
+    "Worker lifecycle",
+    lambda: {"draining": int(requests_in_flight.draining), "requests_in_flight": requests_in_flight.count},
+)
+
+
+@router.get("", response_class=PlainTextResponse)
+async def scrape():
+    """Metrics of this worker process in the Prometheus text exposition format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Header, Response, status
+from app.config import settings
+from app.rules.catalog import rules_catalog
+from app.services.sheet_cache import etag_matches
+from app.utils.serialization import JSONBytesResponse
+
+""" Rules catalog, the classes, races and sizes character sheets reference by id """
+router = APIRouter()
+
+
+@router.get("")
+async def rules(if_none_match: str | None = Header(default=None)):
+    """
+    Every class, race and size keyed by id, the ids a characterDetails section can send in place of
+    characterClass, race and size.
+
+    The catalog only changes with a deploy: it is serialised once at startup and may be cached for
+    RULES_CATALOG_MAX_AGE_SECONDS. Send the ETag back in If-None-Match afterwards to get a 304 Not Modified.
+    """
+    headers = {
+        "ETag": rules_catalog.etag,
+        "Cache-Control": f"public, max-age={settings.RULES_CATALOG_MAX_AGE_SECONDS}",
+    }
+    if etag_matches(if_none_match, rules_catalog.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONBytesResponse(rules_catalog.body, headers=headers)
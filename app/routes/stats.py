@@ -0,0 +1,39 @@
+from uuid import UUID
+from fastapi import APIRouter, Header, Response, status
+from app.services.character_service import character_history, character_stats
+from app.services.sheet_cache import etag_matches
+from app.utils.serialization import JSONBytesResponse
+
+""" Community statistics, served from counts kept in memory """
+router = APIRouter()
+
+
+@router.get("/characters")
+async def character_distributions(if_none_match: str | None = Header(default=None)):
+    """
+    Character total, class, race and level distributions and the number of users with characters.
+
+    Served from counts the character service keeps up to date, never a query. Counts are reconciled with
+    storage every CHARACTER_STATS_RECONCILE_SECONDS, so writes served by other workers can take that long
+    to show. Send the ETag back in If-None-Match to get a 304 Not Modified while nothing changed.
+    """
+    body, etag = character_stats.distributions()
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONBytesResponse(body, headers=headers)
+
+
+@router.get("/characters/users/{user_id}")
+async def user_character_count(user_id: UUID):
+    """Number of characters a user has, 0 for an unknown user"""
+    return JSONBytesResponse({"userId": user_id, "characters": character_stats.user_count(str(user_id))})
+
+
+@router.get("/history")
+async def history_storage():
+    """
+    Storage held by character sheet history: versions, snapshots, bytes of snapshots and of deltas,
+    and bytes per 1,000 versions against storing a full copy of the sheet per version.
+    """
+    return JSONBytesResponse(await character_history.usage())
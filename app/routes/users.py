@@ -1,26 +1,37 @@
-from fastapi import APIRouter, HTTPException
-from app.db import db
+import secrets
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from app.config import settings
 from app.schemas.users import UserSignUp, UserResponse
-from app.services.user_service import create_user, get_user_by_id
+from app.services.user_import import import_users, parse_rows
+from app.services.user_service import create_user, get_user_by_id, list_users
+from app.utils.serialization import JSONBytesResponse
 
 """ Generate API router, will be registered to app in __init__.py """
 router = APIRouter()
 
 
 @router.get("")
-async def get_users():
+async def get_users(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    fields: str | None = None,
+):
     """
     Remove for production, mainly for testing
-    Retrieve a list of all users.
+    Retrieve a page of users.
 
-    This endpoint fetches all users from the database. It returns a list of user objects, which includes details like the user's
-    name, email, and other profile information.
+    This endpoint returns users ordered by creation time, one page at a time. Pass the returned `next_cursor`
+    as `cursor` to fetch the following page. Password hashes are never returned.
+
+    Args:
+        limit (int): Page size, 1-200.
+        cursor (str, optional): Cursor from the previous page.
+        fields (str, optional): Comma separated projection, e.g. "id,username". Defaults to id, username, email and timestamps.
 
     Returns:
-        List[UserResponse]: A list of user objects represented by the UserResponse Pydantic model.
+        dict: {"items": [...], "next_cursor": str | None}, next_cursor is None on the last page.
     """
-    users = await db.user.find_many()
-    return users
+    return JSONBytesResponse(await list_users(limit, cursor, fields))
 
 
 @router.post(
@@ -44,22 +55,52 @@ async def signup(user: UserSignUp):  # Request must match pydantic UserCreate sh
     """
     try:
         new_user = await create_user(user)
-        return new_user
+        # Validated once from the Prisma model and encoded by pydantic-core, never the password hash
+        return JSONBytesResponse(UserResponse.model_validate(new_user).model_dump_json().encode())
+    except HTTPException:  # Duplicate email, password pool load shedding
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
-@router.get("/{user_id}")
-async def get_user(user_id: int):
+@router.post("/import")
+async def bulk_import(request: Request, x_import_token: str | None = Header(None)):
+    """
+    Create users in bulk, e.g. a whole Discord server or game store at once.
+
+    The body is NDJSON (one UserSignUp object per line) or, with Content-Type text/csv, CSV with a header
+    line naming the fields. It is validated as it streams in and the users are created in batches. Rows
+    that are invalid or whose email is already in use are reported and skipped, the others are created.
+
+    Args:
+        x_import_token (str): Must match USER_IMPORT_TOKEN, the endpoint is disabled while that is unset.
+
+    Raises:
+        HTTPException: 403 when imports are disabled or the token does not match.
+
+    Returns:
+        dict: Counts of rows, created, duplicates and invalid, plus {"row", "email", "error"} per rejected row.
+    """
+    if not settings.USER_IMPORT_TOKEN or not secrets.compare_digest(
+        (x_import_token or "").encode(), settings.USER_IMPORT_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="User import is not allowed")
+    content_type = request.headers.get("content-type", "")
+    fmt = "csv" if content_type.startswith("text/csv") else "ndjson"
+    return JSONBytesResponse(await import_users(parse_rows(fmt, request.stream())))
+
+
+@router.get("/{user_id}", response_model=UserResponse)
+async def get_user(user_id: str):
     """
     Retrieve a user by their ID.
 
     This endpoint fetches the details of a single user by their unique ID. If no user is found with the given ID, a 404 error is raised.
 
     Args:
-        user_id (int): The ID of the user to be retrieved.
+        user_id (str): The UUID of the user to be retrieved.
 
     Raises:
         HTTPException: If no user is found with the given ID, a 404 status code with a detail message will be returned.
@@ -67,7 +108,9 @@ async def get_user(user_id: int):
     Returns:
         UserResponse: The user's data, represented by the UserResponse Pydantic model.
     """
-    user = await get_user_by_id(user_id)
-    if not user:
+    try:
+        user = await get_user_by_id(user_id)
+    except ValueError:
         raise HTTPException(status_code=404, detail="User not found")
-    return user  # Return prisma model no conversion
+    # Validated once from the Prisma model and encoded by pydantic-core, no second response_model pass
+    return JSONBytesResponse(UserResponse.model_validate(user).model_dump_json().encode())
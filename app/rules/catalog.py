@@ -0,0 +1,135 @@
+from pathlib import Path
+from types import MappingProxyType
+import orjson
+from pydantic import BaseModel
+from app.config import settings
+from app.schemas.characters import ClassShape, RaceShape, SizeShape
+from app.services.sheet_cache import _etag
+from app.utils.serialization import dumps
+
+""" Catalog of classes, races and sizes, loaded once and referenced from character sheets by id """
+
+BUNDLED_CATALOG = Path(__file__).with_name("catalog.json")
+
+# characterDetails field -> (catalog table, model validating an entry, field naming the entry)
+CATALOG_FIELDS: dict[str, tuple[str, type[BaseModel], str]] = {
+    "characterClass": ("classes", ClassShape, "className"),
+    "race": ("races", RaceShape, "raceName"),
+    "size": ("sizes", SizeShape, "sizeName"),
+}
+
+
+class CatalogError(ValueError):
+    """Raised for an id the catalog does not offer, or two entries of a table with the same name"""
+
+
+def _canonical(field: str, value: dict) -> bytes:
+    """Bytes two equal entries share, classSkills is a set and dumps in any order"""
+    if field == "characterClass":
+        value = {**value, "classSkills": sorted(value["classSkills"])}
+    return dumps(value)
+
+
+class RulesCatalog:
+    """
+    Immutable tables of entries in the API shape, keyed by id. An id always means the same data: a
+    changed class is a new entry with a new id, or characters referencing the old one change with it.
+
+    characterDetails columns store the id of an entry equal to the catalog's in place of the entry
+    itself and have it expanded again on read. An edited entry (a house rule baseSave, a hand-made race)
+    no longer equals the catalog's and is stored in full, so either form can be in any row.
+
+    Entries taken out of the catalog move to its "retired" tables rather than going away, rows may
+    still hold their ids. A retired entry is neither served nor accepted in writes, but still expands
+    when a stored row is read, so an existing sheet always reads back.
+    """
+
+    def __init__(self, tables: dict[str, dict[str, dict]]):
+        # Entries as bytes, every expansion parses its own copy the caller is free to change
+        self._entries: dict[str, MappingProxyType] = {}
+        self._ids: dict[str, MappingProxyType] = {}  # Entry name -> id, the reverse of expand
+        self._retired: dict[str, frozenset] = {}
+        retired_tables = tables.get("retired", {})
+        body = {}
+        for field, (table, model, name_field) in CATALOG_FIELDS.items():
+            entries, ids, served = {}, {}, {}
+            for entry_id, entry in tables[table].items():
+                value = model.model_validate(entry).model_dump(mode="json")
+                entries[entry_id] = memoryview(_canonical(field, value)).tobytes()
+                ids[value[name_field]] = entry_id
+                served[entry_id] = orjson.loads(entries[entry_id])
+            if len(ids) != len(entries):
+                raise CatalogError(f"Two {table} in the rules catalog have the same {name_field}")
+            retired = retired_tables.get(table, {})
+            for entry_id, entry in retired.items():
+                if entry_id in entries:
+                    raise CatalogError(f"'{entry_id}' is both one of the rules catalog's {table} and retired")
+                value = model.model_validate(entry).model_dump(mode="json")
+                entries[entry_id] = memoryview(_canonical(field, value)).tobytes()
+            self._entries[field] = MappingProxyType(entries)
+            self._ids[field] = MappingProxyType(ids)
+            self._retired[field] = frozenset(retired)
+            body[table] = served
+        self.body = memoryview(dumps(body)).tobytes()
+        self.etag = _etag(self.body)  # Changes only with the catalog's content, i.e. with a deploy
+
+    @classmethod
+    def load(cls, path: str | Path) -> "RulesCatalog":
+        return cls(orjson.loads(Path(path).read_bytes()))
+
+    def entry(self, field: str, entry_id: str, retired: bool = False) -> dict:
+        """A fresh copy of an entry, retired ones only with retired set"""
+        body = self._entries[field].get(entry_id)
+        if body is None or (not retired and entry_id in self._retired[field]):
+            raise CatalogError(f"'{entry_id}' is not one of the rules catalog's {CATALOG_FIELDS[field][0]}")
+        return orjson.loads(body)
+
+    def expand(self, details: dict, retired: bool = False) -> dict:
+        """
+        characterDetails with every catalog id replaced by its entry, in place.
+        Pass retired=True for stored rows, which may reference entries retired since they were written.
+        """
+        for field in CATALOG_FIELDS:
+            if isinstance(details.get(field), str):
+                details[field] = self.entry(field, details[field], retired)
+        return details
+
+    def unknown_ids(self, references: dict[str, set[str]]) -> dict[str, list[str]]:
+        """Of the ids stored rows reference per characterDetails field, those neither offered nor retired"""
+        unknown = {}
+        for field, ids in references.items():
+            missing = sorted(entry_id for entry_id in ids if entry_id not in self._entries[field])
+            if missing:
+                unknown[field] = missing
+        return unknown
+
+    def compact(self, details: dict) -> dict:
+        """A copy of characterDetails with every entry equal to the catalog's replaced by its id"""
+        compacted = dict(details)
+        for field, (_, _, name_field) in CATALOG_FIELDS.items():
+            value = details.get(field)
+            if not isinstance(value, dict):
+                continue
+            entry_id = self._ids[field].get(value.get(name_field))
+            if entry_id is not None and _canonical(field, value) == self._entries[field][entry_id]:
+                compacted[field] = entry_id
+        return compacted
+
+    def expand_operations(self, operations: list[dict]) -> list[dict]:
+        """
+        JSON Patch operations on characterDetails with catalog ids in their values expanded, so the
+        patched section and the operations broadcast to subscribers both carry the entries.
+        """
+        expanded = []
+        for op in operations:
+            if "value" in op:
+                field = op["path"][1:]
+                if field in CATALOG_FIELDS and isinstance(op["value"], str):
+                    op = {**op, "value": self.entry(field, op["value"])}
+                elif op["path"] == "" and isinstance(op["value"], dict):
+                    op = {**op, "value": self.expand(dict(op["value"]))}
+            expanded.append(op)
+        return expanded
+
+
+rules_catalog = RulesCatalog.load(settings.RULES_CATALOG_PATH or BUNDLED_CATALOG)
@@ -0,0 +1,283 @@
+import heapq
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+""" Server side derived stat engine, the server recomputes every value the State derives from others """
+
+Path = tuple[str, ...]
+
+ABILITIES = ("strength", "dexterity", "constitution", "intelligence", "wisdom", "charisma")
+SAVES = {  # Saving throw -> (ClassBaseSaves field, key ability)
+    "fortitude": ("fortitudeBase", "constitution"),
+    "reflex": ("reflexBase", "dexterity"),
+    "will": ("willBase", "wisdom"),
+}
+
+# Sections holding rule inputs or outputs, edits to any other section (status) never need a recompute
+RULE_SECTIONS = {"characterDetails", "stats", "bonus", "savingThrows", "skills"}
+
+
+def modifier(score: int) -> int:
+    """3.5e ability modifier"""
+    return (score - 10) // 2
+
+
+def get_path(doc: Any, path: Path) -> Any:
+    for key in path:
+        if not isinstance(doc, dict) or key not in doc:
+            return None
+        doc = doc[key]
+    return doc
+
+
+def set_path(doc: dict, path: Path, value: Any) -> None:
+    for key in path[:-1]:
+        doc = doc.setdefault(key, {})
+    doc[path[-1]] = value
+
+
+def _effective_modifier(state: dict, ability: str) -> int:
+    """Temp modifier while temp scores are active, otherwise the regular one"""
+    stats = state["stats"]
+    temp = stats.get("tempModifiers")
+    if stats.get("tempScores") and temp:
+        return temp[ability]
+    return stats["modifiers"][ability]
+
+
+def _ability_inputs(ability: str) -> list[Path]:
+    return [("stats", "modifiers", ability), ("stats", "tempModifiers", ability)]
+
+
+class Rule:
+    """One derived value: output path, the paths it reads and how to compute it"""
+
+    __slots__ = ("output", "inputs", "compute")
+
+    def __init__(self, output: Path, inputs: list[Path], compute: Callable[[dict], Any]):
+        self.output = output
+        self.inputs = inputs
+        self.compute = compute
+
+
+def build_rules(skill_abilities: Iterable[tuple[str, str]]) -> list[Rule]:
+    """All rules for a sheet with the given (skill name, ability name) pairs"""
+    rules = []
+    for ability in ABILITIES:
+        rules.append(
+            Rule(
+                ("stats", "modifiers", ability),
+                [("stats", "scores", ability)],
+                lambda s, a=ability: modifier(s["stats"]["scores"][a]),
+            )
+        )
+    # Temp modifiers exist as a block only while temp scores do
+    rules.append(
+        Rule(
+            ("stats", "tempModifiers"),
+            [("stats", "tempScores", ability) for ability in ABILITIES],
+            lambda s: (
+                {a: modifier(s["stats"]["tempScores"][a]) for a in ABILITIES}
+                if s["stats"].get("tempScores")
+                else None
+            ),
+        )
+    )
+    for save, (base, ability) in SAVES.items():
+        rules.append(
+            Rule(
+                ("savingThrows", save, "total"),
+                [
+                    ("characterDetails", "characterClass", "baseSave", base),
+                    ("savingThrows", save, "miscMod"),
+                    ("savingThrows", save, "magicMod"),
+                    ("savingThrows", save, "tempMod"),
+                    *_ability_inputs(ability),
+                ],
+                lambda s, save=save, base=base, a=ability: (
+                    s["characterDetails"]["characterClass"]["baseSave"][base]
+                    + _effective_modifier(s, a)
+                    + s["savingThrows"][save]["miscMod"]
+                    + s["savingThrows"][save]["magicMod"]
+                    + s["savingThrows"][save]["tempMod"]
+                ),
+            )
+        )
+    for name, ability in skill_abilities:
+        rules.append(
+            Rule(
+                ("skills", "skills", name, "skillMod"),
+                [
+                    ("skills", "skills", name, "ranks"),
+                    ("skills", "skills", name, "miscMod"),
+                    ("skills", "skills", name, "abilityName"),
+                    *_ability_inputs(ability),
+                ],
+                lambda s, n=name: (
+                    s["skills"]["skills"][n]["ranks"]
+                    + _effective_modifier(s, s["skills"]["skills"][n]["abilityName"])
+                    + s["skills"]["skills"][n]["miscMod"]
+                ),
+            )
+        )
+    rules.append(
+        Rule(
+            ("bonus", "initiative", "initiativeTotal"),
+            [("bonus", "initiative", "miscModifier"), *_ability_inputs("dexterity")],
+            lambda s: _effective_modifier(s, "dexterity")
+            + s["bonus"]["initiative"]["miscModifier"],
+        )
+    )
+    rules.append(
+        Rule(
+            ("bonus", "baseAttackBonus"),
+            [("characterDetails", "characterClass", "baseAttack")],
+            lambda s: s["characterDetails"]["characterClass"]["baseAttack"],
+        )
+    )
+    rules.append(
+        Rule(
+            ("characterDetails", "ACMod"),
+            [("characterDetails", "size", "ACMod")],
+            lambda s: s["characterDetails"]["size"]["ACMod"],
+        )
+    )
+    return rules
+
+
+def _overlaps(a: Path, b: Path) -> bool:
+    """True if one path is equal to or nested under the other"""
+    n = min(len(a), len(b))
+    return a[:n] == b[:n]
+
+
+class DependencyGraph:
+    """
+    Rules in topological order plus an index from any path to the rules that read or produce it.
+
+    A changed path triggers a rule if it is equal to, above or below one of the rule's inputs, e.g.
+    replacing the whole stats section triggers every rule reading stats. Editing a derived value directly
+    triggers the rule producing it, so the server value always wins.
+    """
+
+    def __init__(self, rules: list[Rule]):
+        self.rules = self._sort(rules)
+        self._exact: dict[Path, set[int]] = {}  # Watched path -> rules
+        self._below: dict[Path, set[int]] = {}  # Every prefix of a watched path -> rules
+        for index, rule in enumerate(self.rules):
+            for path in (*rule.inputs, rule.output):
+                self._exact.setdefault(path, set()).add(index)
+                for depth in range(1, len(path) + 1):
+                    self._below.setdefault(path[:depth], set()).add(index)
+
+    @staticmethod
+    def _sort(rules: list[Rule]) -> list[Rule]:
+        # Kahn's algorithm, B depends on A if B reads anything overlapping A's output
+        dependents = {i: [] for i in range(len(rules))}
+        indegree = [0] * len(rules)
+        for i, producer in enumerate(rules):
+            for j, consumer in enumerate(rules):
+                if i != j and any(_overlaps(producer.output, p) for p in consumer.inputs):
+                    dependents[i].append(j)
+                    indegree[j] += 1
+        ready = [i for i, degree in enumerate(indegree) if degree == 0]
+        ordered = []
+        while ready:
+            i = ready.pop()
+            ordered.append(rules[i])
+            for j in dependents[i]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    ready.append(j)
+        if len(ordered) != len(rules):
+            raise ValueError("Derived stat rules contain a cycle")
+        return ordered
+
+    def triggered_by(self, path: Path) -> set[int]:
+        triggered = set(self._below.get(path, ()))  # Watched paths at or below path
+        for depth in range(1, len(path)):  # Watched paths above path
+            triggered |= self._exact.get(path[:depth], set())
+        return triggered
+
+
+def _changed_paths(path: Path, old: Any, new: Any) -> Iterable[Path]:
+    """Narrowest paths that differ, so a recomputed block only wakes rules reading changed keys"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old.keys() | new.keys():
+            if old.get(key) != new.get(key):
+                yield path + (key,)
+    else:
+        yield path
+
+
+class RulesEngine:
+    """
+    Recomputes derived State values on plain section dicts (the API shape, sections keyed by State field).
+
+    Graphs depend on which ability each skill uses, so they are built per skill layout and cached.
+    """
+
+    def __init__(self, max_graphs: int = 64):
+        self.max_graphs = max_graphs
+        self._graphs: OrderedDict[tuple, DependencyGraph] = OrderedDict()
+
+    def graph_for(self, state: dict) -> DependencyGraph:
+        skills = get_path(state, ("skills", "skills")) or {}
+        key = tuple((name, skill["abilityName"]) for name, skill in skills.items())
+        graph = self._graphs.get(key)
+        if graph is None:
+            graph = DependencyGraph(build_rules(key))
+            self._graphs[key] = graph
+            if len(self._graphs) > self.max_graphs:
+                self._graphs.popitem(last=False)
+        else:
+            self._graphs.move_to_end(key)
+        return graph
+
+    def recompute_all(self, state: dict) -> set[Path]:
+        """Recompute every derived value in place, returns the paths whose value changed"""
+        updated = set()
+        for rule in self.graph_for(state).rules:
+            value = rule.compute(state)
+            if get_path(state, rule.output) != value:
+                set_path(state, rule.output, value)
+                updated.add(rule.output)
+        return updated
+
+    def recompute(self, state: dict, changed: Iterable[Path]) -> set[Path]:
+        """
+        Recompute only the derived values affected by the changed paths, in place.
+
+        Rules run in topological order and a rule's dependents are only woken if its value actually
+        changed, so e.g. a dexterity edit touches the dex modifier, reflex, initiative and dex skills.
+
+        Returns:
+            set[Path]: Output paths whose value changed.
+        """
+        graph = self.graph_for(state)
+        queue = []
+        queued = set()
+        for path in changed:
+            for index in graph.triggered_by(tuple(path)):
+                if index not in queued:
+                    queued.add(index)
+                    heapq.heappush(queue, index)
+
+        updated = set()
+        while queue:
+            rule = graph.rules[heapq.heappop(queue)]
+            old = get_path(state, rule.output)
+            value = rule.compute(state)
+            if old == value:
+                continue
+            set_path(state, rule.output, value)
+            updated.add(rule.output)
+            for path in _changed_paths(rule.output, old, value):
+                for index in graph.triggered_by(path):
+                    if index not in queued:
+                        queued.add(index)
+                        heapq.heappush(queue, index)
+        return updated
+
+
+rules_engine = RulesEngine()
@@ -0,0 +1,133 @@
+""" Versioned skill catalog and the compact storage format of the skills section built on it """
+
+# Catalog version -> (skill name, key ability) in index order. A new version only appends to the one
+# before, an index keeps meaning the same skill in every version, so stored rows never need rewriting.
+SKILL_CATALOGS: dict[int, tuple[tuple[str, str], ...]] = {
+    1: (
+        ("Appraise", "intelligence"),
+        ("Balance", "dexterity"),
+        ("Bluff", "charisma"),
+        ("Climb", "strength"),
+        ("Concentration", "constitution"),
+        ("Craft", "intelligence"),
+        ("Decipher Script", "intelligence"),
+        ("Diplomacy", "charisma"),
+        ("Disable Device", "intelligence"),
+        ("Disguise", "charisma"),
+        ("Escape Artist", "dexterity"),
+        ("Forgery", "intelligence"),
+        ("Gather Information", "charisma"),
+        ("Handle Animal", "charisma"),
+        ("Heal", "wisdom"),
+        ("Hide", "dexterity"),
+        ("Intimidate", "charisma"),
+        ("Jump", "strength"),
+        ("Knowledge (arcana)", "intelligence"),
+        ("Knowledge (architecture and engineering)", "intelligence"),
+        ("Knowledge (dungeoneering)", "intelligence"),
+        ("Knowledge (geography)", "intelligence"),
+        ("Knowledge (history)", "intelligence"),
+        ("Knowledge (local)", "intelligence"),
+        ("Knowledge (nature)", "intelligence"),
+        ("Knowledge (nobility and royalty)", "intelligence"),
+        ("Knowledge (religion)", "intelligence"),
+        ("Knowledge (the planes)", "intelligence"),
+        ("Listen", "wisdom"),
+        ("Move Silently", "dexterity"),
+        ("Open Lock", "dexterity"),
+        ("Perform", "charisma"),
+        ("Profession", "wisdom"),
+        ("Ride", "dexterity"),
+        ("Search", "intelligence"),
+        ("Sense Motive", "wisdom"),
+        ("Sleight of Hand", "dexterity"),
+        ("Spellcraft", "intelligence"),
+        ("Spot", "wisdom"),
+        ("Survival", "wisdom"),
+        ("Swim", "strength"),
+        ("Tumble", "dexterity"),
+        ("Use Magic Device", "charisma"),
+        ("Use Rope", "dexterity"),
+    ),
+}
+SKILL_CATALOG_VERSION = max(SKILL_CATALOGS)  # What rows are written with
+
+for _version in sorted(SKILL_CATALOGS)[1:]:
+    _previous = SKILL_CATALOGS[_version - 1]
+    if SKILL_CATALOGS[_version][: len(_previous)] != _previous:
+        raise ValueError(f"Skill catalog {_version} does not extend catalog {_version - 1}")
+
+SKILL_INDEX = {name: index for index, (name, _) in enumerate(SKILL_CATALOGS[SKILL_CATALOG_VERSION])}
+
+
+def encode_skills(section: dict) -> dict:
+    """
+    Validated skills section (the API shape) -> what the skills column stores.
+
+    Catalog skills become one entry per catalog index in parallel arrays, ranks null for a skill the
+    sheet does not have and learned as 0 or 1. Names and key abilities are not stored, only an
+    abilityName that differs from the catalog's. Skills outside the catalog (a "Craft (weaving)") are
+    kept as they are under extra.
+    """
+    catalog = SKILL_CATALOGS[SKILL_CATALOG_VERSION]
+    size = len(catalog)
+    ranks: list[int | None] = [None] * size
+    misc, mods, learned = [0] * size, [0] * size, [0] * size
+    abilities, extra = {}, {}
+    for name, skill in section["skills"].items():
+        index = SKILL_INDEX.get(name)
+        if index is None:
+            extra[name] = skill
+            continue
+        ranks[index] = skill["ranks"]
+        misc[index] = skill["miscMod"]
+        mods[index] = skill["skillMod"]
+        learned[index] = int(skill["learned"])
+        if skill["abilityName"] != catalog[index][1]:
+            abilities[str(index)] = skill["abilityName"]
+    column = {
+        "catalog": SKILL_CATALOG_VERSION,
+        "skillPoints": section["skillPoints"],
+        "ranks": ranks,
+        "miscMod": misc,
+        "skillMod": mods,
+        "learned": learned,
+    }
+    if abilities:
+        column["abilityName"] = abilities
+    if extra:
+        column["extra"] = extra
+    return column
+
+
+def catalog_skills(column: dict):
+    """(catalog index, abilityName, ranks, miscMod) of each catalog skill a compact column has, unexpanded"""
+    catalog = SKILL_CATALOGS[column["catalog"]]
+    abilities = column.get("abilityName", {})
+    for index, ((_, ability), ranks, misc) in enumerate(zip(catalog, column["ranks"], column["miscMod"])):
+        if ranks is not None:
+            yield index, abilities.get(str(index), ability) if abilities else ability, ranks, misc
+
+
+def decode_skills(column: dict) -> dict:
+    """
+    Stored skills column -> the API shape, catalog skills in catalog order followed by the extra ones.
+    Columns written before the compact format are already in the API shape and returned as they are.
+    """
+    if "catalog" not in column:
+        return column
+    catalog = SKILL_CATALOGS[column["catalog"]]
+    skills = {
+        name: {
+            "learned": learned == 1, "abilityName": ability, "ranks": ranks, "miscMod": misc, "skillMod": mod
+        }
+        for (name, ability), ranks, misc, mod, learned in zip(
+            catalog, column["ranks"], column["miscMod"], column["skillMod"], column["learned"]
+        )
+        if ranks is not None
+    }
+    for index, ability in column.get("abilityName", {}).items():
+        skills[catalog[int(index)][0]]["abilityName"] = ability
+    if "extra" in column:
+        skills.update(column["extra"])
+    return {"skillPoints": column["skillPoints"], "skills": skills}
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Dict, Set, Optional
-from typing_extensions import Literal
+from pydantic import BaseModel, Field, RootModel, field_serializer, model_validator
+from typing import Dict, Set, Optional, Union
+from typing_extensions import Annotated, Literal
 from enum import Enum
 
 
@@ -34,9 +34,13 @@ class ClassBaseSaves(BaseModel):
     willBase: int
 
 
+# Spell level 0-6, an int key so JSON object keys ("0") are coerced. No more lv 10 spells!
+SpellLevel = Annotated[int, Field(ge=0, le=6)]
+
+
 class ClassSpellShape(BaseModel):
-    spellsPerDay: Dict[Literal[0, 1, 2, 3, 4, 5, 6], int]  # No more lv 10 spells!
-    spellsKnown: Dict[Literal[0, 1, 2, 3, 4, 5, 6], int]
+    spellsPerDay: Dict[SpellLevel, int]
+    spellsKnown: Dict[SpellLevel, int]
 
 
 class ClassShape(BaseModel):
@@ -48,6 +52,10 @@ class ClassShape(BaseModel):
     spells: Optional[ClassSpellShape] = None
     baseSave: ClassBaseSaves
 
+    @field_serializer("classSkills")
+    def _sorted_class_skills(self, class_skills: Set[str]) -> list[str]:
+        return sorted(class_skills)  # A set dumps in no fixed order, equal classes should dump equal
+
 
 class RaceShape(BaseModel):
     raceName: str
@@ -60,23 +68,27 @@ class SizeShape(BaseModel):
     ACMod: int
 
 
+# Id of a rules catalog entry (GET /rules) in place of the entry, the server expands it
+CatalogId = Annotated[str, Field(min_length=1, max_length=64)]
+
+
 class CharacterDetails(BaseModel):
     characterName: str
     playerName: str
 
-    characterClass: ClassShape
+    characterClass: Union[ClassShape, CatalogId]
 
     baseAttack: int
     baseSkill: int
 
-    race: RaceShape
+    race: Union[RaceShape, CatalogId]
 
     alignment: AlignmentEnum
 
     deity: str
     level: int
 
-    size: SizeShape
+    size: Union[SizeShape, CatalogId]
 
     ACMod: int
     age: int
@@ -201,3 +213,54 @@ class State(BaseModel):
     bonus: Bonus
     savingThrows: SavingThrows
     skills: Skills
+
+
+## API input shapes
+
+
+class CharacterSection(str, Enum):
+    # State field names, stored in the Character Json column of the same name (bonus -> bonuses)
+    characterDetails = "characterDetails"
+    stats = "stats"
+    status = "status"
+    bonus = "bonus"
+    savingThrows = "savingThrows"
+    skills = "skills"
+
+
+class PatchOperation(BaseModel):
+    # JSON Patch operation, path is relative to the section e.g. /health/currentHealth
+    op: Literal["add", "remove", "replace", "move", "copy", "test"]
+    path: str
+    value: Optional[object] = None
+    from_: Optional[str] = Field(default=None, alias="from")
+
+    @model_validator(mode="after")
+    def operands_present(self) -> "PatchOperation":
+        # A null value is a value, only a missing one is rejected
+        if self.op in ("add", "replace", "test") and "value" not in self.model_fields_set:
+            raise ValueError(f"{self.op} operation is missing a value")
+        if self.op in ("move", "copy") and self.from_ is None:
+            raise ValueError(f"{self.op} operation is missing a from path")
+        return self
+
+
+class PatchDocument(RootModel[list[PatchOperation]]):
+    # JSON Patch document, a list of operations applied in order
+    pass
+
+
+class ClassOverride(BaseModel):
+    # House rule for one class, only the fields given replace the class's own
+    baseAttack: Optional[int] = None
+    baseSave: Optional[ClassBaseSaves] = None
+
+
+class BulkRecompute(BaseModel):
+    # Rules change or party level-up applied by POST /characters/recompute
+    classes: Dict[str, ClassOverride] = {}  # className -> override
+    sizes: Dict[str, int] = {}  # sizeName -> ACMod
+    levelUp: int = Field(0, ge=-20, le=20)  # A whole 3.5e career either way
+    userId: Optional[str] = None  # Only this user's characters (a party)
+    chunkSize: int = Field(1000, ge=1, le=10000)
+    afterId: Optional[str] = None  # Carry on after this character, the lastId of a cancelled or failed job
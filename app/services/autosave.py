@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class AutosaveBuffer:
+    """
+    Write-behind buffer for character saves.
+
+    The frontend autosaves on every field change, so instead of one UPDATE per save the changed columns
+    are merged in memory per character and written later. A character is flushed once it has been quiet
+    for debounce_seconds, or max_delay_seconds after its first unsaved change, or as soon as the number
+    of dirty characters reaches max_pending. Flushes group up to batch_size characters into a single
+    transaction.
+
+    write stores a chunk of (character id, columns) changes in one transaction, e.g.
+    CharacterRepository.update_many. Readers must overlay pending() on what they load from the database
+    to see unsaved changes.
+    on_flushed is called with the ids of every character written, e.g. to drop cached copies.
+
+    Pending changes live in this process, only buffer where one process serves every read of them.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[list[tuple[str, dict[str, object]]]], Awaitable[None]],
+        debounce_seconds: float,
+        max_delay_seconds: float,
+        max_pending: int,
+        batch_size: int,
+        on_flushed: Callable[[list[str]], None] | None = None,
+    ):
+        self.write = write
+        self.on_flushed = on_flushed
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+
+        self._pending: dict[str, dict[str, object]] = {}  # character id -> column -> value
+        # Taken by the running flush, still served by pending() until the database has them
+        self._in_flight: dict[str, dict[str, object]] = {}
+        self._first_change: dict[str, float] = {}
+        self._last_change: dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+        # Metrics
+        self.staged_writes = 0
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+
+    def stage(self, character_id: str, columns: dict[str, object]) -> None:
+        """Merge changed columns into the character's pending write"""
+        now = time.monotonic()
+        self._pending.setdefault(character_id, {}).update(columns)
+        self._first_change.setdefault(character_id, now)
+        self._last_change[character_id] = now
+        self.staged_writes += 1
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()  # Size threshold reached, flush now
+
+    def pending(self, character_id: str) -> dict[str, object]:
+        """
+        Unsaved columns for a character, empty if nothing is pending. Columns a flush is writing right
+        now are included until the write has committed, newer staged changes win over them.
+        """
+        in_flight = self._in_flight.get(character_id)
+        if in_flight is None:
+            return dict(self._pending.get(character_id, {}))
+        return {**in_flight, **self._pending.get(character_id, {})}
+
+    def take(self, character_id: str) -> dict[str, object]:
+        """
+        Remove and return a character's pending changes, for a writer storing them itself. Only call it
+        inside held(), otherwise a running flush may be writing the same columns.
+        """
+        self._first_change.pop(character_id, None)
+        self._last_change.pop(character_id, None)
+        return self._pending.pop(character_id, {})
+
+    def discard(self, character_id: str) -> None:
+        """Drop pending changes, e.g. when the character is deleted"""
+        self._pending.pop(character_id, None)
+        self._in_flight.pop(character_id, None)
+        self._first_change.pop(character_id, None)
+        self._last_change.pop(character_id, None)
+
+    def _due(self, now: float) -> list[str]:
+        return [
+            character_id
+            for character_id in self._pending
+            if now - self._last_change[character_id] >= self.debounce_seconds
+            or now - self._first_change[character_id] >= self.max_delay_seconds
+        ]
+
+    async def flush(self, everything: bool = True) -> None:
+        """Write pending changes to the database, all of them or only those that are due"""
+        async with self._flush_lock:
+            await self._flush(everything)
+
+    @asynccontextmanager
+    async def held(self) -> AsyncIterator[None]:
+        """
+        Write everything pending, then keep flushes out until the block ends, e.g. while a batch job reads
+        and rewrites rows itself. Saves staged meanwhile stay pending, take() hands them over to the job.
+        """
+        async with self._flush_lock:
+            await self._flush(everything=True)
+            yield
+
+    async def _flush(self, everything: bool) -> None:
+        if everything or len(self._pending) >= self.max_pending:
+            character_ids = list(self._pending)
+        else:
+            character_ids = self._due(time.monotonic())
+        for character_id in character_ids:
+            self._in_flight[character_id] = self._pending.pop(character_id)
+            self._first_change.pop(character_id, None)
+            self._last_change.pop(character_id, None)
+
+        items = [(character_id, self._in_flight[character_id]) for character_id in character_ids]
+        for start in range(0, len(items), self.batch_size):
+            await self._write(items[start : start + self.batch_size])
+
+    async def _write(self, chunk: list[tuple[str, dict[str, object]]]) -> None:
+        started = time.perf_counter()
+        try:
+            # A character deleted in the meantime does not fail the whole chunk
+            await self.write(chunk)
+        except Exception as e:
+            self.failed_flushes += 1
+            logger.error("Autosave flush of %d characters failed: %s", len(chunk), e)
+            now = time.monotonic()
+            for character_id, columns in chunk:  # Put back, newer pending changes win
+                if self._in_flight.pop(character_id, None) is None:
+                    continue  # Deleted meanwhile
+                self._pending[character_id] = {**columns, **self._pending.get(character_id, {})}
+                self._first_change.setdefault(character_id, now)
+                self._last_change.setdefault(character_id, now)
+            return
+        for character_id, _ in chunk:  # Committed, readers get these columns from the row now
+            self._in_flight.pop(character_id, None)
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.flushed_rows += len(chunk)
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+        if self.on_flushed:
+            self.on_flushed([character_id for character_id, _ in chunk])
+
+    async def _run(self) -> None:
+        interval = min(self.debounce_seconds, self.max_delay_seconds)
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush(everything=False)
+            except Exception as e:  # Keep the loop alive, next tick retries
+                logger.error("Autosave flush loop error: %s", e)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background loop and flush everything still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.error(
+                "Autosave shutdown left %d characters unsaved", len(self._pending)
+            )
+
+    def stats(self) -> dict:
+        return {
+            "pending_characters": len(self._pending),
+            "staged_writes": self.staged_writes,
+            "flushed_rows": self.flushed_rows,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            # Saves received per row actually written, higher means more coalescing
+            "coalescing_ratio": (
+                self.staged_writes / self.flushed_rows if self.flushed_rows else 0.0
+            ),
+            "flush_latency_avg_seconds": (
+                self.flush_seconds_total / self.flushes if self.flushes else 0.0
+            ),
+            "flush_latency_max_seconds": self.flush_seconds_max,
+        }
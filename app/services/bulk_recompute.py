@@ -0,0 +1,372 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable
+import numpy as np
+from fastapi import HTTPException, status
+from app.config import settings
+from app.repositories import characters
+from app.rules.catalog import rules_catalog
+from app.rules.engine import ABILITIES, SAVES
+from app.rules.skills import catalog_skills, encode_skills
+from app.services.character_service import SECTIONS, autosave_buffer, character_history, sheet_cache
+from app.services.events import Broker, create_broker
+
+""" Column-wise bulk recompute of derived stats, for house rule changes and party level-ups.
+Runs inside the server as a background job (POST /characters/recompute), the autosave buffer and sheet
+cache it flushes and invalidates are the ones serving requests. python -m app.services.bulk_recompute_cli
+starts a job and polls it. """
+
+logger = logging.getLogger(__name__)
+
+RECOMPUTE_CHANNEL = "recompute-jobs"
+
+ABILITY_INDEX = {ability: i for i, ability in enumerate(ABILITIES)}
+SAVE_NAMES = list(SAVES)
+SAVE_BASES = [SAVES[save][0] for save in SAVE_NAMES]
+SAVE_ABILITIES = [ABILITY_INDEX[SAVES[save][1]] for save in SAVE_NAMES]
+DEXTERITY = ABILITY_INDEX["dexterity"]
+
+# Sections read and possibly rewritten, State field -> Character column
+BULK_SECTIONS = {
+    name: SECTIONS[name][0]
+    for name in ("characterDetails", "stats", "bonus", "savingThrows", "skills")
+}
+
+
+def recompute_chunk(
+    sheets: list[dict],
+    classes: dict[str, dict] | None = None,
+    sizes: dict[str, int] | None = None,
+    level_delta: int = 0,
+) -> None:
+    """
+    Recompute derived values for many sheets at once, in place.
+
+    Scores, ranks and modifiers are loaded into NumPy arrays so the arithmetic runs column-wise over
+    the whole chunk instead of per sheet. Same rules as app.rules.engine.
+
+    Args:
+        sheets (list[dict]): Section dicts keyed by State field, skills in the API shape or as stored.
+        classes (dict, optional): className -> overrides for baseAttack and/or baseSave (ClassBaseSaves).
+        sizes (dict, optional): sizeName -> ACMod.
+        level_delta (int): Levels to add to every sheet.
+    """
+    classes = classes or {}
+    sizes = sizes or {}
+    n = len(sheets)
+    if n == 0:
+        return
+
+    # House rule and level overrides are plain data edits, applied before the maths
+    for sheet in sheets:
+        details = sheet["characterDetails"]
+        override = classes.get(details["characterClass"]["className"])
+        if override:
+            if "baseAttack" in override:
+                details["characterClass"]["baseAttack"] = override["baseAttack"]
+            if "baseSave" in override:
+                details["characterClass"]["baseSave"] = dict(override["baseSave"])
+        if details["size"]["sizeName"] in sizes:
+            details["size"]["ACMod"] = sizes[details["size"]["sizeName"]]
+        details["level"] += level_delta
+
+    stats = [sheet["stats"] for sheet in sheets]
+    scores = np.array([[s["scores"][a] for a in ABILITIES] for s in stats], dtype=np.int64)
+    temp_active = np.array([bool(s.get("tempScores")) for s in stats])
+    temp_scores = np.array(
+        [[s["tempScores"][a] for a in ABILITIES] if s.get("tempScores") else [10] * 6 for s in stats],
+        dtype=np.int64,
+    )
+    modifiers = (scores - 10) // 2  # Floor division matches 3.5e rounding for negatives
+    temp_modifiers = (temp_scores - 10) // 2
+    effective = np.where(temp_active[:, None], temp_modifiers, modifiers)
+
+    details = [sheet["characterDetails"] for sheet in sheets]
+    base_saves = np.array(
+        [[d["characterClass"]["baseSave"][base] for base in SAVE_BASES] for d in details],
+        dtype=np.int64,
+    )
+    save_mods = np.array(
+        [
+            [
+                sheet["savingThrows"][save]["miscMod"]
+                + sheet["savingThrows"][save]["magicMod"]
+                + sheet["savingThrows"][save]["tempMod"]
+                for save in SAVE_NAMES
+            ]
+            for sheet in sheets
+        ],
+        dtype=np.int64,
+    )
+    save_totals = base_saves + effective[:, SAVE_ABILITIES] + save_mods
+    initiative_misc = np.array(
+        [sheet["bonus"]["initiative"]["miscModifier"] for sheet in sheets], dtype=np.int64
+    )
+    initiative = effective[:, DEXTERITY] + initiative_misc
+
+    # Skills flattened to one row per (sheet, skill), with the container and key its skillMod goes to.
+    # Parallel lists rather than a tuple per skill, which would make the GC walk every sheet again and again
+    owners, abilities, ranks, misc, containers, keys = [], [], [], [], [], []
+    for i, sheet in enumerate(sheets):
+        section = sheet["skills"]
+        if "catalog" in section:  # Compact column, read and written in place rather than expanded
+            for index, ability, skill_ranks, skill_misc in catalog_skills(section):
+                owners.append(i)
+                abilities.append(ABILITY_INDEX[ability])
+                ranks.append(skill_ranks)
+                misc.append(skill_misc)
+                containers.append(section["skillMod"])
+                keys.append(index)
+            skills = section.get("extra", {}).values()
+        else:
+            skills = section["skills"].values()
+        for skill in skills:
+            owners.append(i)
+            abilities.append(ABILITY_INDEX[skill["abilityName"]])
+            ranks.append(skill["ranks"])
+            misc.append(skill["miscMod"])
+            containers.append(skill)
+            keys.append("skillMod")
+    skill_mods = (
+        np.array(ranks, dtype=np.int64)
+        + effective[np.array(owners, dtype=np.int64), np.array(abilities, dtype=np.int64)]
+        + np.array(misc, dtype=np.int64)
+        if containers
+        else np.array([], dtype=np.int64)
+    )
+
+    # Scatter results back into the sheets
+    modifiers_list = modifiers.tolist()
+    temp_modifiers_list = temp_modifiers.tolist()
+    save_totals_list = save_totals.tolist()
+    initiative_list = initiative.tolist()
+    for i, sheet in enumerate(sheets):
+        sheet["stats"]["modifiers"] = dict(zip(ABILITIES, modifiers_list[i]))
+        sheet["stats"]["tempModifiers"] = (
+            dict(zip(ABILITIES, temp_modifiers_list[i])) if temp_active[i] else None
+        )
+        for j, save in enumerate(SAVE_NAMES):
+            sheet["savingThrows"][save]["total"] = save_totals_list[i][j]
+        sheet["bonus"]["initiative"]["initiativeTotal"] = initiative_list[i]
+        sheet["bonus"]["baseAttackBonus"] = details[i]["characterClass"]["baseAttack"]
+        details[i]["ACMod"] = details[i]["size"]["ACMod"]
+    for container, key, value in zip(containers, keys, skill_mods.tolist()):
+        container[key] = value
+
+
+async def recompute_characters(
+    classes: dict[str, dict] | None = None,
+    sizes: dict[str, int] | None = None,
+    level_delta: int = 0,
+    user_id: str | None = None,
+    chunk_size: int = 1000,
+    after_id: str | None = None,
+    progress: Callable[[int, int, str], Awaitable[None]] | None = None,
+) -> dict:
+    """
+    Stream every Character (or one user's) in id order, recompute chunk by chunk and write back changed
+    rows with one batched transaction per chunk.
+
+    Autosave flushes are held off while a chunk is read and written. Saves staged for its characters in
+    the meantime are merged into the chunk and recomputed with it, flushed afterwards they would overwrite
+    the recomputed columns with ones derived under the old rules.
+
+    Args:
+        after_id (str, optional): Start after this character, e.g. the lastId of a cancelled job.
+        progress (callable, optional): Awaited after every chunk with rows scanned, rows updated and the
+            id of the last character done.
+
+    Returns:
+        dict: Rows scanned, rows updated and characters per second.
+    """
+    columns = list(BULK_SECTIONS.values())
+    scanned = updated = 0
+    last_id = after_id
+    started = time.perf_counter()
+    while True:
+        async with autosave_buffer.held():
+            rows = await characters.scan(last_id, chunk_size, columns, user_id=user_id)
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            scanned += len(rows)
+
+            pending = {row["id"]: autosave_buffer.take(row["id"]) for row in rows}
+            for row in rows:  # Unsaved changes are newer than the row
+                row.update({column: value for column, value in pending[row["id"]].items() if column in row})
+            sheets = [{name: row[column] for name, column in BULK_SECTIONS.items()} for row in rows]
+            for sheet in sheets:  # Class overrides and level-ups edit the entries, catalog ids are expanded
+                details = dict(sheet["characterDetails"])
+                sheet["characterDetails"] = rules_catalog.expand(details, retired=True)
+            originals = json.loads(json.dumps(sheets))  # Deep copy for change detection
+            recompute_chunk(sheets, classes, sizes, level_delta)
+
+            changes = []
+            for row, before, after in zip(rows, originals, sheets):
+                data = {
+                    BULK_SECTIONS[name]: after[name]
+                    for name in BULK_SECTIONS
+                    if before[name] != after[name]
+                }
+                if "characterDetails" in data:  # Entries still equal to the catalog's go back as ids
+                    data["characterDetails"] = rules_catalog.compact(data["characterDetails"])
+                if "skills" in data and "catalog" not in data["skills"]:  # Written before the compact format
+                    data["skills"] = encode_skills(data["skills"])
+                if data and level_delta:
+                    data["level"] = after["characterDetails"]["level"]
+                data = {**pending[row["id"]], **data}
+                if data:
+                    changes.append((row["id"], data))
+            if changes:
+                try:
+                    await characters.update_many(changes)  # One transaction per chunk
+                except BaseException:  # Unsaved changes go back, newer ones staged meanwhile win
+                    for character_id, columns in pending.items():
+                        if columns:
+                            newer = autosave_buffer.take(character_id)
+                            autosave_buffer.stage(character_id, {**columns, **newer})
+                    raise
+                updated += len(changes)
+                for character_id, _ in changes:  # Recorded as a version like any other save
+                    character_history.touch(character_id)
+        await sheet_cache.announce([row["id"] for row in rows])
+        logger.info("Bulk recompute: %d scanned, %d updated", scanned, updated)
+        if progress:
+            await progress(scanned, updated, last_id)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "scanned": scanned,
+        "updated": updated,
+        "seconds": elapsed,
+        "characters_per_second": scanned / elapsed if elapsed else 0.0,
+    }
+
+
+class RecomputeJobs:
+    """
+    Bulk recomputes run as background tasks, one at a time, so the request starting one returns at once
+    and neither a client timeout nor a shutdown drain waits on a whole-table scan.
+
+    A job's state is published over the event broker when it starts, after every chunk and when it ends,
+    so every worker answers status polls whichever one runs it. A job cancelled by a shutdown or failed
+    keeps the id of the last character written as lastId: a new job given it as afterId carries on from
+    there without recomputing, or levelling up, what was already done. A running job not heard from for
+    stale_seconds (its worker died) no longer blocks new ones. The newest keep_finished jobs are kept.
+    """
+
+    def __init__(self, broker: Broker, stale_seconds: float = 300, keep_finished: int = 20):
+        self.broker = broker
+        self.stale_seconds = stale_seconds
+        self.keep_finished = keep_finished
+        self.jobs: dict[str, dict] = {}  # job id -> state, oldest first
+        self._running: dict | None = None  # State of the job this worker runs
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        await self.broker.start(self._deliver)
+
+    async def stop(self) -> None:
+        """Cancel the running job, it is left with its lastId, then stop receiving job states"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.broker.stop()
+
+    def submit(
+        self,
+        classes: dict[str, dict],
+        sizes: dict[str, int],
+        level_delta: int,
+        user_id: str | None,
+        chunk_size: int,
+        after_id: str | None,
+    ) -> dict:
+        """
+        Start a job in the background and return its state.
+
+        Raises:
+            HTTPException: 409 while another job is running.
+        """
+        now = time.time()
+        if self._running or any(
+            job["status"] == "running" and now - job["updatedAt"] < self.stale_seconds
+            for job in self.jobs.values()
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="A bulk recompute is already running"
+            )
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": "running",
+            "scanned": 0,
+            "updated": 0,
+            "lastId": after_id,
+            "error": None,
+            "startedAt": now,
+            "updatedAt": now,
+        }
+        self._running = job
+        params = {
+            "classes": classes,
+            "sizes": sizes,
+            "level_delta": level_delta,
+            "user_id": user_id,
+            "chunk_size": chunk_size,
+            "after_id": after_id,
+        }
+        self._task = asyncio.create_task(self._run(job, params))
+        return dict(job)
+
+    def get(self, job_id: str) -> dict | None:
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def _run(self, job: dict, params: dict) -> None:
+        async def progress(scanned: int, updated: int, last_id: str) -> None:
+            job.update(scanned=scanned, updated=updated, lastId=last_id)
+            await self._publish(job)
+
+        await self._publish(job)
+        try:
+            result = await recompute_characters(**params, progress=progress)
+            job.update(status="done", charactersPerSecond=result["characters_per_second"])
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            raise
+        except Exception as e:
+            logger.error("Bulk recompute %s failed after %d characters: %s", job["id"], job["scanned"], e)
+            job.update(status="failed", error=str(e))
+        finally:
+            self._running = None
+            await self._publish(job)
+
+    async def _publish(self, job: dict) -> None:
+        job["updatedAt"] = time.time()
+        self._keep(dict(job))
+        try:
+            await self.broker.publish(job)
+        except Exception as e:  # Polls on other workers lag behind, the job carries on
+            logger.error("Publishing bulk recompute %s state failed: %s", job["id"], e)
+
+    def _deliver(self, message: dict) -> None:
+        if self._running is None or message["id"] != self._running["id"]:  # Own states are kept already
+            self._keep(message)
+
+    def _keep(self, job: dict) -> None:
+        self.jobs.pop(job["id"], None)
+        self.jobs[job["id"]] = job
+        finished = [job_id for job_id, kept in self.jobs.items() if kept["status"] != "running"]
+        for job_id in finished[: max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job_id]
+
+
+# Started and stopped in the app lifespan
+recompute_jobs = RecomputeJobs(broker=create_broker(settings.EVENT_BROKER_URL, channel=RECOMPUTE_CHANNEL))
@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import time
+import httpx
+
+""" Bulk recompute from the command line: python -m app.services.bulk_recompute_cli --level-up 1 """
+
+# The job runs inside the server, which owns the autosave buffer and sheet cache it has to flush and
+# invalidate. Run against the storage from a separate process, buffered saves would overwrite its rows.
+
+
+def main(args) -> None:
+    body = {
+        "classes": json.loads(args.classes) if args.classes else {},
+        "sizes": json.loads(args.sizes) if args.sizes else {},
+        "levelUp": args.level_up,
+        "userId": args.user,
+        "chunkSize": args.chunk_size,
+        "afterId": args.after,
+    }
+    url = f"{args.url.rstrip('/')}/characters/recompute"
+    headers = {"X-Recompute-Token": args.token or ""}
+    with httpx.Client(headers=headers, timeout=30) as client:
+        response = client.post(url, json=body)
+        if response.is_error:
+            raise SystemExit(f"Bulk recompute failed: {response.status_code} {response.text}")
+        job = response.json()
+        while job["status"] == "running":  # The server runs the job, only its progress is polled
+            time.sleep(args.poll_seconds)
+            response = client.get(f"{url}/{job['id']}")
+            if response.is_error:
+                raise SystemExit(f"Polling bulk recompute failed: {response.status_code} {response.text}")
+            job = response.json()
+            print(f"{job['status']}: {job['scanned']} scanned, {job['updated']} updated", flush=True)
+    print(json.dumps(job, indent=2))
+    if job["status"] != "done":
+        raise SystemExit(f"Bulk recompute {job['status']}, rerun with --after {job['lastId']} to carry on")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recompute derived stats for every character after a rules change or level-up"
+    )
+    parser.add_argument(
+        "--classes",
+        help='JSON className -> overrides, e.g. \'{"Fighter": {"baseSave": {"fortitudeBase": 3, "reflexBase": 1, "willBase": 1}}}\'',
+    )
+    parser.add_argument("--sizes", help='JSON sizeName -> ACMod, e.g. \'{"SMALL": 1}\'')
+    parser.add_argument("--level-up", type=int, default=0, help="Levels to add")
+    parser.add_argument("--user", help="Only this user's characters (a party)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--after", help="Start after this character id, the lastId of a stopped job")
+    parser.add_argument("--poll-seconds", type=float, default=2.0)
+    parser.add_argument("--url", default="http://localhost:8000", help="A running server")
+    parser.add_argument(
+        "--token", default=os.environ.get("BULK_RECOMPUTE_TOKEN"), help="Defaults to BULK_RECOMPUTE_TOKEN"
+    )
+    main(parser.parse_args())
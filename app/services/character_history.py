@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+import orjson
+from app.repositories.base import CharacterVersionRepository, DuplicateError
+from app.utils.cache import LRUCache
+from app.utils.json_patch import apply_patch, diff
+from app.utils.serialization import dumps
+
+""" Versioned history of character sheets, stored as JSON Patch deltas with periodic full snapshots """
+
+logger = logging.getLogger(__name__)
+
+
+class CharacterHistory:
+    """
+    Saves only mark a character as changed. A version is recorded once the character has been quiet for
+    coalesce_seconds, or max_delay_seconds after its first unrecorded save, so an editing burst of
+    autosaves becomes one version rather than one per keystroke.
+
+    A version is the diff between the newest stored version and the sheet as it is when recorded, never
+    between what one request saw before and after its write. Versions recorded by different workers
+    therefore always chain, and two workers recording the same version number is caught by the primary
+    key: the loser rebuilds the newest version and diffs again. Each worker marks only the saves it served,
+    reading a character's history records its current sheet first wherever it was saved.
+
+    Every snapshot_every deltas a version stores the whole sheet instead, rebuilding any version takes
+    one snapshot plus at most snapshot_every patches. The newest version of recently saved characters
+    is cached, recording the next one then reads nothing but the current sheet.
+
+    load returns a character's current sheet keyed by State field, None once it is deleted.
+    """
+
+    def __init__(
+        self,
+        repository: CharacterVersionRepository,
+        load: Callable[[str], Awaitable[dict | None]],
+        snapshot_every: int,
+        coalesce_seconds: float,
+        max_delay_seconds: float,
+        retention_days: float,
+        max_versions: int,
+        compact_seconds: float,
+        cache_entries: int,
+        enabled: bool = True,
+    ):
+        self.repository = repository
+        self.load = load
+        self.snapshot_every = snapshot_every
+        self.coalesce_seconds = coalesce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.retention_days = retention_days
+        self.max_versions = max_versions
+        self.compact_seconds = compact_seconds
+        self.enabled = enabled
+
+        self._first_change: dict[str, float] = {}  # Characters saved since their last version
+        self._last_change: dict[str, float] = {}
+        self._heads = LRUCache(cache_entries)  # character id -> (version, snapshot version, sheet bytes)
+        self._record_lock = asyncio.Lock()
+        self._compacted_at = time.monotonic()
+        self._task: asyncio.Task | None = None
+
+        # Metrics
+        self.versions = 0
+        self.snapshots = 0
+        self.unchanged = 0
+        self.conflicts = 0
+        self.failed = 0
+        self.snapshot_bytes = 0
+        self.delta_bytes = 0
+        self.compacted_versions = 0
+
+    def touch(self, character_id: str) -> None:
+        """A save was made, record a version once the character has been quiet for a while"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        self._first_change.setdefault(character_id, now)
+        self._last_change[character_id] = now
+
+    def forget(self, character_id: str) -> None:
+        """The character was deleted, its stored versions go with it"""
+        self._first_change.pop(character_id, None)
+        self._last_change.pop(character_id, None)
+        self._heads.pop(character_id)
+
+    async def _head(self, character_id: str) -> tuple[int, int, dict] | None:
+        """(version, its snapshot's version, sheet) of the newest stored version"""
+        head = self._heads.get(character_id)
+        if head is not None:
+            version, base, body = head
+            return version, base, orjson.loads(body)
+        rows = await self.repository.chain(character_id)
+        if not rows:
+            return None
+        return rows[-1]["version"], rows[0]["version"], _rebuild(rows)
+
+    async def _record(self, character_id: str) -> None:
+        sheet = await self.load(character_id)
+        if sheet is None:
+            self.forget(character_id)
+            return
+        for attempt in range(2):
+            head = await self._head(character_id)
+            version, base = (head[0] + 1, head[1]) if head else (1, 1)
+            snapshot = head is None or version - base > self.snapshot_every
+            if snapshot:
+                data, base = sheet, version
+            else:
+                data = diff(head[2], sheet)
+                if not data:
+                    self.unchanged += 1
+                    return
+            size = len(dumps(data))
+            try:
+                await self.repository.append(
+                    {
+                        "characterId": character_id,
+                        "version": version,
+                        "snapshot": snapshot,
+                        "data": data,
+                        "size": size,
+                    }
+                )
+            except DuplicateError:  # Recorded by another worker meanwhile, diff against that one
+                self._heads.pop(character_id)
+                self.conflicts += 1
+                if attempt:
+                    raise
+                continue
+            # Copied out, orjson's bytes keep its whole output buffer allocated
+            self._heads.set(character_id, (version, base, memoryview(dumps(sheet)).tobytes()), math.inf)
+            self.versions += 1
+            if snapshot:
+                self.snapshots += 1
+                self.snapshot_bytes += size
+            else:
+                self.delta_bytes += size
+            return
+
+    def _due(self, now: float) -> list[str]:
+        return [
+            character_id
+            for character_id, last in self._last_change.items()
+            if now - last >= self.coalesce_seconds
+            or now - self._first_change[character_id] >= self.max_delay_seconds
+        ]
+
+    async def flush(self, character_id: str | None = None, everything: bool = True) -> None:
+        """
+        Record a version of characters saved since their last one: of one character, of every one, or of
+        only those that are due. One character is recorded whether or not this worker served its saves,
+        another worker may have, an unchanged sheet records nothing.
+        """
+        async with self._record_lock:
+            if character_id is not None:
+                character_ids = [character_id] if self.enabled else []
+            elif everything:
+                character_ids = list(self._last_change)
+            else:
+                character_ids = self._due(time.monotonic())
+            for character_id in character_ids:
+                # Saves arriving while this one records start the next version
+                self._first_change.pop(character_id, None)
+                self._last_change.pop(character_id, None)
+                try:
+                    await self._record(character_id)
+                except Exception as e:
+                    self.failed += 1
+                    logger.error("Recording a version of character %s failed: %s", character_id, e)
+                    self.touch(character_id)  # Retried with the next flush
+
+    async def sheet_at(self, character_id: str, version: int) -> tuple[dict, dict] | None:
+        """(version row without its data, sheet) of a stored version, None if there is no such version"""
+        rows = await self.repository.chain(character_id, version)
+        if not rows or rows[-1]["version"] != version:
+            return None
+        meta = {key: value for key, value in rows[-1].items() if key != "data"}
+        return meta, _rebuild(rows)
+
+    async def list_page(self, character_id: str, limit: int, before: int | None) -> list[dict]:
+        return await self.repository.list_page(character_id, limit, before)
+
+    async def compact(self) -> int:
+        """
+        Drop versions past HISTORY_RETENTION_DAYS or HISTORY_MAX_VERSIONS. The oldest version kept is
+        rewritten as a snapshot first, so every kept version can still be rebuilt. Returns versions dropped.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        dropped = 0
+        while True:
+            candidates = await self.repository.compaction_candidates(cutoff, self.max_versions, limit=100)
+            for character_id, floor in candidates:
+                found = await self.sheet_at(character_id, floor)
+                if found is None:  # Deleted meanwhile
+                    continue
+                _, sheet = found
+                dropped += await self.repository.compact(character_id, floor, sheet, len(dumps(sheet)))
+                self._heads.pop(character_id)  # Its snapshot may have moved
+            if len(candidates) < 100:
+                break
+        self.compacted_versions += dropped
+        return dropped
+
+    async def usage(self) -> dict:
+        """
+        Storage held by history, against storing a full copy of the sheet per version instead. The full
+        copy size is estimated from the snapshots, which are exactly that.
+        """
+        usage = await self.repository.usage()
+        versions, snapshots = usage["versions"], usage["snapshots"]
+        stored = usage["snapshot_bytes"] + usage["delta_bytes"]
+        full_copy = usage["snapshot_bytes"] / snapshots if snapshots else 0.0
+        return {
+            **usage,
+            "bytes_per_1000_versions": stored / versions * 1000 if versions else 0.0,
+            "full_copy_bytes_per_1000_versions": full_copy * 1000,
+            "saved_ratio": 1 - stored / (full_copy * versions) if versions and full_copy else 0.0,
+        }
+
+    async def _run(self) -> None:
+        interval = min(self.coalesce_seconds, self.max_delay_seconds, self.compact_seconds) or 1.0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush(everything=False)
+                if time.monotonic() - self._compacted_at >= self.compact_seconds:
+                    self._compacted_at = time.monotonic()
+                    dropped = await self.compact()
+                    if dropped:
+                        logger.info("Character history compaction dropped %d versions", dropped)
+            except Exception as e:  # Keep the loop alive, next tick retries
+                logger.error("Character history loop error: %s", e)
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background loop and record a version of every character saved since its last one"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "unrecorded_characters": len(self._last_change),
+            "versions": self.versions,
+            "snapshots": self.snapshots,
+            "unchanged": self.unchanged,
+            "conflicts": self.conflicts,
+            "failed": self.failed,
+            "snapshot_bytes": self.snapshot_bytes,
+            "delta_bytes": self.delta_bytes,
+            "compacted_versions": self.compacted_versions,
+            "cached_heads": len(self._heads),
+        }
+
+
+def _rebuild(rows: list[dict]) -> dict:
+    """Sheet of the last of chain() rows: the snapshot with every delta applied in one pass"""
+    return apply_patch(rows[0]["data"], [operation for row in rows[1:] for operation in row["data"]])
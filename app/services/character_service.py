@@ -0,0 +1,577 @@
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from app.config import settings
+from app.repositories import character_versions, characters
+from app.repositories.base import SEARCH_COLUMNS, CharacterFilters
+from app.schemas.characters import (
+    Bonus,
+    CharacterDetails,
+    CharacterSection,
+    SavingThrows,
+    Skills,
+    State,
+    Stats,
+    Status,
+)
+from app.rules.catalog import CATALOG_FIELDS, CatalogError, rules_catalog
+from app.rules.engine import RULE_SECTIONS, get_path, rules_engine
+from app.rules.skills import decode_skills, encode_skills
+from app.services.autosave import AutosaveBuffer
+from app.services.character_history import CharacterHistory
+from app.services.character_stats import CharacterStats
+from app.services.events import EventHub, Subscriber, create_broker
+from app.services.sheet_cache import CachedSheet, SheetCache
+from app.utils.json_patch import JsonPatchError, apply_patch, diff, parse_pointer, to_pointer
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_page, parse_fields
+from app.utils.serialization import body_validation_error
+
+# State section -> (Character Json column, pydantic model validating it)
+SECTIONS: dict[str, tuple[str, type[BaseModel]]] = {
+    CharacterSection.characterDetails: ("characterDetails", CharacterDetails),
+    CharacterSection.stats: ("stats", Stats),
+    CharacterSection.status: ("status", Status),
+    CharacterSection.bonus: ("bonuses", Bonus),
+    CharacterSection.savingThrows: ("savingThrows", SavingThrows),
+    CharacterSection.skills: ("skills", Skills),
+}
+COLUMN_SECTIONS = {column: section for section, (column, _) in SECTIONS.items()}
+
+# Fields exposed by character listings, field -> Character column
+CHARACTER_FIELDS = {
+    **{
+        field: field
+        for field in ("id", "userId", "characterName", "characterClass", "race", "level")
+    },
+    "createdAt": "createdAt",
+    "updatedAt": "updatedAt",
+    **{section.value: column for section, (column, _) in SECTIONS.items()},
+}
+DEFAULT_CHARACTER_FIELDS = ["id", "characterName", "characterClass", "race", "level", "updatedAt"]
+
+SHEET_INVALIDATION_CHANNEL = "sheet-invalidations"
+
+# Serialised sheets for GET /characters/{id}, invalidated by every write below in every worker
+sheet_cache = SheetCache(
+    max_entries=settings.SHEET_CACHE_MAX_ENTRIES,
+    max_bytes=settings.SHEET_CACHE_MAX_BYTES,
+    ttl_seconds=settings.SHEET_CACHE_TTL_SECONDS,
+    broker=create_broker(settings.EVENT_BROKER_URL, channel=SHEET_INVALIDATION_CHANNEL),
+)
+
+
+def _invalidate_flushed(character_ids: list[str]) -> None:
+    for character_id in character_ids:  # updatedAt moved on, only buffered with a single worker
+        sheet_cache.invalidate(character_id)
+
+
+# Pending saves are held by the worker that received them and invisible to the others, so saves are only
+# buffered when a single worker serves every request. With more, each one is written through
+AUTOSAVE_BUFFERED = settings.AUTOSAVE_ENABLED and settings.WEB_CONCURRENCY == 1
+
+# Coalesces rapid saves of the same character, started and flushed in the app lifespan
+autosave_buffer = AutosaveBuffer(
+    write=characters.update_many,
+    debounce_seconds=settings.AUTOSAVE_DEBOUNCE_SECONDS,
+    max_delay_seconds=settings.AUTOSAVE_MAX_DELAY_SECONDS,
+    max_pending=settings.AUTOSAVE_MAX_PENDING,
+    batch_size=settings.AUTOSAVE_BATCH_SIZE,
+    on_flushed=_invalidate_flushed,
+)
+
+STATS_CHANNEL = "character-stats"
+
+# Class, race, level and per-user counts, reconciled with storage in the background from the app lifespan
+character_stats = CharacterStats(
+    aggregate=characters.aggregate,
+    interval_seconds=settings.CHARACTER_STATS_RECONCILE_SECONDS,
+    broker=create_broker(settings.EVENT_BROKER_URL, channel=STATS_CHANNEL),
+    before_reconcile=autosave_buffer.flush,
+)
+
+
+async def _current_sheet(character_id: str) -> dict | None:
+    """Every section keyed by State field, unsaved autosave changes included, None if deleted"""
+    character = await characters.find_by_id(character_id)
+    if character is None:
+        return None
+    response = _to_response(character)
+    return {section.value: response[section.value] for section in SECTIONS}
+
+
+# Versions of every sheet, recorded and compacted in the background from the app lifespan
+character_history = CharacterHistory(
+    repository=character_versions,
+    load=_current_sheet,
+    snapshot_every=settings.HISTORY_SNAPSHOT_EVERY,
+    coalesce_seconds=settings.HISTORY_COALESCE_SECONDS,
+    max_delay_seconds=settings.HISTORY_MAX_DELAY_SECONDS,
+    retention_days=settings.HISTORY_RETENTION_DAYS,
+    max_versions=settings.HISTORY_MAX_VERSIONS,
+    compact_seconds=settings.HISTORY_COMPACT_SECONDS,
+    cache_entries=settings.HISTORY_CACHE_ENTRIES,
+    enabled=settings.HISTORY_ENABLED,
+)
+
+# Live sheet deltas for WebSocket subscribers, started and stopped in the app lifespan
+event_hub = EventHub(
+    broker=create_broker(settings.EVENT_BROKER_URL),
+    queue_size=settings.EVENT_QUEUE_SIZE,
+)
+
+
+def _searchable_fields(details: dict) -> dict:
+    """Denormalised Character columns kept in sync with characterDetails"""
+    return {
+        "characterName": details["characterName"],
+        "characterClass": details["characterClass"]["className"],
+        "race": details["race"]["raceName"],
+        "level": details["level"],
+    }
+
+
+def _counted(user_id: str, details: dict) -> dict:
+    """What character_stats counts a character by"""
+    fields = _searchable_fields(details)
+    return {"userId": user_id, **{column: fields[column] for column in ("characterClass", "race", "level")}}
+
+
+def _validate_section(section: str, data: object) -> BaseModel:
+    """
+    Validate a single section with its own model, not the whole State.
+    Raw request bytes are parsed and validated in one pass by pydantic-core.
+    """
+    _, model = SECTIONS[section]
+    try:
+        if isinstance(data, (bytes, str)):
+            return model.model_validate_json(data)
+        return model.model_validate(data)
+    except ValidationError as e:
+        raise body_validation_error(e, data)
+
+
+def _unknown_catalog_id(e: CatalogError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+
+def _section_data(data: BaseModel) -> dict:
+    section = data.model_dump(mode="json")  # Sets -> lists, enums -> values
+    if isinstance(data, CharacterDetails):
+        try:
+            rules_catalog.expand(section)  # Class, race or size sent as a catalog id
+        except CatalogError as e:
+            raise _unknown_catalog_id(e)
+    return section
+
+
+def _state_sections(state: State) -> dict:
+    """State -> section dicts keyed by State field, with every derived value recomputed"""
+    sheet = {section.value: _section_data(getattr(state, section.value)) for section in SECTIONS}
+    rules_engine.recompute_all(sheet)  # Server is authoritative for derived values
+    return sheet
+
+
+def _to_columns(sheet: dict) -> dict:
+    """Section dicts -> Character column values, including the denormalised search columns"""
+    columns = {SECTIONS[name][0]: data for name, data in sheet.items()}
+    if "characterDetails" in columns:
+        columns["characterDetails"] = rules_catalog.compact(columns["characterDetails"])
+    if "skills" in columns:
+        columns["skills"] = encode_skills(columns["skills"])
+    if CharacterSection.characterDetails.value in sheet:
+        columns.update(_searchable_fields(sheet[CharacterSection.characterDetails.value]))
+    return columns
+
+
+def _from_column(column: str, value):
+    """Stored column value -> the API shape of its section"""
+    if column == "characterDetails":
+        return rules_catalog.expand(dict(value), retired=True)
+    if column == "skills":
+        return decode_skills(value)
+    return value
+
+
+def _to_response(character) -> dict:
+    """Stored Character -> API shape, the State sections plus row metadata"""
+    response = {
+        "id": character.id,
+        "userId": character.userId,
+        "createdAt": character.createdAt,
+        "updatedAt": character.updatedAt,
+    }
+    for section, (column, _) in SECTIONS.items():
+        response[section.value] = _from_column(column, getattr(character, column))
+    # Unsaved autosave changes are newer than the row
+    for column, value in autosave_buffer.pending(character.id).items():
+        if column in COLUMN_SECTIONS:
+            response[COLUMN_SECTIONS[column].value] = _from_column(column, value)
+    return response
+
+
+def _check_owner(owner_id: str | None, user_id: str) -> None:
+    if owner_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Character not found")
+    if owner_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Character belongs to another user"
+        )
+
+
+async def _check_access(character_id: str, user_id: str) -> None:
+    """Ownership check reading only the userId column"""
+    _check_owner(await characters.owner_of(character_id), user_id)
+
+
+async def _check_access_details(character_id: str, user_id: str) -> dict:
+    """Ownership check that also returns characterDetails, unsaved autosave changes included"""
+    row = await characters.get_column(character_id, "characterDetails")
+    _check_owner(row[0] if row else None, user_id)
+    details = autosave_buffer.pending(character_id).get("characterDetails", row[1])
+    return _from_column("characterDetails", details)
+
+
+async def check_catalog_references() -> None:
+    """
+    Refuse to start with a rules catalog missing ids stored characters reference, reading them would
+    fail. Entries taken out of the catalog belong in its "retired" tables.
+    """
+    unknown = rules_catalog.unknown_ids(await characters.catalog_references(list(CATALOG_FIELDS)))
+    if unknown:
+        raise RuntimeError(
+            f"Stored characters reference rules catalog ids it does not have, add them to its retired "
+            f"tables: {unknown}"
+        )
+
+
+async def create_character(user_id: str, state: State):
+    sheet = _state_sections(state)
+    character = await characters.create({"userId": user_id, **_to_columns(sheet)})
+    await character_stats.apply(None, _counted(user_id, sheet[CharacterSection.characterDetails.value]))
+    character_history.touch(character.id)
+    return _to_response(character)
+
+
+async def get_character(character_id: str, user_id: str):
+    character = await characters.find_by_id(character_id)
+    _check_owner(character.userId if character else None, user_id)
+    return _to_response(character)
+
+
+async def get_character_cached(character_id: str, user_id: str) -> CachedSheet:
+    """
+    Full sheet as cached response bytes with its ETag.
+    A cache hit reads neither the database nor serialises, ownership is checked against the owner kept
+    with the entry. Buffered autosaves invalidate the entry when staged, writes by other workers when
+    their invalidation arrives over the broker, until then (milliseconds) they may serve the previous sheet.
+    """
+    entry = sheet_cache.get(character_id)
+    if entry is not None:
+        _check_owner(entry.user_id, user_id)
+        return entry
+    loaded_at = sheet_cache.invalidations
+    character = await get_character(character_id, user_id)
+    return sheet_cache.put(character_id, character["userId"], character, loaded_at)
+
+
+async def list_characters(
+    user_id: str, limit: int, cursor: str | None = None, fields: str | None = None
+):
+    """
+    Keyset paginated listing of a user's characters ordered by (createdAt, id).
+
+    Served by the (userId, createdAt, id) index, deep pages cost the same as the first one.
+    Defaults to summary fields, sections are only loaded when named in fields.
+    """
+    selected = parse_fields(fields, CHARACTER_FIELDS, DEFAULT_CHARACTER_FIELDS)
+    after = decode_cursor(cursor) if cursor else None
+    columns = [CHARACTER_FIELDS[field] for field in selected]
+    rows = await characters.list_page(user_id, limit + 1, after, columns)
+    items = []
+    for row in rows:
+        row.update(autosave_buffer.pending(row["id"]))  # Unsaved changes are newer than the row
+        for column in ("characterDetails", "skills"):
+            if column in row:
+                row[column] = _from_column(column, row[column])
+        items.append({field: row[column] for field, column in CHARACTER_FIELDS.items() if column in row})
+    return keyset_page(items, limit, selected, "createdAt")
+
+
+async def search_characters(
+    name: str | None,
+    fuzzy: bool,
+    filters: CharacterFilters,
+    limit: int,
+    cursor: str | None = None,
+):
+    """
+    Keyset paginated search over the denormalised summary columns, the JSON sections are never read.
+
+    Prefix searches (and filter-only searches) are ordered by lowercased name and id and seek through
+    the name index. Fuzzy searches match names by trigram similarity, best match first, each item
+    carrying its score. Results reflect saved rows, autosaves still buffered show up once flushed.
+    """
+    if fuzzy and not (name and name.strip()):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Fuzzy search needs a name")
+    after = decode_cursor(cursor) if cursor else None
+    if after and fuzzy:
+        try:
+            after = (float(after[0]), after[1])
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    rows = await characters.search(
+        name, fuzzy, filters, limit + 1, after, settings.CHARACTER_SEARCH_FUZZY_THRESHOLD
+    )
+    if fuzzy:
+        return keyset_page(rows, limit, [*SEARCH_COLUMNS, "score"], "score")
+    return keyset_page(rows, limit, list(SEARCH_COLUMNS), "nameKey")
+
+
+async def replace_character(character_id: str, user_id: str, state: State):
+    """Overwrite every section, for full sheet saves"""
+    before = await _check_access_details(character_id, user_id)
+    sheet = _state_sections(state)
+    await _save(character_id, _to_columns(sheet))
+    await character_stats.apply(
+        _counted(user_id, before),
+        _counted(user_id, sheet[CharacterSection.characterDetails.value]),
+    )
+    await event_hub.publish(character_id, {"type": "reload"})  # Whole sheet changed, clients refetch
+    return await get_character(character_id, user_id)
+
+
+async def delete_character(character_id: str, user_id: str) -> None:
+    details = await _check_access_details(character_id, user_id)
+    autosave_buffer.discard(character_id)
+    if await characters.delete(character_id):  # Not when a concurrent delete got there first
+        await character_stats.apply(_counted(user_id, details), None)
+    character_history.forget(character_id)
+    await sheet_cache.announce([character_id])
+    await event_hub.publish(character_id, {"type": "deleted"})
+
+
+async def list_versions(character_id: str, user_id: str, limit: int, cursor: str | None = None) -> dict:
+    """
+    Keyset paginated versions of a character, newest first, without their sheets.
+    Saves not recorded as a version yet are recorded first, so the newest version is the current sheet.
+    """
+    await _check_access(character_id, user_id)
+    await character_history.flush(character_id)
+    before = None
+    if cursor:
+        try:
+            before = int(decode_cursor(cursor)[1])
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    rows = await character_history.list_page(character_id, limit + 1, before)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]["createdAt"], str(rows[-1]["version"])) if has_more else None
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+async def _version_sheet(character_id: str, version: int) -> tuple[dict, dict]:
+    found = await character_history.sheet_at(character_id, version)
+    if found is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Version {version} not found, it may have been compacted away",
+        )
+    return found
+
+
+async def get_version(character_id: str, user_id: str, version: int) -> dict:
+    """A version of a character: when it was recorded and the whole sheet as it was then"""
+    await _check_access(character_id, user_id)
+    await character_history.flush(character_id)
+    meta, sheet = await _version_sheet(character_id, version)
+    return {"version": version, "createdAt": meta["createdAt"], **sheet}
+
+
+async def diff_versions(character_id: str, user_id: str, version: int, base: int | None = None) -> dict:
+    """JSON Patch operations on the State turning version base (the one before by default) into version"""
+    await _check_access(character_id, user_id)
+    await character_history.flush(character_id)
+    base = version - 1 if base is None else base
+    _, source = await _version_sheet(character_id, base)
+    _, target = await _version_sheet(character_id, version)
+    return {"from": base, "to": version, "ops": diff(source, target)}
+
+
+async def restore_version(character_id: str, user_id: str, version: int):
+    """
+    Overwrite a character with an earlier version, e.g. to undo. History is never rewritten: the restored
+    sheet is recorded as a new version, so a restore can be undone as well.
+
+    Raises:
+        HTTPException: 404 if the version does not exist, 422 if it no longer passes validation.
+    """
+    await _check_access(character_id, user_id)
+    await character_history.flush(character_id)  # Edits since the last version become one first
+    _, sheet = await _version_sheet(character_id, version)
+    try:
+        state = State.model_validate(sheet)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors(include_url=False, include_context=False),
+        )
+    character = await replace_character(character_id, user_id, state)
+    await character_history.flush(character_id)
+    return character
+
+
+async def watch_character(subscriber: Subscriber, character_id: str, user_id: str) -> None:
+    """
+    Subscribe a WebSocket connection to a character's live updates, same access rules as reading it:
+    owner only, other users (a GM included) get the 403.
+
+    GM access is planned as parties rather than per sheet grants: a Party row (id, gmUserId) and
+    PartyMember rows (partyId, characterId) maintained by party routes, the owner adding a character to
+    a party. The ownership checks then read (userId, GM ids) in one query and let a GM read and watch,
+    not write, the party's characters. Watching moves over first, reading the sheet follows.
+    """
+    await _check_access(character_id, user_id)
+    event_hub.subscribe(subscriber, character_id)
+
+
+async def get_section(character_id: str, user_id: str, section: CharacterSection):
+    """Read a single section column rather than the whole row"""
+    column, _ = SECTIONS[section]
+    pending = autosave_buffer.pending(character_id)
+    if column in pending:  # Unsaved change, only ownership needs the database
+        await _check_access(character_id, user_id)
+        return _from_column(column, pending[column])
+    row = await characters.get_column(character_id, column)
+    _check_owner(row[0] if row else None, user_id)
+    return _from_column(column, row[1])
+
+
+async def _load_sheet(character_id: str, user_id: str) -> dict:
+    """Every section of a character keyed by State field, pending autosave changes included"""
+    character = await get_character(character_id, user_id)
+    return {section.value: character[section.value] for section in SECTIONS}
+
+
+async def update_section(
+    character_id: str, user_id: str, section: CharacterSection, data: object
+):
+    """
+    Validate and write one section.
+
+    Sections without rule inputs (status) only touch their own column. Otherwise the derived values
+    depending on the section are recomputed and the sections they live in are written as well.
+
+    Returns:
+        dict: Every section written, keyed by State field.
+    """
+    section_data = _section_data(_validate_section(section, data))
+    ops = [{"op": "replace", "path": to_pointer([section.value]), "value": section_data}]
+    if section.value not in RULE_SECTIONS:
+        await _check_access(character_id, user_id)
+        return await _write_sections(character_id, {section.value: section_data}, ops)
+    sheet = await _load_sheet(character_id, user_id)
+    before = _counted(user_id, sheet[CharacterSection.characterDetails.value])
+    sheet[section.value] = section_data
+    return await _recompute_and_write(
+        character_id, user_id, sheet, before, section, [(section.value,)], ops
+    )
+
+
+async def patch_section(
+    character_id: str, user_id: str, section: CharacterSection, operations: list[dict]
+):
+    """
+    Apply JSON Patch operations inside one section, e.g. replace /health/currentHealth in status.
+
+    The patched section is re-validated on its own. Only derived values reading the patched paths are
+    recomputed, e.g. a dexterity change updates the modifier, reflex, initiative and dexterity skills.
+
+    Returns:
+        dict: Every section written, keyed by State field.
+    """
+    sheet = None
+    if section.value in RULE_SECTIONS:
+        sheet = await _load_sheet(character_id, user_id)
+        before = _counted(user_id, sheet[CharacterSection.characterDetails.value])
+        current = sheet[section.value]
+    else:
+        current = await get_section(character_id, user_id, section)
+    if section == CharacterSection.characterDetails:
+        try:
+            operations = rules_catalog.expand_operations(operations)
+        except CatalogError as e:
+            raise _unknown_catalog_id(e)
+    try:
+        patched = apply_patch(current, operations)
+        changed = [
+            (section.value, *parse_pointer(path))
+            for op in operations
+            for path in (op["path"], op.get("from"))
+            if path is not None
+        ]
+    except JsonPatchError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    section_data = _section_data(_validate_section(section, patched))
+    ops = _state_ops(section, operations)
+    if sheet is None:
+        return await _write_sections(character_id, {section.value: section_data}, ops)
+    sheet[section.value] = section_data
+    return await _recompute_and_write(character_id, user_id, sheet, before, section, changed, ops)
+
+
+def _state_ops(section: CharacterSection, operations: list[dict]) -> list[dict]:
+    """Section relative patch operations -> operations on the whole State, test operations left out"""
+    prefix = to_pointer([section.value])
+    ops = []
+    for op in operations:
+        if op["op"] == "test":
+            continue
+        op = {**op, "path": prefix + op["path"]}
+        if op.get("from") is not None:
+            op["from"] = prefix + op["from"]
+        ops.append(op)
+    return ops
+
+
+async def _recompute_and_write(
+    character_id: str,
+    user_id: str,
+    sheet: dict,
+    before: dict,
+    section: CharacterSection,
+    changed: list[tuple],
+    ops: list[dict],
+) -> dict:
+    updated = rules_engine.recompute(sheet, changed)
+    names = {section.value} | {path[0] for path in updated}
+    # Recomputed values follow the client's own edit, "add" also covers keys that did not exist yet.
+    # Sections replaced wholesale already carry theirs.
+    replaced = {op["path"] for op in ops if op["op"] == "replace"}
+    ops = ops + [
+        {"op": "add", "path": to_pointer(path), "value": get_path(sheet, path)}
+        for path in sorted(updated)
+        if to_pointer(path[:1]) not in replaced
+    ]
+    written = await _write_sections(character_id, {name: sheet[name] for name in names}, ops)
+    # Class, race or level may have changed, only the characterDetails section holds them
+    await character_stats.apply(before, _counted(user_id, sheet[CharacterSection.characterDetails.value]))
+    return written
+
+
+async def _write_sections(character_id: str, sections: dict, ops: list[dict]) -> dict:
+    """Save sections and broadcast the change to subscribers as JSON Patch operations on the State"""
+    await _save(character_id, _to_columns(sections))
+    await event_hub.publish(character_id, {"type": "patch", "ops": ops})
+    return sections
+
+
+async def _save(character_id: str, columns: dict) -> None:
+    """Write changed columns, through the autosave buffer when it is in use"""
+    sheet_cache.invalidate(character_id)
+    character_history.touch(character_id)
+    if AUTOSAVE_BUFFERED:
+        autosave_buffer.stage(character_id, columns)
+        return
+    await characters.update(character_id, columns)
+    # Again, a read may have cached the old row meanwhile, and in every other worker now it has committed
+    await sheet_cache.announce([character_id])
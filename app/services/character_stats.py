@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import Counter
+from typing import Awaitable, Callable
+from app.repositories.base import AGGREGATE_COLUMNS
+from app.services.events import Broker
+from app.services.sheet_cache import _etag
+from app.utils.serialization import dumps
+
+""" Class, race and level distributions and per-user character counts, kept up to date in memory """
+
+logger = logging.getLogger(__name__)
+
+# Distributions served by the stats endpoint, per-user counts are looked up one user at a time
+DISTRIBUTIONS = {"characterClass": "classes", "race": "races", "level": "levels"}
+
+
+class CharacterStats:
+    """
+    Counts adjusted by the character service on every create, update of the summary columns and delete,
+    so serving them costs a dict lookup or a cached body, never a query.
+
+    A worker applies the changes it serves at once and publishes them over the broker, every other worker
+    (EVENT_BROKER_URL) applies them when they arrive. Every interval_seconds, and right after a lost
+    broker connection is back, the counts are replaced from one aggregate query over the Character table:
+    changes missed meanwhile show up then, and so does anything that bypassed the service (bulk recompute
+    level-ups, characters deleted with their user). How far the counts had drifted is kept as a metric.
+    """
+
+    def __init__(
+        self,
+        aggregate: Callable[[], Awaitable[dict]],
+        interval_seconds: float,
+        broker: Broker,
+        before_reconcile: Callable[[], Awaitable[None]] | None = None,
+    ):
+        self.aggregate = aggregate
+        self.interval_seconds = interval_seconds
+        self.broker = broker
+        self.before_reconcile = before_reconcile
+        self.origin = uuid.uuid4().hex  # Tells this worker's own changes apart when the broker echoes them
+        self.total = 0
+        self.counts: dict[str, Counter] = {column: Counter() for column in AGGREGATE_COLUMNS}
+        self._body: bytes | None = None  # Serialised distributions until the next change
+        self._etag: str | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        # Metrics
+        self.applied = 0
+        self.received = 0
+        self.reconciles = 0
+        self.failed_reconciles = 0
+        self.last_drift = 0
+        self.reconciled_at = 0.0
+
+    async def start(self) -> None:
+        await self.broker.start(self._deliver, self._wakeup.set)
+        await self.reconcile()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.broker.stop()
+
+    def _count(self, summary: dict, delta: int) -> None:
+        self.total += delta
+        for column, counter in self.counts.items():
+            value = summary[column]
+            counter[value] += delta
+            if counter[value] <= 0:
+                del counter[value]
+
+    async def apply(self, before: dict | None, after: dict | None) -> None:
+        """
+        A character changed from before to after, each a dict of AGGREGATE_COLUMNS or None when it did
+        not exist (created) or no longer does (deleted). Counted here and in every other worker.
+        """
+        if before is not None and after is not None:
+            if all(before[column] == after[column] for column in AGGREGATE_COLUMNS):
+                return
+        self._apply(before, after)
+        self.applied += 1
+        try:
+            await self.broker.publish({"origin": self.origin, "before": before, "after": after})
+        except Exception as e:  # Other workers catch up at their next reconcile
+            logger.error("Publishing a character stats change failed: %s", e)
+
+    def _apply(self, before: dict | None, after: dict | None) -> None:
+        if before is not None:
+            self._count(before, -1)
+        if after is not None:
+            self._count(after, 1)
+        self._changed()
+
+    def _deliver(self, message: dict) -> None:
+        if message["origin"] != self.origin:
+            self.received += 1
+            self._apply(message["before"], message["after"])
+
+    def _changed(self) -> None:
+        self._body = self._etag = None
+
+    def distributions(self) -> tuple[bytes, str]:
+        """
+        Body and ETag, serialised once per change. The size depends on distinct values, not on characters.
+        The ETag hashes the body so that workers with the same counts agree on it.
+        """
+        if self._body is None:
+            self._body = dumps(
+                {
+                    "total": self.total,
+                    **{
+                        name: dict(sorted(self.counts[column].items()))
+                        for column, name in DISTRIBUTIONS.items()
+                    },
+                    "users": len(self.counts["userId"]),
+                }
+            )
+            self._etag = _etag(self._body)
+        return self._body, self._etag
+
+    def user_count(self, user_id: str) -> int:
+        return self.counts["userId"].get(user_id, 0)
+
+    async def reconcile(self) -> None:
+        """
+        Replace the counts with fresh ones from storage. A write applied while the query runs can be
+        counted twice or not at all until the next reconcile.
+        """
+        if self.before_reconcile:  # Buffered writes, or the query would not see them yet
+            await self.before_reconcile()
+        fresh = await self.aggregate()
+        counts = {column: Counter(fresh[column]) for column in AGGREGATE_COLUMNS}
+        drift = abs(fresh["total"] - self.total) + sum(
+            abs(counts[column][value] - self.counts[column][value])
+            for column in AGGREGATE_COLUMNS
+            for value in counts[column].keys() | self.counts[column].keys()
+        )
+        self.total, self.counts = fresh["total"], counts
+        self._changed()
+        self.last_drift = drift
+        self.reconciles += 1
+        self.reconciled_at = time.time()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.reconcile()
+                if self.last_drift:
+                    logger.info("Character stats reconciled, corrected a drift of %d", self.last_drift)
+            except Exception as e:  # Keep serving the incremental counts, retry next interval
+                self.failed_reconciles += 1
+                logger.error("Character stats reconcile failed: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "characters": self.total,
+            "applied": self.applied,
+            "received": self.received,
+            "reconciles": self.reconciles,
+            "failed_reconciles": self.failed_reconciles,
+            "last_drift": self.last_drift,
+            "seconds_since_reconcile": time.time() - self.reconciled_at if self.reconciled_at else 0.0,
+        }
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable
+from app.utils.serialization import dumps
+
+""" Character sheet change events, fanned out to WebSocket subscribers """
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "character-events"
+
+Deliver = Callable[[dict], None]
+
+
+class Broker(ABC):
+    """
+    Transport between the process publishing an event and the processes holding subscribers.
+    Every received message is handed to the deliver callback given to start(). resubscribed is called
+    after a lost connection was re-established, messages published meanwhile never arrive.
+    """
+
+    @abstractmethod
+    async def start(self, deliver: Deliver, resubscribed: Callable[[], None] | None = None) -> None: ...
+
+    @abstractmethod
+    async def publish(self, message: dict) -> None: ...
+
+    @abstractmethod
+    async def stop(self) -> None: ...
+
+
+class LocalBroker(Broker):
+    """Single process, events are delivered straight to this process' subscribers"""
+
+    def __init__(self):
+        self._deliver: Deliver | None = None
+
+    async def start(self, deliver: Deliver, resubscribed: Callable[[], None] | None = None) -> None:
+        self._deliver = deliver
+
+    async def publish(self, message: dict) -> None:
+        if self._deliver:
+            self._deliver(message)
+
+    async def stop(self) -> None:
+        self._deliver = None
+
+
+class RedisBroker(Broker):
+    """
+    Redis pub/sub, so every uvicorn worker receives events published by any of them.
+    A lost connection is re-established with exponential backoff up to max_backoff_seconds.
+    Requires the redis package.
+    """
+
+    def __init__(self, url: str, channel: str = CHANNEL, max_backoff_seconds: float = 30.0):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("EVENT_BROKER_URL is a Redis URL but the redis package is not installed")
+        self.channel = channel
+        self.max_backoff_seconds = max_backoff_seconds
+        self._redis = redis.from_url(url)
+        self._pubsub = None
+        self._task: asyncio.Task | None = None
+        self.reconnects = 0
+
+    async def start(self, deliver: Deliver, resubscribed: Callable[[], None] | None = None) -> None:
+        await self._subscribe()
+        self._task = asyncio.create_task(self._listen(deliver, resubscribed))
+
+    async def _subscribe(self) -> None:
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+
+    async def _listen(self, deliver: Deliver, resubscribed: Callable[[], None] | None) -> None:
+        backoff = 0.0
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                    self.reconnects += 1
+                    logger.warning("Event broker channel %s resubscribed", self.channel)
+                    backoff = 0.0
+                    if resubscribed:
+                        resubscribed()
+                async for message in self._pubsub.listen():
+                    try:
+                        deliver(json.loads(message["data"]))
+                    except Exception as e:  # One bad message must not kill the listener
+                        logger.error("Dropping undeliverable event: %s", e)
+            except Exception as e:  # Connection lost, or a resubscribe failed
+                backoff = min(max(backoff * 2, 0.5), self.max_backoff_seconds)
+                logger.error(
+                    "Event broker channel %s lost, resubscribing in %.1fs: %s", self.channel, backoff, e
+                )
+                pubsub, self._pubsub = self._pubsub, None
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:  # Already broken
+                        pass
+                await asyncio.sleep(backoff)
+
+    async def publish(self, message: dict) -> None:
+        await self._redis.publish(self.channel, dumps(message))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub:
+            try:
+                await self._pubsub.unsubscribe(self.channel)
+            finally:
+                await self._pubsub.aclose()
+        await self._redis.aclose()
+
+
+class Subscriber:
+    """One WebSocket connection: a bounded queue of serialised events and the characters it follows"""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.character_ids: set[str] = set()
+        self.dropped = asyncio.Event()  # Set when the subscriber fell too far behind
+
+
+class EventHub:
+    """
+    In-process pub/sub keyed by character id.
+
+    Each subscriber has a bounded queue. A subscriber whose queue is full when an event arrives is
+    dropped rather than slowing down delivery to everyone else, it reconnects and reloads the sheet.
+    """
+
+    def __init__(self, broker: Broker, queue_size: int):
+        self.broker = broker
+        self.queue_size = queue_size
+        self._subscribers: dict[str, set[Subscriber]] = {}
+
+        # Metrics
+        self.published = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+
+    async def start(self) -> None:
+        await self.broker.start(self._deliver, self._resubscribed)
+
+    async def stop(self) -> None:
+        await self.broker.stop()
+
+    def _resubscribed(self) -> None:
+        """Events were missed while the broker was away, every watched sheet has to be fetched again"""
+        for character_id in list(self._subscribers):
+            self._deliver({"characterId": character_id, "type": "reload"})
+
+    def subscriber(self) -> Subscriber:
+        return Subscriber(self.queue_size)
+
+    def subscribe(self, subscriber: Subscriber, character_id: str) -> None:
+        subscriber.character_ids.add(character_id)
+        self._subscribers.setdefault(character_id, set()).add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber, character_id: str) -> None:
+        subscriber.character_ids.discard(character_id)
+        subscribers = self._subscribers.get(character_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[character_id]
+
+    def remove(self, subscriber: Subscriber) -> None:
+        for character_id in list(subscriber.character_ids):
+            self.unsubscribe(subscriber, character_id)
+
+    async def publish(self, character_id: str, event: dict) -> None:
+        """Publish an event about a character to every subscriber in every worker"""
+        self.published += 1
+        try:
+            await self.broker.publish({"characterId": character_id, **event})
+        except Exception as e:  # Live updates are best effort, the write already succeeded
+            logger.error("Publishing event for character %s failed: %s", character_id, e)
+
+    def _deliver(self, message: dict) -> None:
+        subscribers = self._subscribers.get(message.get("characterId"))
+        if not subscribers:
+            return
+        text = dumps(message).decode()  # Serialised once, not once per subscriber
+        for subscriber in list(subscribers):
+            try:
+                subscriber.queue.put_nowait(text)
+                self.delivered += 1
+            except asyncio.QueueFull:  # Slow consumer
+                self.dropped_subscribers += 1
+                self.remove(subscriber)
+                subscriber.dropped.set()
+
+    def stats(self) -> dict:
+        return {
+            "characters_watched": len(self._subscribers),
+            "subscriptions": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+def create_broker(url: str | None, channel: str = CHANNEL) -> Broker:
+    if not url:
+        return LocalBroker()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBroker(url, channel)
+    raise ValueError(f"Unsupported event broker URL: {url}")
@@ -0,0 +1,160 @@
+import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, status
+from app.config import settings
+from app.utils.throttle import ThrottleStore, create_throttle_store
+
+""" Admission control for sign-in, rejects excess attempts before any bcrypt work is spent on them """
+
+logger = logging.getLogger(__name__)
+
+
+def _too_many(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, round(retry_after)))},
+    )
+
+
+class LoginThrottle:
+    """
+    Checks run in order of cost, all before the password is verified:
+
+    1. Token bucket per client IP, caps how fast one client can try anything.
+    2. Backoff per email after repeated wrong passwords: once backoff_after failures are counted the
+       next attempt has to wait backoff_base_seconds, doubling with every further failure up to
+       backoff_max_seconds. A successful sign-in resets it.
+    3. Token bucket per email, caps guessing one account from many IPs.
+    4. A global cap on password verifications in flight. Past it a sign-in is turned away with a 503
+       at once instead of queueing behind the bcrypt pool.
+    """
+
+    def __init__(
+        self,
+        store: ThrottleStore,
+        ip_rate_per_minute: float,
+        ip_burst: int,
+        email_rate_per_minute: float,
+        email_burst: int,
+        backoff_after: int,
+        backoff_base_seconds: float,
+        backoff_max_seconds: float,
+        failure_window_seconds: float,
+        max_concurrent_verifications: int,
+        enabled: bool = True,
+    ):
+        self.store = store
+        self.ip_rate = ip_rate_per_minute / 60
+        self.ip_burst = ip_burst
+        self.email_rate = email_rate_per_minute / 60
+        self.email_burst = email_burst
+        self.backoff_after = backoff_after
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.failure_window_seconds = failure_window_seconds
+        self.max_concurrent_verifications = max_concurrent_verifications
+        self.enabled = enabled
+        self.verifying = 0
+
+        # Metrics
+        self.admitted = 0
+        self.rejected_ip = 0
+        self.rejected_email = 0
+        self.rejected_backoff = 0
+        self.rejected_busy = 0
+
+    # A store key holds either a token bucket or a failure counter, so each gets its own namespace
+    @staticmethod
+    def _rate_key(kind: str, value: str) -> str:
+        return f"rate:{kind}:{value.strip().lower()}"
+
+    @staticmethod
+    def _failure_key(email: str) -> str:
+        return f"fail:email:{email.strip().lower()}"
+
+    def backoff_seconds(self, failures: int) -> float:
+        if failures < self.backoff_after:
+            return 0.0
+        return min(
+            self.backoff_max_seconds,
+            self.backoff_base_seconds * 2 ** (failures - self.backoff_after),
+        )
+
+    async def admit(self, ip: str, email: str) -> None:
+        """Raise a 429 with Retry-After if this sign-in attempt is over any limit"""
+        if not self.enabled:
+            return
+        wait = await self.store.take(self._rate_key("ip", ip), self.ip_rate, self.ip_burst)
+        if wait:
+            self.rejected_ip += 1
+            raise _too_many("Too many sign-in attempts, slow down", wait)
+
+        failures, last_failure = await self.store.failures(
+            self._failure_key(email), self.failure_window_seconds
+        )
+        wait = last_failure + self.backoff_seconds(failures) - time.time()
+        if failures >= self.backoff_after and wait > 0:
+            self.rejected_backoff += 1
+            raise _too_many("Too many failed sign-ins for this account, try again later", wait)
+
+        wait = await self.store.take(self._rate_key("email", email), self.email_rate, self.email_burst)
+        if wait:
+            self.rejected_email += 1
+            raise _too_many("Too many sign-in attempts for this account, slow down", wait)
+        self.admitted += 1
+
+    @asynccontextmanager
+    async def verification(self):
+        """Hold one of the global password verification slots, 503 when none is free"""
+        if self.enabled and self.verifying >= self.max_concurrent_verifications:
+            self.rejected_busy += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.verifying += 1
+        try:
+            yield
+        finally:
+            self.verifying -= 1
+
+    async def failed(self, email: str) -> None:
+        if not self.enabled:
+            return
+        failures = await self.store.add_failure(self._failure_key(email), self.failure_window_seconds)
+        if failures == self.backoff_after:
+            logger.warning("Sign-in backoff started after %d failed attempts", failures)
+
+    async def succeeded(self, email: str) -> None:
+        if self.enabled:
+            await self.store.clear(self._failure_key(email))
+
+    def stats(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "rejected_ip": self.rejected_ip,
+            "rejected_email": self.rejected_email,
+            "rejected_backoff": self.rejected_backoff,
+            "rejected_busy": self.rejected_busy,
+            "verifications_in_flight": self.verifying,
+        }
+
+
+login_throttle = LoginThrottle(
+    store=create_throttle_store(
+        settings.THROTTLE_STORE_URL, settings.THROTTLE_MAX_KEYS, settings.THROTTLE_SHARDS
+    ),
+    ip_rate_per_minute=settings.LOGIN_IP_RATE_PER_MINUTE,
+    ip_burst=settings.LOGIN_IP_BURST,
+    email_rate_per_minute=settings.LOGIN_EMAIL_RATE_PER_MINUTE,
+    email_burst=settings.LOGIN_EMAIL_BURST,
+    backoff_after=settings.LOGIN_BACKOFF_AFTER_FAILURES,
+    backoff_base_seconds=settings.LOGIN_BACKOFF_BASE_SECONDS,
+    backoff_max_seconds=settings.LOGIN_BACKOFF_MAX_SECONDS,
+    failure_window_seconds=settings.LOGIN_FAILURE_WINDOW_SECONDS,
+    max_concurrent_verifications=settings.LOGIN_MAX_CONCURRENT_VERIFICATIONS,
+    enabled=settings.LOGIN_THROTTLE_ENABLED,
+)
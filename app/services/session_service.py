@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, status
+from app.config import settings
+from app.repositories import sessions
+from app.repositories.base import DuplicateError
+from app.services.events import Broker, create_broker
+from app.utils.auth import REFRESH_TOKEN_EXPIRE_HOURS, create_refresh_token, decode_refresh_token
+from app.utils.revocation import RevocationList, revoked_families
+
+""" Refresh token sessions: rotation, reuse detection and revocation shared by every worker """
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_CHANNEL = "session-revocations"
+
+
+class RevocationSync:
+    """
+    Keeps every worker's revocation list complete.
+
+    A revocation is applied locally at once and pushed to the other workers over the event broker when
+    EVENT_BROKER_URL is set. Independently each worker pulls the families revoked since its last pull
+    from the database every interval_seconds, so a missed message or a deployment without a broker
+    delays a revocation elsewhere by at most that long. At start the list is loaded from the database.
+    """
+
+    def __init__(
+        self,
+        revocations: RevocationList,
+        broker: Broker,
+        interval_seconds: float,
+        cleanup_seconds: float,
+    ):
+        self.revocations = revocations
+        self.broker = broker
+        self.interval_seconds = interval_seconds
+        self.cleanup_seconds = cleanup_seconds
+        self._synced_at: datetime | None = None
+        self._cleaned_at = 0.0
+        self._task: asyncio.Task | None = None
+
+        # Metrics
+        self.syncs = 0
+        self.failed_syncs = 0
+        self.pushed = 0
+        self.received = 0
+
+    async def start(self) -> None:
+        await self.sync()
+        await self.broker.start(self._deliver)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.broker.stop()
+
+    async def announce(self, family_id: str, expires_at: datetime) -> None:
+        """Apply a revocation made by this worker and tell the others"""
+        self.revocations.revoke(family_id, expires_at.timestamp())
+        self.pushed += 1
+        try:
+            await self.broker.publish({"familyId": family_id, "expiresAt": expires_at.timestamp()})
+        except Exception as e:  # The next database pull elsewhere picks it up
+            logger.error("Publishing revocation of session family %s failed: %s", family_id, e)
+
+    def _deliver(self, message: dict) -> None:
+        self.received += 1
+        self.revocations.revoke(message["familyId"], message["expiresAt"])
+
+    async def sync(self) -> None:
+        """Pull revocations made since the last pull, or within the token lifetime on the first one"""
+        now = datetime.now(timezone.utc)
+        if self._synced_at is None:
+            since = now - timedelta(hours=REFRESH_TOKEN_EXPIRE_HOURS)
+        else:  # Overlap, revokedAt comes from the clock of whichever worker revoked
+            since = self._synced_at - timedelta(seconds=self.interval_seconds)
+        for family_id, expires_at in await sessions.revoked_since(since):
+            self.revocations.revoke(family_id, expires_at.timestamp())
+        self._synced_at = now
+        self.revocations.purge()
+        self.syncs += 1
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.sync()
+                if time.monotonic() - self._cleaned_at >= self.cleanup_seconds:
+                    self._cleaned_at = time.monotonic()
+                    deleted = await sessions.delete_expired(datetime.now(timezone.utc))
+                    if deleted:
+                        logger.info("Deleted %d expired refresh sessions", deleted)
+            except Exception as e:  # Keep serving with what is known, retry next interval
+                self.failed_syncs += 1
+                logger.error("Session revocation sync failed: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            **self.revocations.stats(),
+            "syncs": self.syncs,
+            "failed_syncs": self.failed_syncs,
+            "pushed": self.pushed,
+            "received": self.received,
+        }
+
+
+# Started and stopped in the app lifespan
+revocation_sync = RevocationSync(
+    revoked_families,
+    broker=create_broker(settings.EVENT_BROKER_URL, channel=REVOCATION_CHANNEL),
+    interval_seconds=settings.SESSION_SYNC_SECONDS,
+    cleanup_seconds=settings.SESSION_CLEANUP_SECONDS,
+)
+
+
+def _expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(hours=REFRESH_TOKEN_EXPIRE_HOURS)
+
+
+async def start_session(user_id: str) -> str:
+    """Start a session family at sign-in, returns its first refresh token"""
+    session_id, family_id, expire = str(uuid.uuid4()), str(uuid.uuid4()), _expiry()
+    await sessions.create(
+        {"id": session_id, "familyId": family_id, "userId": user_id, "expiresAt": expire}
+    )
+    return create_refresh_token(user_id, session_id, family_id, expire)
+
+
+async def rotate_session(refresh_token: str) -> tuple[str, str]:
+    """
+    Exchange a refresh token for its successor, each token is good for one refresh.
+
+    Presenting a token that was already rotated means a copy of it leaked, so the whole family is
+    revoked: neither the thief nor the user can refresh any more and the user signs in again.
+
+    Returns:
+        tuple[str, str]: The user id and the new refresh token.
+    """
+    payload = decode_refresh_token(refresh_token)
+    user_id = payload["sub"]
+    await _record_legacy(payload)
+
+    session_id, expire = str(uuid.uuid4()), _expiry()
+    rotated = await sessions.rotate(
+        payload["jti"],
+        {"id": session_id, "familyId": payload["fam"], "userId": user_id, "expiresAt": expire},
+    )
+    if not rotated:
+        await revoke_family(payload["fam"])
+        logger.warning(
+            "Refresh token reuse for user %s, session family %s revoked", user_id, payload["fam"]
+        )
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token reuse detected, please sign in again",
+        )
+    return user_id, create_refresh_token(user_id, session_id, payload["fam"], expire)
+
+
+async def _record_legacy(payload: dict) -> None:
+    """
+    Store the session of a token issued before sessions existed, on its first use. Its successors join
+    its family, presenting it again is reuse and a sign-out with it revokes it.
+    """
+    if not payload.get("legacy"):
+        return
+    try:
+        await sessions.create(
+            {
+                "id": payload["jti"],
+                "familyId": payload["fam"],
+                "userId": payload["sub"],
+                "expiresAt": datetime.fromtimestamp(payload["exp"], timezone.utc),
+            }
+        )
+    except DuplicateError:  # Used before, rotating it again is caught as reuse
+        pass
+
+
+async def revoke_family(family_id: str) -> None:
+    expires_at = await sessions.revoke_family(family_id)
+    if expires_at:
+        await revocation_sync.announce(family_id, expires_at)
+
+
+async def end_session(refresh_token: str) -> None:
+    """Sign out: revoke the family of this refresh token. An invalid token has nothing to revoke"""
+    try:
+        payload = decode_refresh_token(refresh_token)
+    except HTTPException:
+        return
+    await _record_legacy(payload)  # Or it could still be exchanged afterwards
+    await revoke_family(payload["fam"])
+
+
+async def end_all_sessions(user_id: str) -> int:
+    """Sign out everywhere, returns the number of session families revoked"""
+    revoked = await sessions.revoke_user(user_id)
+    for family_id, expires_at in revoked:
+        await revocation_sync.announce(family_id, expires_at)
+    return len(revoked)
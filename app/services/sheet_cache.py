@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import time
+import orjson
+from app.services.events import Broker
+from app.utils.cache import LRUCache
+from app.utils.serialization import dumps, packb
+
+logger = logging.getLogger(__name__)
+
+
+def _etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'  # Strong, derived from the exact bytes
+
+
+CONTENT_CODINGS = ("br", "gzip")
+
+
+def coded_etag(etag: str, coding: str) -> str:
+    """
+    ETag of a representation's content-coded form, '"abc"' -> '"abc-gzip"'. Compressing the same bytes at
+    the same level gives the same bytes (gzip without a timestamp), so it stays strong while differing
+    from the identity form's.
+    """
+    return f'{etag[:-1]}-{coding}"'
+
+
+def _uncoded(tag: str) -> str:
+    """An If-None-Match entry reduced to the identity form's strong ETag"""
+    tag = tag.removeprefix("W/")
+    for coding in CONTENT_CODINGS:
+        if tag.endswith(f'-{coding}"'):
+            return f'{tag[: -len(coding) - 2]}"'
+    return tag
+
+
+class CachedSheet:
+    """A serialised character sheet ready to be sent, with its strong ETag"""
+
+    __slots__ = ("user_id", "etag", "body", "_msgpack")
+
+    def __init__(self, user_id: str, body: bytes):
+        self.user_id = user_id
+        self.etag = _etag(body)
+        self.body = body
+        self._msgpack: tuple[bytes, str] | None = None
+
+    def msgpack(self) -> tuple[bytes, str]:
+        """MessagePack body and its own ETag, encoded on first use and kept with the entry"""
+        if self._msgpack is None:
+            body = packb(orjson.loads(self.body))
+            self._msgpack = (body, _etag(body))
+        return self._msgpack
+
+
+class SheetCache:
+    """
+    Read-through cache of serialised character sheets keyed by character id.
+
+    Entries hold the owner and the response bytes, so a conditional GET is answered with a 304 and a plain
+    GET with the stored bytes without touching the database or re-serialising the State. Every write
+    through the characters service invalidates the character's entry, in this worker at once and, through
+    the broker, in every other one (EVENT_BROKER_URL) once the write has committed. A worker whose broker
+    connection was lost drops every entry when it is back, invalidations sent meanwhile are gone. The TTL
+    bounds how long an unread entry is kept.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float, broker: Broker):
+        self.ttl_seconds = ttl_seconds
+        self.broker = broker
+        self.not_modified = 0
+        self.bytes_saved = 0  # Body bytes not sent thanks to 304s
+        self.invalidations = 0  # Lets a reader detect a write that raced its database load
+        self.received = 0  # Invalidations announced over the broker, this worker's own included
+        self._cache = LRUCache(max_entries=max_entries, max_weight=max_bytes)
+
+    async def start(self) -> None:
+        await self.broker.start(self._deliver, self.clear)
+
+    async def stop(self) -> None:
+        await self.broker.stop()
+
+    def get(self, character_id: str) -> CachedSheet | None:
+        return self._cache.get(character_id)
+
+    def put(
+        self, character_id: str, user_id: str, sheet: dict, loaded_at: int | None = None
+    ) -> CachedSheet:
+        """
+        Serialise and cache a sheet. Pass loaded_at=invalidations as read before loading the sheet,
+        the entry is then only stored if no write happened in between.
+        """
+        body = dumps(sheet)
+        entry = CachedSheet(user_id, body)
+        if loaded_at is None or loaded_at == self.invalidations:
+            self._cache.set(
+                character_id, entry, time.time() + self.ttl_seconds, weight=len(body)
+            )
+        return entry
+
+    def invalidate(self, character_id: str) -> None:
+        """Drop a character's entry in this worker only"""
+        self.invalidations += 1
+        self._cache.pop(character_id)
+
+    async def announce(self, character_ids: list[str]) -> None:
+        """Drop the entries of characters whose writes have committed, in this worker and every other one"""
+        for character_id in character_ids:
+            self.invalidate(character_id)
+        try:
+            await self.broker.publish({"characterIds": character_ids})
+        except Exception as e:  # Other workers serve the old sheet until the entry expires
+            logger.error("Publishing invalidation of %d cached sheets failed: %s", len(character_ids), e)
+
+    def _deliver(self, message: dict) -> None:
+        self.received += 1
+        for character_id in message["characterIds"]:
+            self.invalidate(character_id)
+
+    def clear(self) -> None:
+        self.invalidations += 1
+        self._cache.clear()
+
+    def record_not_modified(self, entry: CachedSheet) -> None:
+        self.not_modified += 1
+        self.bytes_saved += len(entry.body)
+
+    def stats(self) -> dict:
+        return {
+            **self._cache.stats(),
+            "not_modified": self.not_modified,
+            "bytes_saved": self.bytes_saved,
+            "received_invalidations": self.received,
+        }
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match check, handles lists of tags, weak tags, content-coded tags and *"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(_uncoded(tag.strip()) == etag for tag in if_none_match.split(","))
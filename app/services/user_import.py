@@ -0,0 +1,205 @@
+import asyncio
+import csv
+import logging
+import time
+from typing import AsyncIterable, AsyncIterator
+import orjson
+from pydantic import ValidationError
+from app.auth import PasswordPool, hash_passwords
+from app.config import settings
+from app.schemas.users import UserSignUp
+from app.services.user_service import create_users
+
+""" Bulk user import from NDJSON or CSV, streamed through in batches with hashing spread over a process pool """
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "csv")
+AUTH_PROVIDERS = ("manual", "google", "discord")  # AuthProvider enum, anything else fails a whole insert
+
+# Own pool, an import never takes the workers sign-ins and sign-ups hash on
+import_pool = PasswordPool(
+    kind=settings.USER_IMPORT_POOL_KIND, workers=settings.USER_IMPORT_WORKERS, max_queue=0
+)
+# Imports run one at a time per worker process, each one already keeps every hashing worker busy
+_import_lock = asyncio.Lock()
+
+
+async def _lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Lines of a byte stream as they arrive, only the current partial line is held"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if buffer:
+        yield buffer.rstrip(b"\r")
+
+
+async def ndjson_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[int, dict | str]]:
+    """(line number, object) per non-blank line, or (line number, error) for one that is not an object"""
+    number = 0
+    async for line in _lines(chunks):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield number, f"Invalid JSON: {e}"
+            continue
+        yield number, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+async def csv_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[int, dict | str]]:
+    """
+    (line number, header -> value) per row after the header line. Empty cells are None (no password
+    for OAuth users). Records are one line each, a quoted value cannot span lines.
+    """
+    header = None
+    number = 0
+    async for line in _lines(chunks):
+        number += 1
+        try:
+            text = line.decode("utf-8-sig" if header is None else "utf-8")  # Spreadsheets add a BOM
+        except UnicodeDecodeError as e:
+            yield number, f"Invalid UTF-8: {e}"
+            continue
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield number, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield number, {name: value or None for name, value in zip(header, values)}
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'row'}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+class ImportReport:
+    """Counts per outcome and the first max_errors row errors"""
+
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.created = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors: list[dict] = []
+
+    def error(self, row: int, email: str | None, detail: str, duplicate: bool = False) -> None:
+        if duplicate:
+            self.duplicates += 1
+        else:
+            self.invalid += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "email": email, "error": detail})
+
+    def as_dict(self, seconds: float) -> dict:
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "errors_truncated": self.duplicates + self.invalid > len(self.errors),
+            "seconds": seconds,
+            "users_per_second": self.created / seconds if seconds else 0.0,
+        }
+
+
+async def _hash_many(passwords: list[str]) -> list[str]:
+    """Hash on every import worker at once, one chunk per worker"""
+    if not passwords:
+        return []
+    size = -(-len(passwords) // import_pool.workers)
+    chunks = await asyncio.gather(
+        *(
+            import_pool.run(hash_passwords, passwords[i : i + size], settings.PASSWORD_HASH_ROUNDS)
+            for i in range(0, len(passwords), size)
+        )
+    )
+    return [hashed for chunk in chunks for hashed in chunk]
+
+
+async def _create_batch(batch: list[tuple[int, UserSignUp]], report: ImportReport) -> None:
+    outcomes = await create_users([signup for _, signup in batch], _hash_many)
+    for (number, signup), outcome in zip(batch, outcomes):
+        if outcome is None:
+            report.created += 1
+        else:
+            report.error(number, signup.email, outcome, duplicate=True)
+
+
+async def import_users(
+    rows: AsyncIterable[tuple[int, dict | str]],
+    batch_size: int | None = None,
+    max_errors: int | None = None,
+) -> dict:
+    """
+    Validate rows from ndjson_rows() or csv_rows() with UserSignUp as they stream in and create the valid
+    ones batch_size at a time. A bad or duplicate row is reported and skipped, it never fails the others.
+    Rows already created stay created if the import is interrupted.
+
+    Returns:
+        dict: Counts of rows, created, duplicates (in the file or already stored) and invalid rows, plus
+            the row errors.
+    """
+    batch_size = batch_size or settings.USER_IMPORT_BATCH_SIZE
+    report = ImportReport(settings.USER_IMPORT_MAX_ERRORS if max_errors is None else max_errors)
+    seen_emails: set[str] = set()
+    seen_oauth_ids: set[str] = set()
+    batch: list[tuple[int, UserSignUp]] = []
+    started = time.perf_counter()
+    async with _import_lock:
+        async for number, row in rows:
+            report.rows += 1
+            if isinstance(row, str):
+                report.error(number, None, row)
+                continue
+            try:
+                signup = UserSignUp.model_validate(row)
+            except ValidationError as e:
+                report.error(number, row.get("email"), _describe(e))
+                continue
+            if signup.oauth_provider and signup.oauth_provider not in AUTH_PROVIDERS:
+                report.error(number, signup.email, f"Unknown OAuth provider {signup.oauth_provider}")
+                continue
+            if signup.email in seen_emails or (signup.oauth_id and signup.oauth_id in seen_oauth_ids):
+                report.error(number, signup.email, "Duplicate of an earlier row", duplicate=True)
+                continue
+            seen_emails.add(signup.email)
+            if signup.oauth_id:
+                seen_oauth_ids.add(signup.oauth_id)
+
+            batch.append((number, signup))
+            if len(batch) >= batch_size:
+                await _create_batch(batch, report)
+                batch = []
+                logger.info("User import: %d rows read, %d created", report.rows, report.created)
+        if batch:
+            await _create_batch(batch, report)
+
+    result = report.as_dict(time.perf_counter() - started)
+    logger.info(
+        "User import done: %d created, %d duplicates, %d invalid",
+        report.created,
+        report.duplicates,
+        report.invalid,
+    )
+    return result
+
+
+def parse_rows(fmt: str, chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[int, dict | str]]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format {fmt}")
+    return csv_rows(chunks) if fmt == "csv" else ndjson_rows(chunks)
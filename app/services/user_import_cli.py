@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import json
+import sys
+from typing import AsyncIterator
+from app.repositories import storage
+from app.services.user_import import FORMATS, import_pool, import_users, parse_rows
+
+""" Bulk user import from the command line: python -m app.services.user_import_cli users.csv """
+
+# Not in user_import itself, the app imports that module and running it with -m would load it twice
+
+
+async def _read(path: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while chunk := stream.read(chunk_size):
+            yield chunk
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+async def _main(args) -> None:
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    await storage.connect()
+    try:
+        result = await import_users(parse_rows(fmt, _read(args.path)), batch_size=args.batch_size)
+        print(json.dumps(result, indent=2))
+    finally:
+        await storage.disconnect()
+        import_pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create users in bulk from NDJSON or CSV with email, username, password, "
+        "oauth_provider and oauth_id fields"
+    )
+    parser.add_argument("path", help="File to import, - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to csv for .csv files, ndjson otherwise")
+    parser.add_argument("--batch-size", type=int, help="Defaults to USER_IMPORT_BATCH_SIZE")
+    asyncio.run(_main(parser.parse_args()))
@@ -1,25 +1,96 @@
+import uuid
 from fastapi import HTTPException, status
-from app.db import db
-from app.auth import hash_password
+from app.auth import hash_password_async
+from app.config import settings
+from app.repositories import DuplicateError, users
 from app.schemas.users import UserSignUp
+from app.utils.dataloader import DataLoader, LoaderStats, request_loader
+from app.utils.pagination import decode_cursor, keyset_page, parse_fields
 
 """ HUSKAT accept Oauth providers for google and discord """
 
+# Fields users are looked up by, each with its own loader
+LOOKUP_FIELDS = ("id", "email", "username")
+user_loader_stats = LoaderStats()
+
+
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+
+def _batch_by(field: str):
+    async def batch_load(keys: list[str]) -> list:
+        values = keys
+        if field == "id":  # One malformed id would fail the uuid cast for the whole batch
+            values = [value for value in keys if _is_uuid(value)]
+        found = {}
+        for user in await users.find_many(field, values) if values else []:
+            found.setdefault(getattr(user, field), user)  # Usernames are not unique, first one wins
+        return [found.get(key) for key in keys]
+
+    return batch_load
+
+
+# Process wide, coalesces lookups from concurrent requests into one query and optionally reuses results
+_shared_loaders = {
+    field: DataLoader(
+        _batch_by(field),
+        max_batch_size=settings.USER_LOADER_MAX_BATCH_SIZE,
+        ttl_seconds=settings.USER_LOADER_TTL_SECONDS,
+        stats=user_loader_stats,
+    )
+    for field in LOOKUP_FIELDS
+}
+
+
+def _loader(field: str) -> DataLoader:
+    """
+    The request's own loader, remembering every user it looked up until the response is sent,
+    in front of the shared one. Outside a request (background tasks, WebSockets) the shared loader.
+    """
+    shared = _shared_loaders[field]
+    loader = request_loader(
+        f"users.{field}",
+        lambda: DataLoader(shared.load_many, max_batch_size=settings.USER_LOADER_MAX_BATCH_SIZE),
+    )
+    return loader or shared
+
+
+def _forget(user) -> None:
+    """Drop a changed user (model or row dict) from every loader so the next lookup reads the new row"""
+    for field in LOOKUP_FIELDS:
+        key = user[field] if isinstance(user, dict) else getattr(user, field)
+        _shared_loaders[field].clear(key)
+        _loader(field).clear(key)
+
 
 async def create_user(user_signup: UserSignUp):
-    existing_user = await db.user.find_unique(where={"email": user_signup.email})
+    existing_user = await get_user_by_email(user_signup.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already in use"
         )
 
-    hashed_password = hash_password(user_signup.password)
+    hashed_password = (
+        await hash_password_async(user_signup.password)
+        if user_signup.password
+        else None  # OAuth users have no password
+    )
     user_data = user_signup.model_dump()
     user_data["password"] = hashed_password
 
     try:
-        new_user = await db.user.create(data=user_data)
+        new_user = await users.create(user_data)
+        _forget(new_user)  # Lookups above remembered it as missing
         return new_user
+    except DuplicateError:  # Signed up concurrently with the same email
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Email already in use"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -27,22 +98,97 @@ async def create_user(user_signup: UserSignUp):
         )
 
 
+async def create_users(signups: list[UserSignUp], hash_many) -> list[str | None]:
+    """
+    Bulk create_user for imports. Emails and oauth ids already taken are found in one query, the
+    remaining passwords hashed by hash_many (list of passwords -> list of hashes) and every new user
+    inserted in one statement.
+
+    Returns:
+        list[str | None]: Per signup, None if it was created, otherwise why it was not.
+    """
+    conflicts = await users.find_conflicts(
+        [signup.email for signup in signups],
+        [signup.oauth_id for signup in signups if signup.oauth_id],
+    )
+    taken_emails = {user.email for user in conflicts}
+    taken_oauth_ids = {user.oauth_id for user in conflicts if user.oauth_id}
+
+    outcomes: list[str | None] = [None] * len(signups)
+    fresh = []
+    for n, signup in enumerate(signups):
+        if signup.email in taken_emails:
+            outcomes[n] = "Email already in use"
+        elif signup.oauth_id and signup.oauth_id in taken_oauth_ids:
+            outcomes[n] = "OAuth account already linked"
+        else:
+            fresh.append(n)
+
+    hashed = iter(await hash_many([signups[n].password for n in fresh if signups[n].password]))
+    rows = []
+    for n in fresh:
+        row = signups[n].model_dump()
+        row["id"] = str(uuid.uuid4())
+        row["password"] = next(hashed) if row["password"] else None  # OAuth users have no password
+        row["oauth_provider"] = row["oauth_provider"] or "manual"
+        rows.append(row)
+
+    inserted = set(await users.create_many(rows)) if rows else set()
+    for n, row in zip(fresh, rows):
+        if row["id"] in inserted:
+            _forget(row)  # Lookups may remember it as missing
+        else:  # Taken between the conflict query and the insert
+            outcomes[n] = "Email already in use"
+    return outcomes
+
+
+# Fields exposed by user listings. Never the password hash.
+USER_FIELDS = ("id", "username", "email", "oauth_provider", "created_at", "updated_at")
+DEFAULT_USER_FIELDS = ["id", "username", "email", "created_at", "updated_at"]
+
+
+async def list_users(limit: int, cursor: str | None = None, fields: str | None = None):
+    """
+    Keyset paginated user listing ordered by (created_at, id).
+
+    Each page seeks straight to the cursor through the (created_at, id) index, so deep pages
+    cost the same as the first one. Only the requested columns are selected.
+    """
+    selected = parse_fields(fields, USER_FIELDS, DEFAULT_USER_FIELDS)
+    after = decode_cursor(cursor) if cursor else None
+    rows = await users.list_page(limit + 1, after, selected)
+    return keyset_page(rows, limit, selected, "created_at")
+
+
 async def get_user_by_email(email: str):
-    user = await db.user.find_unique(where={"email": email})
+    user = await _loader("email").load(email)
     return user
 
 
 async def get_user_by_username(username: str):
-    user = await db.user.find_unique(where={"username": username})
+    user = await _loader("username").load(username)
     return user
 
 
 async def get_user_by_id(user_id: int):
-    """Fetch user by ID"""
-    user = await db.user.find_unique(where={"id": user_id})
+    """Fetch user by ID, concurrent calls are batched into one query"""
+    user = await _loader("id").load(user_id)
     if not user:
         raise ValueError("User not found")
     return user
 
 
+async def get_users_by_ids(user_ids: list[str]) -> list:
+    """Users for many ids in one query, e.g. the owners of a party's characters. None for unknown ids"""
+    return await _loader("id").load_many(user_ids)
+
+
+async def update_password(user_id: str, hashed_password: str):
+    """Store a new password hash, e.g. after a bcrypt cost upgrade"""
+    user = await users.update(user_id, {"password": hashed_password})
+    if user:
+        _forget(user)
+    return user
+
+
 """ HUSKAT update user method """
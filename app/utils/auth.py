@@ -1,8 +1,14 @@
+import hashlib
+import time
+import uuid
 from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from app.config import settings
+from app.utils.cache import LRUCache
+from app.utils.metrics import timed
+from app.utils.revocation import revoked_families
 
 # JWT Expiration config
 ACCESS_TOKEN_EXPIRE_MINUTES: int = settings.ACCESS_TOKEN_EXPIRE_MINUTES
@@ -12,20 +18,44 @@ REFRESH_TOKEN_EXPIRE_HOURS: int = settings.REFRESH_TOKEN_EXPIRE_HOURS
 SECRET_KEY: str = settings.JWT_SECRET
 ALGORITHM: str = settings.ALGORITHM
 
+# Session and family ids of refresh tokens issued before sessions existed are derived from the token
+LEGACY_SESSION_NAMESPACE = uuid.UUID("6b1f0c52-8d4e-4f1a-9a57-3c2e7d9b1e40")
+LEGACY_FAMILY_NAMESPACE = uuid.UUID("0f9d3a6e-2b7c-4e85-b1d4-8a6c5e3f2d19")
+
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Verified token cache, sha256 digest of the token -> decoded claims
+token_cache = LRUCache(max_entries=settings.TOKEN_CACHE_SIZE)
+
 
 def decode_token(token: str) -> dict:
     """
     Decode a JWT token and return its payload for further processing.
     Raises HTTPException if the token is invalid or expired
+
+    Successfully verified tokens are cached until their exp (or TOKEN_CACHE_TTL_SECONDS, whichever is first),
+    so repeat requests with the same token skip the signature and claims check.
+    Invalid tokens are never cached.
     """
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    with timed("jwt"):
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        payload = token_cache.get(key)
+        if payload is not None:
+            return dict(payload)  # Copy so callers cannot mutate the cached claims
+
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    now = time.time()
+    expires_at = now + settings.TOKEN_CACHE_TTL_SECONDS
+    if "exp" in payload:
+        expires_at = min(expires_at, float(payload["exp"]))
+    if expires_at > now:
+        token_cache.set(key, dict(payload), expires_at)
+    return payload
 
 
 def verify_access_token(access_token: str = Depends(oauth2_scheme)) -> str:
@@ -50,30 +80,50 @@ def verify_access_token(access_token: str = Depends(oauth2_scheme)) -> str:
     return user_id
 
 
-def verify_refresh_token(refresh_token: str) -> str:
+def decode_refresh_token(refresh_token: str) -> dict:
     """
-    Verifies provided refresh token and extracts the user ID from it
+    Verify a refresh token and return its claims: sub, exp, jti and fam.
 
-    Args:
-        refresh_token(str): The refresh token to be verified
+    A token issued before sessions existed has no jti or fam, both are derived from the token itself and
+    legacy is set. The same token always maps to the same session, which can then be rotated once and
+    revoked like any other.
 
-    Returns:
-        str: The user ID to be extracted from the refresh token's payload
+    Revocation is checked against the in-memory list of revoked families, no database query.
 
     Raises:
-        HTTPException: If the refresh token is invalid or expired, an exception is raised
+        HTTPException: If the refresh token is invalid, expired or revoked
     """
     payload = decode_token(refresh_token)
 
     if payload.get("type") != "refresh":
         raise HTTPException(status_code=401, detail="Invalid refresh token type")
-    user_id: str = payload.get("sub")
-    if not user_id:
+    if not payload.get("sub"):
         raise HTTPException(status_code=401, detail="Invalid refresh token")
-    if datetime.now(timezone.utc) > datetime.fromtimestamp(payload["exp"]):
+    if datetime.now(timezone.utc) > datetime.fromtimestamp(payload["exp"], timezone.utc):
         raise HTTPException(status_code=401, detail="Refresh token has expired")
+    if not payload.get("jti"):
+        payload["jti"] = str(uuid.uuid5(LEGACY_SESSION_NAMESPACE, refresh_token))
+        payload["fam"] = str(uuid.uuid5(LEGACY_FAMILY_NAMESPACE, refresh_token))
+        payload["legacy"] = True
+    if revoked_families.is_revoked(payload["fam"]):
+        raise HTTPException(status_code=401, detail="Refresh token has been revoked")
+    return payload
 
-    return user_id
+
+def verify_refresh_token(refresh_token: str) -> str:
+    """
+    Verifies provided refresh token and extracts the user ID from it
+
+    Args:
+        refresh_token(str): The refresh token to be verified
+
+    Returns:
+        str: The user ID to be extracted from the refresh token's payload
+
+    Raises:
+        HTTPException: If the refresh token is invalid, expired or revoked, an exception is raised
+    """
+    return decode_refresh_token(refresh_token)["sub"]
 
 
 def verify_session(refresh_token: str, access_token: str = Depends(oauth2_scheme)):
@@ -131,16 +181,26 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def create_refresh_token(user_id: str) -> str:
+def create_refresh_token(
+    user_id: str,
+    session_id: str | None = None,
+    family_id: str | None = None,
+    expire: datetime | None = None,
+) -> str:
     """
     Generate a JWT refresh token with a 24-hour expiration for the given user ID.
 
     Args:
         user_id (str): The user ID to be encoded into the payload of the refresh token.
+        session_id (str, optional): RefreshSession id, stored as the jti claim.
+        family_id (str, optional): Session family, stored as the fam claim and checked for revocation.
+        expire (datetime, optional): Expiry, defaults to REFRESH_TOKEN_EXPIRE_HOURS from now.
 
     Returns:
         str: The generated JWT refresh token as a string.
     """
-    expire = datetime.now(timezone.utc) + timedelta(hours=REFRESH_TOKEN_EXPIRE_HOURS)
+    expire = expire or datetime.now(timezone.utc) + timedelta(hours=REFRESH_TOKEN_EXPIRE_HOURS)
     payload = {"sub": user_id, "exp": expire, "type": "refresh"}
+    if session_id:
+        payload.update({"jti": session_id, "fam": family_id})
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
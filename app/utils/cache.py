@@ -0,0 +1,72 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """
+    Small in-process LRU cache with per entry expiry and hit/miss counters.
+
+    Entries are dropped when their expiry passes (checked on read) or when the cache is full, oldest
+    used first. Full means more than max_entries entries, or more than max_weight total weight when
+    entries are given a weight (e.g. their size in bytes). Not thread safe, meant to be used from the event loop.
+    """
+
+    def __init__(self, max_entries: int, max_weight: int | None = None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[Any, float, int]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at, _ = entry
+        if expires_at <= time.time():  # Expired, treat as miss
+            self.pop(key)
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float, weight: int = 1) -> None:
+        """Store value until expires_at (unix timestamp)"""
+        if self.max_entries <= 0 or (self.max_weight is not None and weight > self.max_weight):
+            return
+        self.pop(key)
+        self._entries[key] = (value, expires_at, weight)
+        self.weight += weight
+        while len(self._entries) > self.max_entries or (
+            self.max_weight is not None and self.weight > self.max_weight
+        ):
+            _, (_, _, evicted) = self._entries.popitem(last=False)  # Evict least recently used
+            self.weight -= evicted
+
+    def pop(self, key: Hashable) -> Any:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.weight -= entry[2]
+        return entry[0]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.weight = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "weight": self.weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
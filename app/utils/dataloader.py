@@ -0,0 +1,149 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+""" Coalesces concurrent lookups by key into batched queries """
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# Loaders of the current request by name, set up by DataLoaderMiddleware
+request_loaders: ContextVar[dict[str, "DataLoader"] | None] = ContextVar(
+    "request_loaders", default=None
+)
+
+
+class LoaderStats:
+    """Counters shared by the loaders of one kind, for the metrics endpoint"""
+
+    def __init__(self):
+        self.loads = 0
+        self.cache_hits = 0
+        self.batches = 0
+        self.keys_fetched = 0
+        self.failed_batches = 0
+
+    def stats(self) -> dict:
+        return {
+            "loads": self.loads,
+            "cache_hits": self.cache_hits,
+            "batches": self.batches,
+            "keys_fetched": self.keys_fetched,
+            "failed_batches": self.failed_batches,
+            "mean_batch_size": self.keys_fetched / self.batches if self.batches else 0.0,
+        }
+
+
+class DataLoader(Generic[K, V]):
+    """
+    Collects the keys loaded during one event loop tick and fetches them with a single batch_load call.
+
+    batch_load takes a list of distinct keys and returns one value per key in the same order, None for
+    keys that do not exist. Concurrent loads of the same key share one fetch. Results are kept for
+    ttl_seconds: None keeps them for the loader's lifetime (one request), 0 only while the fetch is in
+    flight, so the loader merely coalesces.
+    """
+
+    def __init__(
+        self,
+        batch_load: Callable[[list[K]], Awaitable[list[V | None]]],
+        max_batch_size: int = 100,
+        ttl_seconds: float | None = None,
+        stats: LoaderStats | None = None,
+    ):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self.ttl_seconds = ttl_seconds
+        self.stats = stats or LoaderStats()
+        self._cache: dict[K, tuple[asyncio.Future, float | None]] = {}  # key -> (result, expires at)
+        self._queue: dict[K, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def load(self, key: K) -> V | None:
+        self.stats.loads += 1
+        cached = self._cache.get(key)
+        if cached is not None and (cached[1] is None or time.monotonic() < cached[1]):
+            self.stats.cache_hits += 1
+            future = cached[0]
+        else:
+            future = asyncio.get_running_loop().create_future()
+            if not self._queue:  # First key of this tick, fetch once the other callers have queued
+                asyncio.get_running_loop().call_soon(self._dispatch)
+            self._queue[key] = future
+            self._cache[key] = (future, None)
+        return await asyncio.shield(future)  # A cancelled caller must not cancel the shared fetch
+
+    async def load_many(self, keys: list[K]) -> list[V | None]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: K, value: V | None) -> None:
+        """Store a value obtained elsewhere, e.g. a row just created"""
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        self._cache[key] = (future, self._expiry())
+
+    def clear(self, key: K) -> None:
+        """Forget a key after the row changed, the next load fetches it again"""
+        self._cache.pop(key, None)
+
+    def _expiry(self) -> float | None:
+        return None if self.ttl_seconds is None else time.monotonic() + self.ttl_seconds
+
+    def _dispatch(self) -> None:
+        queue, self._queue = self._queue, {}
+        keys = list(queue)
+        for start in range(0, len(keys), self.max_batch_size):
+            chunk = keys[start : start + self.max_batch_size]
+            task = asyncio.create_task(self._fetch(chunk, [queue[key] for key in chunk]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, keys: list[K], futures: list[asyncio.Future]) -> None:
+        self.stats.batches += 1
+        self.stats.keys_fetched += len(keys)
+        try:
+            values = await self.batch_load(keys)
+            if len(values) != len(keys):
+                raise ValueError(f"batch_load returned {len(values)} values for {len(keys)} keys")
+        except Exception as e:
+            self.stats.failed_batches += 1
+            for key, future in zip(keys, futures):
+                self._forget(key, future)  # Not cached, the next load retries
+                if not future.done():
+                    future.set_exception(e)
+            return
+        expires = self._expiry()
+        for key, future, value in zip(keys, futures, values):
+            if not future.done():
+                future.set_result(value)
+            if self.ttl_seconds == 0:
+                self._forget(key, future)
+            elif self._cache.get(key, (None,))[0] is future:  # Not cleared while in flight
+                self._cache[key] = (future, expires)
+
+    def _forget(self, key: K, future: asyncio.Future) -> None:
+        if self._cache.get(key, (None,))[0] is future:
+            del self._cache[key]
+
+
+def request_loader(name: str, factory: Callable[[], DataLoader]) -> DataLoader | None:
+    """The current request's loader of this name, created on first use. None outside a request"""
+    loaders = request_loaders.get()
+    if loaders is None:
+        return None
+    loader = loaders.get(name)
+    if loader is None:
+        loader = loaders[name] = factory()
+    return loader
+
+
+@contextmanager
+def loader_scope():
+    """Fresh request loaders for the enclosed code, tasks started inside share them"""
+    token = request_loaders.set({})
+    try:
+        yield
+    finally:
+        request_loaders.reset(token)
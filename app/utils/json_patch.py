@@ -0,0 +1,147 @@
+import copy
+from typing import Any
+
+""" Minimal RFC 6902 JSON Patch, used for targeted updates inside a character sheet section """
+
+
+class JsonPatchError(ValueError):
+    """Raised when a patch cannot be applied to the document"""
+
+
+def parse_pointer(path: str) -> list[str]:
+    """Split an RFC 6901 JSON pointer ("/health/currentHealth") into its reference tokens"""
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {path!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in path[1:].split("/")]
+
+
+def to_pointer(tokens) -> str:
+    """Reference tokens -> RFC 6901 JSON pointer, the inverse of parse_pointer"""
+    return "".join("/" + str(token).replace("~", "~0").replace("/", "~1") for token in tokens)
+
+
+def _resolve_parent(doc: Any, tokens: list[str]) -> tuple[Any, str]:
+    """Walk to the container holding the last token"""
+    if not tokens:
+        raise JsonPatchError("Operation cannot target the document root")
+    parent = doc
+    for token in tokens[:-1]:
+        parent = _get_child(parent, token)
+    return parent, tokens[-1]
+
+
+def _array_index(token: str, length: int, end: bool = False) -> int:
+    """
+    RFC 6901 array index: ASCII digits without a leading zero, within the array. With end, adding, the
+    index may also be the length or "-", both meaning after the last element.
+    """
+    if end and token == "-":
+        return length
+    if not (token.isascii() and token.isdigit()) or (len(token) > 1 and token[0] == "0"):
+        raise JsonPatchError(f"Invalid array index {token!r}")
+    index = int(token)
+    if index > length or (index == length and not end):
+        raise JsonPatchError(f"Index {token!r} out of range")
+    return index
+
+
+def _get_child(container: Any, token: str) -> Any:
+    if isinstance(container, list):
+        return container[_array_index(token, len(container))]
+    try:
+        return container[token]
+    except (KeyError, TypeError):
+        raise JsonPatchError(f"Path segment {token!r} does not exist")
+
+
+def _get(doc: Any, path: str) -> Any:
+    value = doc
+    for token in parse_pointer(path):
+        value = _get_child(value, token)
+    return value
+
+
+def _add(doc: Any, path: str, value: Any) -> None:
+    parent, token = _resolve_parent(doc, parse_pointer(path))
+    if isinstance(parent, list):
+        parent.insert(_array_index(token, len(parent), end=True), value)
+    elif isinstance(parent, dict):
+        parent[token] = value
+    else:
+        raise JsonPatchError(f"Cannot add to a non container at {path!r}")
+
+
+def _remove(doc: Any, path: str) -> Any:
+    parent, token = _resolve_parent(doc, parse_pointer(path))
+    if isinstance(parent, list):
+        return parent.pop(_array_index(token, len(parent)))
+    try:
+        return parent.pop(token)
+    except (KeyError, TypeError, AttributeError):
+        raise JsonPatchError(f"Path {path!r} does not exist")
+
+
+def apply_patch(doc: Any, operations: list[dict]) -> Any:
+    """
+    Apply a list of JSON Patch operations to a copy of doc and return it.
+
+    Supports add, remove, replace, move, copy and test. The original document is never mutated,
+    so a failing operation leaves the caller's data untouched.
+
+    Raises:
+        JsonPatchError: If an operation is malformed, targets a missing path or a test fails.
+    """
+    result = copy.deepcopy(doc)
+    for operation in operations:
+        op = operation.get("op")
+        path = operation.get("path")
+        if not isinstance(path, str):
+            raise JsonPatchError("Operation is missing a path")
+        if op in ("move", "copy") and not isinstance(operation.get("from"), str):
+            raise JsonPatchError(f"{op} operation is missing a from path")
+        if op == "add":
+            _add(result, path, copy.deepcopy(operation.get("value")))
+        elif op == "remove":
+            _remove(result, path)
+        elif op == "replace":
+            _remove(result, path)
+            _add(result, path, copy.deepcopy(operation.get("value")))
+        elif op == "move":
+            value = _remove(result, operation["from"])
+            _add(result, path, value)
+        elif op == "copy":
+            _add(result, path, copy.deepcopy(_get(result, operation["from"])))
+        elif op == "test":
+            if _get(result, path) != operation.get("value"):
+                raise JsonPatchError(f"Test failed at {path!r}")
+        else:
+            raise JsonPatchError(f"Unsupported patch operation: {op!r}")
+    return result
+
+
+def diff(source: Any, target: Any) -> list[dict]:
+    """
+    JSON Patch operations turning source into target, apply_patch(source, diff(source, target)) == target.
+
+    Objects are compared key by key, so an edit deep inside a section costs one operation. Anything else,
+    lists included, is replaced whole when it differs.
+    """
+    operations: list[dict] = []
+    _diff(source, target, [], operations)
+    return operations
+
+
+def _diff(source: Any, target: Any, tokens: list, operations: list[dict]) -> None:
+    if isinstance(source, dict) and isinstance(target, dict):
+        for key in source:
+            if key not in target:
+                operations.append({"op": "remove", "path": to_pointer(tokens + [key])})
+        for key, value in target.items():
+            if key not in source:
+                operations.append({"op": "add", "path": to_pointer(tokens + [key]), "value": value})
+            else:
+                _diff(source[key], value, tokens + [key], operations)
+    elif type(source) is not type(target) or source != target:  # 1 == 1.0 == True, but not in JSON
+        operations.append({"op": "replace", "path": to_pointer(tokens), "value": target})
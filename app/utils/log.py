@@ -0,0 +1,210 @@
+import atexit
+import logging
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+import orjson
+
+""" Queue based structured logging, records are formatted and written on a background thread """
+
+# Set per request by RequestIdMiddleware, attached to every record logged while handling it
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not user supplied extra={...} fields
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message",
+    "request_id",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id and any extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+def _config_for(
+    name: str, config: dict[str, float], cache: dict[str, float | None]
+) -> float | None:
+    """Most specific entry for a logger name, "prisma" applies to "prisma.engine" too"""
+    if name in cache:
+        return cache[name]
+    value = None
+    candidate = name
+    while candidate:
+        if candidate in config:
+            value = config[candidate]
+            break
+        candidate = candidate.rpartition(".")[0]
+    cache[name] = value
+    return value
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records below WARNING per logger, e.g. {"prisma": 0.01}"""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._cache: dict[str, float | None] = {}
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = _config_for(record.name, self.rates, self._cache)
+        if rate is None or rate >= 1 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per logger, at most N records per second with bursts of up to N, e.g. {"app": 100}"""
+
+    def __init__(self, per_second: dict[str, float]):
+        super().__init__()
+        self.per_second = per_second
+        self._cache: dict[str, float | None] = {}
+        self._buckets: dict[str, list[float]] = {}  # logger name -> [tokens, last refill]
+        self.rate_limited = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.per_second:
+            return True
+        rate = _config_for(record.name, self.per_second, self._cache)
+        if rate is None:
+            return True
+        now = time.monotonic()
+        bucket = self._buckets.get(record.name)
+        if bucket is None:
+            bucket = self._buckets[record.name] = [rate, now]
+        bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        self.rate_limited += 1
+        return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread through a bounded queue.
+
+    The calling thread (usually the event loop) only merges the message arguments and tags the request
+    id, JSON encoding and the stream write happen on the listener. A full queue drops the record instead
+    of blocking the caller.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id.get()
+        # Render now, arguments may be mutated by the time the listener gets to the record
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None  # Tracebacks keep frames alive
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """Root logger -> filters -> bounded queue -> listener thread -> stdout"""
+
+    def __init__(self):
+        self.handler: DroppingQueueHandler | None = None
+        self.listener: QueueListener | None = None
+        self.sampling: SamplingFilter | None = None
+        self.rate_limit: RateLimitFilter | None = None
+        self._registered = False
+
+    def configure(
+        self,
+        level: str = "INFO",
+        json: bool = True,
+        queue_size: int = 10000,
+        sample_rates: dict[str, float] | None = None,
+        rate_limits: dict[str, float] | None = None,
+        levels: dict[str, str] | None = None,
+        stream=None,
+    ) -> None:
+        self.stop()
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(
+            JsonFormatter()
+            if json
+            else logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+        )
+        self.handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        self.sampling = SamplingFilter(sample_rates or {})
+        self.rate_limit = RateLimitFilter(rate_limits or {})
+        self.handler.addFilter(self.sampling)
+        self.handler.addFilter(self.rate_limit)
+
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(level)
+        for name, logger_level in (levels or {}).items():
+            logging.getLogger(name).setLevel(logger_level)
+        # uvicorn installs its own synchronous stream handlers, send its records through the queue too
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            logger = logging.getLogger(name)
+            logger.handlers.clear()
+            logger.propagate = True
+
+        self.listener = QueueListener(self.handler.queue, output, respect_handler_level=True)
+        self.listener.start()
+        if not self._registered:  # At exit rather than lifespan end, uvicorn still logs after that
+            atexit.register(self.stop)
+            self._registered = True
+
+    def stop(self) -> None:
+        """Write out what is queued and stop the listener thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def stats(self) -> dict:
+        if self.handler is None:
+            return {}
+        return {
+            "enqueued": self.handler.enqueued,
+            "dropped": self.handler.dropped,
+            "queued": self.handler.queue.qsize(),
+            "sampled_out": self.sampling.sampled_out,
+            "rate_limited": self.rate_limit.rate_limited,
+        }
+
+
+log_pipeline = LogPipeline()
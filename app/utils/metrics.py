@@ -0,0 +1,233 @@
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable
+
+""" In-process metrics rendered in the Prometheus text format, plus per-request timing spans """
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames: Labels = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+
+    def samples(self) -> Iterable[tuple[str, str, float]]:
+        """(name suffix, formatted labels, value) triples"""
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Labels = ()):
+        super().__init__(name, description, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield "", _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        self._values[labels] = value
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, description, labelnames)
+        self.buckets = buckets
+        self._series: dict[Labels, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1  # Non-cumulative here, accumulated when rendered
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self):
+        bucket_labels = (*self.labelnames, "le")
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield "_bucket", _format_labels(bucket_labels, (*labels, float(bound))), cumulative
+            yield "_bucket", _format_labels(bucket_labels, (*labels, "+Inf")), series[-1]
+            yield "_sum", _format_labels(self.labelnames, labels), series[-2]
+            yield "_count", _format_labels(self.labelnames, labels), series[-1]
+
+
+class Registry:
+    """
+    Metrics of this process. Collectors turn existing stats() dicts (caches, buffers) into gauges at
+    scrape time, so those components need no instrumentation of their own.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[tuple[str, str, Callable[[], dict]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labelnames: Labels = ()) -> Counter:
+        return self.register(Counter(name, description, labelnames))
+
+    def gauge(self, name: str, description: str, labelnames: Labels = ()) -> Gauge:
+        return self.register(Gauge(name, description, labelnames))
+
+    def histogram(
+        self, name: str, description: str, labelnames: Labels = (), buckets=LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, description, labelnames, buckets))
+
+    def add_collector(self, prefix: str, description: str, stats: Callable[[], dict]) -> None:
+        """Export every numeric value of stats() as a gauge named prefix_key"""
+        self._collectors.append((prefix, description, stats))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for prefix, description, stats in self._collectors:
+            try:
+                values = stats()
+            except Exception as e:  # A broken collector must not break the scrape
+                logger.error("Metrics collector %s failed: %s", prefix, e)
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# HELP {prefix}_{key} {description}")
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Set once at startup from Settings.METRICS_ENABLED, instrumentation checks it before timing anything
+enabled = False
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+)
+http_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being handled")
+db_query_latency = registry.histogram(
+    "db_query_duration_seconds", "Prisma query latency", ("method", "model")
+)
+db_queries_per_request = registry.histogram(
+    "http_request_db_queries", "Database queries issued per HTTP request", ("route",), COUNT_BUCKETS
+)
+db_n_plus_one = registry.counter(
+    "db_n_plus_one_total",
+    "Requests repeating one query shape at least N_PLUS_ONE_THRESHOLD times",
+    ("route",),
+)
+span_latency = registry.histogram(
+    "span_duration_seconds", "Time spent in bcrypt hashing and JWT decoding", ("span",)
+)
+
+
+class RequestStats:
+    """Per-request accumulator, reachable from anywhere in the request through a context variable"""
+
+    __slots__ = ("db_queries", "db_seconds", "query_shapes", "spans")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.query_shapes: dict[tuple, int] = {}
+        self.spans: dict[str, float] = {}
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def record_span(name: str, seconds: float) -> None:
+    span_latency.observe(seconds, (name,))
+    stats = current_request.get()
+    if stats is not None:
+        stats.spans[name] = stats.spans.get(name, 0.0) + seconds
+
+
+def record_query(method: str, model: str, shape: tuple, seconds: float) -> None:
+    db_query_latency.observe(seconds, (method, model))
+    stats = current_request.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += seconds
+        stats.query_shapes[shape] = stats.query_shapes.get(shape, 0) + 1
+
+
+class timed:
+    """Context manager recording a span, a no-op when metrics are disabled"""
+
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter() if enabled else None
+        return self
+
+    def __exit__(self, *exc):
+        if self.started is not None:
+            record_span(self.name, time.perf_counter() - self.started)
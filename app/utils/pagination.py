@@ -0,0 +1,62 @@
+import base64
+import json
+from fastapi import HTTPException
+
+""" Keyset (cursor) pagination and field projection helpers for listing endpoints """
+
+
+def encode_cursor(created_at, row_id: str) -> str:
+    """Opaque cursor pointing just after the row with this (created_at, id) key"""
+    if hasattr(created_at, "isoformat"):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(created_at), str(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: str | None, allowed, default: list[str]) -> list[str]:
+    """
+    Parse a comma separated fields= query parameter against the allowed projection.
+
+    Args:
+        fields (str | None): e.g. "id,username", None for the default projection.
+        allowed (Collection[str]): Field names that may be requested.
+        default (list[str]): Fields returned when none are requested.
+
+    Raises:
+        HTTPException: If an unknown field is requested, a 400 is raised listing the allowed ones.
+    """
+    if not fields:
+        return default
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields {unknown}, allowed: {sorted(allowed)}",
+        )
+    return list(dict.fromkeys(requested))  # De-duplicate, keep order
+
+
+def keyset_page(
+    rows: list[dict], limit: int, fields: list[str], created_field: str
+) -> dict:
+    """
+    Build a page from limit + 1 fetched rows: the extra row only signals there is a next page.
+    Key columns are stripped again if they were not part of the requested projection.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (
+        encode_cursor(rows[-1][created_field], rows[-1]["id"]) if has_more else None
+    )
+    items = [{field: row[field] for field in fields} for row in rows]
+    return {"items": items, "next_cursor": next_cursor}
+
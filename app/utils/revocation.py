@@ -0,0 +1,52 @@
+import time
+
+""" Revoked refresh token families, checked in memory on every refresh and verify """
+
+
+class RevocationList:
+    """
+    Expiring denylist of refresh token family ids.
+
+    An entry only has to live as long as the newest token of its family, after that the token's own exp
+    rejects it anyway, so the list holds the families revoked within the last REFRESH_TOKEN_EXPIRE_HOURS
+    rather than every session. Entries are never evicted early, a full cache must not un-revoke a token.
+    Not thread safe, meant to be used from the event loop.
+    """
+
+    def __init__(self):
+        self._families: dict[str, float] = {}  # family id -> unix time its newest token expires
+        self.checks = 0
+        self.rejected = 0
+
+    def revoke(self, family_id: str, expires_at: float) -> None:
+        if expires_at > time.time():
+            self._families[family_id] = max(expires_at, self._families.get(family_id, 0))
+
+    def is_revoked(self, family_id: str) -> bool:
+        self.checks += 1
+        expires_at = self._families.get(family_id)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():  # Token expired anyway
+            del self._families[family_id]
+            return False
+        self.rejected += 1
+        return True
+
+    def purge(self) -> int:
+        """Drop entries whose tokens have all expired"""
+        now = time.time()
+        expired = [family_id for family_id, expires_at in self._families.items() if expires_at <= now]
+        for family_id in expired:
+            del self._families[family_id]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._families)
+
+    def stats(self) -> dict:
+        return {"revoked_families": len(self._families), "checks": self.checks, "rejected": self.rejected}
+
+
+# Shared by token verification and the session service, which keeps it in sync across workers
+revoked_families = RevocationList()
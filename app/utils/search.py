@@ -0,0 +1,134 @@
+import re
+from bisect import bisect_left, bisect_right, insort
+import numpy as np
+
+""" Prefix and trigram name search in process, scored the way Postgres pg_trgm scores it """
+
+_WORDS = re.compile(r"[^\W_]+")
+
+
+def name_key(name: str) -> str:
+    """Sort and prefix key of a name, lower() in SQL"""
+    return name.lower()
+
+
+def trigrams(text: str) -> set[str]:
+    """pg_trgm's trigrams: per alphanumeric word, lowercased and padded with two spaces before, one after"""
+    grams = set()
+    for word in _WORDS.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: set[str], b: set[str]) -> float:
+    """Shared trigrams over distinct trigrams of both, pg_trgm's similarity()"""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class NameIndex:
+    """
+    Names in (name key, id) order for prefix search and keyset pages, plus an inverted trigram index for
+    fuzzy search. Every name has an integer slot, so a fuzzy search counts shared trigrams and scores
+    all names at once with numpy instead of one Python step per candidate.
+    """
+
+    def __init__(self):
+        self._ordered: list[tuple[str, str]] = []
+        self._keys: dict[str, str] = {}  # id -> name key
+        self._slots: dict[str, int] = {}  # id -> slot
+        self._slot_ids: list[str | None] = []  # slot -> id, None when free
+        self._free: list[int] = []
+        self._sizes = np.zeros(1024, dtype=np.int32)  # slot -> trigram count of the name
+        self._grams: dict[str, set[str]] = {}  # id -> trigrams of the name
+        self._postings: dict[str, set[int]] = {}  # trigram -> slots
+        self._arrays: dict[str, np.ndarray] = {}  # trigram -> its slots as an array, until they change
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def key_of(self, row_id: str) -> str:
+        return self._keys[row_id]
+
+    def _take_slot(self, row_id: str) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self._slot_ids[slot] = row_id
+        else:
+            slot = len(self._slot_ids)
+            self._slot_ids.append(row_id)
+            if slot >= len(self._sizes):
+                self._sizes = np.concatenate([self._sizes, np.zeros_like(self._sizes)])
+        self._slots[row_id] = slot
+        return slot
+
+    def add(self, row_id: str, name: str) -> None:
+        key = name_key(name)
+        if self._keys.get(row_id) == key:
+            return
+        self.remove(row_id)
+        self._keys[row_id] = key
+        insort(self._ordered, (key, row_id))
+        slot = self._take_slot(row_id)
+        grams = trigrams(name)
+        self._grams[row_id] = grams
+        self._sizes[slot] = len(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(slot)
+            self._arrays.pop(gram, None)
+
+    def remove(self, row_id: str) -> None:
+        key = self._keys.pop(row_id, None)
+        if key is None:
+            return
+        index = bisect_left(self._ordered, (key, row_id))
+        del self._ordered[index]
+        slot = self._slots.pop(row_id)
+        for gram in self._grams.pop(row_id):
+            slots = self._postings[gram]
+            slots.discard(slot)
+            self._arrays.pop(gram, None)
+            if not slots:
+                del self._postings[gram]
+        self._sizes[slot] = 0
+        self._slot_ids[slot] = None
+        self._free.append(slot)
+
+    def prefixed(self, prefix: str, after: tuple[str, str] | None = None):
+        """Ids of names starting with prefix in (name key, id) order, strictly after the cursor key"""
+        prefix = name_key(prefix)
+        start = bisect_left(self._ordered, (prefix, ""))
+        if after:
+            start = max(start, bisect_right(self._ordered, after))
+        ordered = self._ordered
+        for i in range(start, len(ordered)):  # Not a slice, that would copy the whole tail first
+            key, row_id = ordered[i]
+            if not key.startswith(prefix):
+                return
+            yield row_id
+
+    def _array(self, gram: str) -> np.ndarray:
+        array = self._arrays.get(gram)
+        if array is None:
+            slots = self._postings[gram]
+            array = self._arrays[gram] = np.fromiter(slots, dtype=np.int64, count=len(slots))
+        return array
+
+    def fuzzy(self, query: str, threshold: float) -> list[tuple[float, str]]:
+        """(score, id) of names at least threshold similar to query, best first, ties by id"""
+        grams = trigrams(query)
+        arrays = [self._array(gram) for gram in grams if gram in self._postings]
+        if not arrays:
+            return []
+        shared = np.bincount(np.concatenate(arrays), minlength=len(self._slot_ids))
+        candidates = np.flatnonzero(shared)
+        counts = shared[candidates]
+        scores = counts / (len(grams) + self._sizes[candidates] - counts)
+        hits = scores >= threshold
+        return sorted(
+            ((float(score), self._slot_ids[slot]) for score, slot in zip(scores[hits], candidates[hits])),
+            key=lambda hit: (-hit[0], hit[1]),
+        )
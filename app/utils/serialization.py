@@ -0,0 +1,150 @@
+from datetime import date, datetime
+from typing import Any, Type
+from uuid import UUID
+import orjson
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response
+from pydantic import BaseModel, ValidationError
+from app.config import settings
+
+try:  # Optional, the MessagePack media type is only offered when installed
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+""" Fast JSON path: validate request bodies straight from bytes and send pre-encoded responses """
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (set, frozenset)):  # classSkills
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """orjson encode, datetimes and UUIDs natively, sets as lists, int keys as strings"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class JSONBytesResponse(Response):
+    """
+    JSON response for content encoded with orjson.
+
+    Returning a Response from a route bypasses FastAPI's jsonable_encoder pass, which walks the whole
+    (deeply nested) State again before encoding. Accepts already encoded bytes as well.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return _default(value)
+
+
+def msgpack_enabled() -> bool:
+    return msgpack is not None and settings.MSGPACK_ENABLED
+
+
+def is_msgpack(content_type: str | None) -> bool:
+    return bool(content_type) and content_type.split(";")[0].strip().lower() in MSGPACK_MEDIA_TYPES
+
+
+def wants_msgpack(request: Request) -> bool:
+    """Client asked for MessagePack in Accept (and did not rank it at q=0)"""
+    if not msgpack_enabled():
+        return False
+    for part in request.headers.get("accept", "").split(","):
+        media_type, _, params = part.partition(";")
+        if is_msgpack(media_type) and params.replace(" ", "") != "q=0":
+            return True
+    return False
+
+
+def packb(content: Any) -> bytes:
+    return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+def _unpackb(body: bytes) -> Any:
+    if not msgpack_enabled():
+        raise HTTPException(status_code=415, detail="MessagePack bodies are not supported")
+    try:
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError):
+        raise HTTPException(status_code=400, detail="Invalid MessagePack body")
+
+
+class MsgpackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return packb(content)
+
+
+def negotiated_response(
+    request: Request, content: Any, status_code: int = 200, headers: dict | None = None
+) -> Response:
+    """MessagePack if the client's Accept asks for it, JSON otherwise"""
+    response_class = MsgpackResponse if wants_msgpack(request) else JSONBytesResponse
+    response = response_class(content, status_code=status_code, headers=headers)
+    if msgpack_enabled():
+        response.headers.append("Vary", "Accept")
+    return response
+
+
+async def request_body(request: Request) -> bytes | Any:
+    """
+    Request body for section validation: the raw bytes of a JSON body, for model_validate_json,
+    or the decoded object of a MessagePack body.
+    """
+    body = await request.body()
+    if is_msgpack(request.headers.get("content-type")):
+        return _unpackb(body)
+    return body
+
+
+def validated_body(model: Type[BaseModel]):
+    """
+    Dependency validating the raw request body with model.model_validate_json.
+
+    pydantic-core parses and validates in one pass, instead of FastAPI decoding to dicts with the json
+    module first and validating those. MessagePack bodies are decoded and validated from the objects.
+    Errors are reported the same way as FastAPI's own body errors.
+    """
+
+    async def dependency(request: Request) -> BaseModel:
+        body = await request.body()
+        try:
+            if is_msgpack(request.headers.get("content-type")):
+                return model.model_validate(_unpackb(body))
+            return model.model_validate_json(body)
+        except ValidationError as e:
+            raise body_validation_error(e, body)
+
+    return dependency
+
+
+def body_validation_error(e: ValidationError, body: Any) -> RequestValidationError:
+    """
+    A pydantic error reported as FastAPI's own body errors. Malformed JSON is reported with the raw bytes
+    as its input, decoded here so the 422 can be rendered whatever the client sent.
+    """
+    errors = []
+    for error in e.errors(include_url=False, include_context=False):
+        if isinstance(error.get("input"), bytes):
+            error["input"] = error["input"].decode(errors="replace")
+        errors.append({**error, "loc": ("body", *error["loc"])})
+    return RequestValidationError(errors, body=body)
@@ -0,0 +1,168 @@
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+""" Token buckets and failure counters for throttling, in process or shared through Redis """
+
+
+class ThrottleStore(ABC):
+    """
+    Where throttling state lives. Keys are opaque strings such as "rate:ip:203.0.113.7".
+
+    take() refills a key's bucket at rate tokens per second up to burst and takes one token.
+    Failure counters reset once no failure was recorded for window seconds. A key is used either as a
+    bucket or as a failure counter, never both: the two share the store's entry for it.
+    """
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """0 if a token was taken, otherwise the seconds until one is available"""
+
+    @abstractmethod
+    async def add_failure(self, key: str, window: float) -> int:
+        """Record a failure, returns the failures counted within the window"""
+
+    @abstractmethod
+    async def failures(self, key: str, window: float) -> tuple[int, float]:
+        """(failures within the window, unix time of the last one)"""
+
+    @abstractmethod
+    async def clear(self, key: str) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class _Shard:
+    """Bounded LRU of key -> state, the least recently used key goes first when full"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.entries: OrderedDict[str, list[float]] = OrderedDict()
+
+    def get(self, key: str) -> list[float] | None:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: list[float]) -> None:
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_keys:
+            self.entries.popitem(last=False)
+
+
+class MemoryThrottleStore(ThrottleStore):
+    """
+    Per worker state split over shards by key hash, each a bounded LRU. A flood of distinct keys (IP
+    spraying) only evicts within its shards and never grows memory past max_keys in total. Limits are
+    per worker, with N workers a client gets up to N times the configured rate.
+    """
+
+    def __init__(self, max_keys: int = 100_000, shards: int = 16):
+        self._shards = [_Shard(max(1, max_keys // shards)) for _ in range(shards)]
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        shard = self._shard(key)
+        now = time.monotonic()
+        bucket = shard.get(key)
+        if bucket is None:
+            bucket = [float(burst), now]  # tokens, last refill
+            shard.put(key, bucket)
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rate
+
+    async def add_failure(self, key: str, window: float) -> int:
+        shard = self._shard(key)
+        now = time.time()
+        entry = shard.get(key)
+        if entry is None or now - entry[1] > window:
+            entry = [0, now]  # count, last failure
+            shard.put(key, entry)
+        entry[0] += 1
+        entry[1] = now
+        return int(entry[0])
+
+    async def failures(self, key: str, window: float) -> tuple[int, float]:
+        entry = self._shard(key).get(key)
+        if entry is None or time.time() - entry[1] > window:
+            return 0, 0.0
+        return int(entry[0]), entry[1]
+
+    async def clear(self, key: str) -> None:
+        self._shard(key).entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+
+# Token bucket as one atomic script, so workers sharing a key never over-admit
+_TAKE = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 't') or ARGV[2])
+local last = tonumber(redis.call('HGET', KEYS[1], 'l') or ARGV[3])
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 't', tokens, 'l', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisThrottleStore(ThrottleStore):
+    """
+    Shared by every worker and every host, limits hold for the whole deployment.
+    Requires the redis package.
+    """
+
+    def __init__(self, url: str, prefix: str = "throttle:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("THROTTLE_STORE_URL is a Redis URL but the redis package is not installed")
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        return float(await self._take(keys=[self.prefix + key], args=[rate, burst, time.time()]))
+
+    async def add_failure(self, key: str, window: float) -> int:
+        name = self.prefix + key
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(name, "n", 1)
+            pipe.hset(name, "l", time.time())
+            pipe.expire(name, int(window) + 1)
+            count, _, _ = await pipe.execute()
+        return int(count)
+
+    async def failures(self, key: str, window: float) -> tuple[int, float]:
+        count, last = await self._redis.hmget(self.prefix + key, "n", "l")
+        if count is None:
+            return 0, 0.0
+        return int(count), float(last)
+
+    async def clear(self, key: str) -> None:
+        await self._redis.delete(self.prefix + key)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_throttle_store(url: str | None, max_keys: int, shards: int) -> ThrottleStore:
+    if not url:
+        return MemoryThrottleStore(max_keys=max_keys, shards=shards)
+    if url.startswith(("redis://", "rediss://")):
+        return RedisThrottleStore(url)
+    raise ValueError(f"Unsupported throttle store URL: {url}")
@@ -0,0 +1,58 @@
+"""
+Benchmark: bulk recompute throughput, NumPy column-wise chunks versus the per-sheet rules engine.
+
+Measures the compute part of app.services.bulk_recompute in characters per second, for a house rule
+change (Fighter base saves) combined with a one level party level-up. Reading and writing rows is
+not included, run the module itself against a database for end to end numbers.
+
+Usage:
+    python -m benchmarks.bench_bulk_recompute [--characters 20000] [--chunk-size 1000]
+"""
+
+import argparse
+import copy
+import time
+
+from app.rules.engine import RulesEngine
+from app.services.bulk_recompute import recompute_chunk
+from benchmarks.fixtures import sample_state
+
+CLASSES = {"Fighter": {"baseSave": {"fortitudeBase": 3, "reflexBase": 1, "willBase": 1}}}
+
+
+def per_sheet(sheets: list[dict], engine: RulesEngine) -> None:
+    for sheet in sheets:
+        details = sheet["characterDetails"]
+        if details["characterClass"]["className"] in CLASSES:
+            details["characterClass"]["baseSave"] = dict(CLASSES["Fighter"]["baseSave"])
+        details["level"] += 1
+        engine.recompute_all(sheet)
+
+
+def main(args) -> None:
+    sheets = [sample_state(seed) for seed in range(args.characters)]
+    for sheet in sheets:
+        sheet["stats"]["scores"]["dexterity"] += 1  # Make derived values stale
+
+    scalar = copy.deepcopy(sheets)
+    start = time.perf_counter()
+    per_sheet(scalar, RulesEngine())
+    scalar_rate = len(scalar) / (time.perf_counter() - start)
+
+    vector = copy.deepcopy(sheets)
+    start = time.perf_counter()
+    for i in range(0, len(vector), args.chunk_size):
+        recompute_chunk(vector[i : i + args.chunk_size], CLASSES, level_delta=1)
+    vector_rate = len(vector) / (time.perf_counter() - start)
+
+    assert scalar == vector, "NumPy recompute differs from the rules engine"
+    print(f"{'pipeline':>10} {'characters/s':>13}")
+    print(f"{'per sheet':>10} {scalar_rate:>13.0f}")
+    print(f"{'numpy':>10} {vector_rate:>13.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--characters", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    main(parser.parse_args())
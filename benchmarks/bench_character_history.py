@@ -0,0 +1,193 @@
+"""
+Benchmark: character sheet history as JSON Patch deltas with periodic snapshots, against a full copy of
+the sheet per version.
+
+Creates --characters characters through the character service and makes --edits edits spread over
+them, the kind a session produces: HP ticks, skill ranks, ability scores (recomputing modifiers, saves
+and skills), level-ups. Every edit is recorded as its own version, then:
+
+- storage:      bytes stored per 1,000 edits, snapshots plus deltas, against a full copy per edit
+- rebuild:      latency of rebuilding random versions, each checked against the sheet after that edit
+- coalesced:    versions and bytes when edits come in bursts of --burst saves, recorded once per burst
+- compaction:   dropping all but the newest --keep versions, the oldest kept one still rebuilds
+- restore:      restoring an earlier version makes the current sheet equal to it again
+
+Usage:
+    python -m benchmarks.bench_character_history [--characters 50] [--edits 2000] [--snapshot-every 20]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+
+import orjson
+
+# Settings are read at import
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["AUTOSAVE_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+ABILITIES = ["strength", "dexterity", "constitution", "intelligence", "wisdom", "charisma"]
+
+
+def edit(rng: random.Random, sheet: dict) -> tuple[str, list[dict]]:
+    """A random (section, patch operations) edit of the kind a play session makes"""
+    kind = rng.random()
+    if kind < 0.5:
+        health = sheet["status"]["health"]
+        return "status", [
+            {"op": "replace", "path": "/health/currentHealth", "value": rng.randint(0, health["maxHealth"])}
+        ]
+    if kind < 0.75:
+        skill = rng.choice(sorted(sheet["skills"]["skills"]))
+        ranks = rng.randint(0, sheet["characterDetails"]["level"] + 3)
+        return "skills", [
+            {"op": "replace", "path": f"/skills/{skill}/ranks", "value": ranks},
+            {"op": "replace", "path": f"/skills/{skill}/learned", "value": ranks > 0},
+        ]
+    if kind < 0.95:
+        ability = rng.choice(ABILITIES)
+        return "stats", [{"op": "replace", "path": f"/scores/{ability}", "value": rng.randint(6, 20)}]
+    level = min(20, sheet["characterDetails"]["level"] + 1)
+    return "characterDetails", [{"op": "replace", "path": "/level", "value": level}]
+
+
+def report(name: str, latencies: list[float], extra: str = "") -> None:
+    latencies.sort()
+    n = len(latencies)
+    print(
+        f"{name:28} p50 {latencies[n // 2] * 1e3:7.3f} ms  p99 {latencies[int(n * 0.99)] * 1e3:7.3f} ms  "
+        f"{extra}"
+    )
+
+
+async def run(args) -> None:
+    from app.repositories import character_versions, storage
+    from app.schemas.characters import CharacterSection, State
+    from app.services import character_service
+    from app.services.character_service import character_history
+    from app.utils.serialization import dumps
+    from benchmarks.fixtures import sample_state
+
+    await storage.connect()
+    character_history.snapshot_every = args.snapshot_every
+    rng = random.Random(5)
+    owner = str(uuid.uuid4())
+    ids = []
+    full_copies = 0  # Bytes a full copy per version would take, the first versions included
+    for seed in range(args.characters):
+        character = await character_service.create_character(owner, State(**sample_state(seed)))
+        ids.append(character["id"])
+        await character_history.flush(character["id"])
+        full_copies += len(dumps(await character_service._current_sheet(character["id"])))
+
+    # One version per edit
+    expected: dict[tuple[str, int], bytes] = {}
+    versions = {character_id: 1 for character_id in ids}
+    started = time.perf_counter()
+    for _ in range(args.edits):
+        character_id = rng.choice(ids)
+        sheet = await character_service._current_sheet(character_id)
+        section, operations = edit(rng, sheet)
+        await character_service.patch_section(character_id, owner, CharacterSection(section), operations)
+        before = character_history.versions
+        await character_history.flush(character_id)
+        if character_history.versions > before:
+            versions[character_id] += 1
+        current = await character_service._current_sheet(character_id)
+        body = dumps(current)
+        full_copies += len(body)
+        expected[(character_id, versions[character_id])] = body
+    elapsed = time.perf_counter() - started
+    recorded = sum(versions.values()) - len(ids)
+
+    usage = await character_history.usage()
+    stored = usage["snapshot_bytes"] + usage["delta_bytes"]
+    print(
+        f"{args.edits} edits on {len(ids)} characters in {elapsed:.1f} s, {recorded} versions "
+        f"(edits changing nothing record none), a snapshot after every {args.snapshot_every} deltas"
+    )
+    print(
+        f"{'stored per 1,000 edits':28} {stored / args.edits * 1000 / 1e6:7.2f} MB  "
+        f"({usage['snapshots']} snapshots {usage['snapshot_bytes'] / 1e6:.2f} MB, "
+        f"deltas {usage['delta_bytes'] / 1e6:.2f} MB)"
+    )
+    print(
+        f"{'full copies per 1,000 edits':28} {full_copies / args.edits * 1000 / 1e6:7.2f} MB  "
+        f"{full_copies / stored:.1f}x more"
+    )
+    print(
+        f"{'average delta':28} {usage['delta_bytes'] / max(1, usage['versions'] - usage['snapshots']):7.0f} B  "
+        f"average sheet {full_copies / (args.edits + len(ids)):.0f} B"
+    )
+
+    # Rebuild random versions, at most snapshot_every patches each
+    latencies, patches = [], 0
+    for (character_id, version), body in rng.sample(sorted(expected.items()), min(500, len(expected))):
+        started = time.perf_counter()
+        rows = await character_versions.chain(character_id, version)
+        _, sheet = await character_history.sheet_at(character_id, version)
+        latencies.append(time.perf_counter() - started)
+        patches = max(patches, len(rows) - 1)
+        assert sheet == orjson.loads(body), f"Version {version} of {character_id} does not rebuild"
+    report("rebuild a version", latencies, f"at most {patches} patches applied")
+
+    # Bursts of saves recorded as one version each
+    coalesced_before = await character_history.usage()
+    saves = 0
+    for _ in range(args.edits // args.burst):
+        character_id = rng.choice(ids)
+        for _ in range(args.burst):
+            sheet = await character_service._current_sheet(character_id)
+            section, operations = edit(rng, sheet)
+            await character_service.patch_section(character_id, owner, CharacterSection(section), operations)
+            saves += 1
+        await character_history.flush(character_id)
+    coalesced = await character_history.usage()
+    added = coalesced["versions"] - coalesced_before["versions"]
+    added_bytes = (coalesced["snapshot_bytes"] + coalesced["delta_bytes"]) - stored
+    print(
+        f"{'coalesced, bursts of ' + str(args.burst):28} {added} versions for {saves} saves, "
+        f"{added_bytes / saves * 1000 / 1e6:.2f} MB per 1,000 saves"
+    )
+
+    # Keep only the newest versions
+    character_history.max_versions = args.keep
+    started = time.perf_counter()
+    dropped = await character_history.compact()
+    after = await character_history.usage()
+    print(
+        f"{'compaction, keep ' + str(args.keep):28} dropped {dropped} versions in "
+        f"{time.perf_counter() - started:.2f} s, {after['versions']} left "
+        f"({(after['snapshot_bytes'] + after['delta_bytes']) / 1e6:.2f} MB)"
+    )
+    character_id = ids[0]
+    page = await character_service.list_versions(character_id, owner, args.keep + 1)
+    oldest = page["items"][-1]["version"]
+    assert len(page["items"]) == args.keep and page["items"][-1]["snapshot"]
+    assert (await character_history.sheet_at(character_id, oldest)) is not None
+
+    # Undo: restore the version before the newest
+    newest = page["items"][0]["version"]
+    restored = await character_service.restore_version(character_id, owner, newest - 1)
+    target = (await character_service.get_version(character_id, owner, newest - 1))
+    assert all(restored[section] == target[section] for section in ("characterDetails", "stats", "skills"))
+    page = await character_service.list_versions(character_id, owner, 1)
+    changes = await character_service.diff_versions(character_id, owner, page["items"][0]["version"])
+    print(
+        f"{'restore version ' + str(newest - 1):28} recorded as version {page['items'][0]['version']}, "
+        f"{len(changes['ops'])} operations undone"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--characters", type=int, default=50)
+    parser.add_argument("--edits", type=int, default=2000)
+    parser.add_argument("--snapshot-every", type=int, default=20, help="Deltas between snapshots")
+    parser.add_argument("--burst", type=int, default=10, help="Saves per editing burst")
+    parser.add_argument("--keep", type=int, default=10, help="Versions kept by compaction")
+    asyncio.run(run(parser.parse_args()))
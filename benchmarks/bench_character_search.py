@@ -0,0 +1,175 @@
+"""
+Benchmark: character search over the denormalised name, class, race and level columns.
+
+Fills the embedded storage backend with --characters characters (generated fantasy names, 12 classes,
+9 races, levels 1-20, one rare race) and times search_characters() pages for:
+
+- prefix:       short and longer name prefixes, the first page and a page deep into the results
+- fuzzy:        a misspelt name, trigram similarity as pg_trgm scores it
+- filters:      class plus level range without a name, and a rare race
+- scan:         the same filter search done by scanning every character, what no index costs
+
+Every searched page is checked against a brute-force scan of all characters.
+
+Usage:
+    python -m benchmarks.bench_character_search [--characters 200000] [--searches 200]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+os.environ["STORAGE_BACKEND"] = "memory"  # Before app.repositories picks the backend
+
+SYLLABLES = ["ar", "bel", "cor", "dra", "el", "fen", "gal", "hal", "is", "jor", "kal", "lor", "mir",
+             "nor", "or", "pel", "quin", "ros", "sil", "tor", "ul", "val", "wen", "xan", "yor", "zed"]
+CLASSES = ["Barbarian", "Bard", "Cleric", "Druid", "Fighter", "Monk", "Paladin", "Ranger", "Rogue",
+           "Sorcerer", "Warlock", "Wizard"]
+RACES = ["Dwarf", "Elf", "Gnome", "Half-Elf", "Half-Orc", "Halfling", "Human", "Tiefling"]
+RARE_RACE = "Aasimar"  # 1 in 500
+
+
+def generated_name(rng: random.Random) -> str:
+    first = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+    last = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+    return f"{first} {last}"
+
+
+def report(name: str, latencies: list[float], results: int) -> None:
+    latencies.sort()
+    n = len(latencies)
+    print(
+        f"{name:28} p50 {latencies[n // 2] * 1e3:7.2f} ms  p99 {latencies[int(n * 0.99)] * 1e3:7.2f} ms  "
+        f"{results / n:6.1f} results per page"
+    )
+
+
+async def timed(name: str, searches, expected) -> None:
+    """Run each (args) search, check it against the brute-force expectation and report latency"""
+    from app.services.character_service import search_characters
+
+    latencies, results = [], 0
+    for args, want in zip(searches, expected):
+        started = time.perf_counter()
+        page = await search_characters(*args)
+        latencies.append(time.perf_counter() - started)
+        results += len(page["items"])
+        got = [item["id"] for item in page["items"]]
+        assert got == want, f"{name}: {args} returned {got[:3]}..., expected {want[:3]}..."
+    report(name, latencies, results)
+
+
+async def run(args) -> None:
+    from app.repositories import characters
+    from app.repositories.base import CharacterFilters
+    from app.utils.pagination import encode_cursor
+    from app.utils.search import name_key, similarity, trigrams
+
+    rng = random.Random(7)
+    users = [str(uuid.uuid4()) for _ in range(max(1, args.characters // 4))]
+    now = datetime.now(timezone.utc).isoformat()
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = []
+    for n in range(args.characters):
+        row = {
+            "id": str(uuid.uuid4()),
+            "userId": users[n % len(users)],
+            "characterName": generated_name(rng),
+            "characterClass": rng.choice(CLASSES),
+            "race": RARE_RACE if rng.random() < 0.002 else rng.choice(RACES),
+            "level": rng.randint(1, 20),
+            **{column: {} for column in ("characterDetails", "stats", "status", "bonuses",
+                                         "savingThrows", "skills")},
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        characters.load(dict(row))  # Indexes it like a snapshot replay, without logging
+        rows.append(row)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{args.characters} characters indexed in {time.perf_counter() - started:.1f} s, "
+          f"{memory / 1e6:.0f} MB with their (empty) sections")
+
+    by_name = sorted(rows, key=lambda row: (name_key(row["characterName"]), row["id"]))
+    limit = 20
+    everything = CharacterFilters()
+
+    def prefix_expected(prefix: str, filters: CharacterFilters, after=None) -> list[str]:
+        matched = [
+            row["id"] for row in by_name
+            if name_key(row["characterName"]).startswith(prefix.lower()) and filters.matches(row)
+            and (after is None or (name_key(row["characterName"]), row["id"]) > after)
+        ]
+        return matched[:limit]
+
+    picks = [rng.choice(rows) for _ in range(args.searches)]
+    for length in (2, 5):
+        prefixes = [row["characterName"][:length] for row in picks]
+        await timed(
+            f"prefix, {length} letters",
+            [(prefix, False, everything, limit, None) for prefix in prefixes],
+            [prefix_expected(prefix, everything) for prefix in prefixes],
+        )
+
+    # A page about 1000 results into a 2 letter prefix, served from a cursor like any other page
+    deep = []
+    for row in picks:
+        prefix = row["characterName"][:2]
+        matched = [r for r in by_name if name_key(r["characterName"]).startswith(prefix.lower())]
+        last = matched[min(1000, len(matched) // 2)]
+        deep.append((prefix, (name_key(last["characterName"]), last["id"])))
+    await timed(
+        "prefix, page 50",
+        [(p, False, everything, limit, encode_cursor(*after)) for p, after in deep],
+        [prefix_expected(p, everything, after) for p, after in deep],
+    )
+
+    # Misspelt: one syllable of the name swapped, a player half remembering it
+    queries = []
+    for row in picks[: max(1, args.searches // 4)]:
+        name = row["characterName"]
+        queries.append(name.replace(name[1:3], "xy", 1))
+    expected = []
+    for query in queries:
+        grams = trigrams(query)
+        scored = sorted(
+            (-similarity(grams, trigrams(row["characterName"])), row["id"]) for row in rows
+        )
+        expected.append([i for score, i in scored if -score >= 0.3][:limit])
+    await timed("fuzzy, misspelt name", [(q, True, everything, limit, None) for q in queries], expected)
+
+    filter_sets = [
+        CharacterFilters(characterClass=rng.choice(CLASSES), min_level=l, max_level=l + 2)
+        for l in (rng.randint(1, 18) for _ in range(args.searches))
+    ]
+    await timed(
+        "class + level range",
+        [(None, False, filters, limit, None) for filters in filter_sets],
+        [prefix_expected("", filters) for filters in filter_sets],
+    )
+    rare = [CharacterFilters(race=RARE_RACE, min_level=rng.randint(1, 10)) for _ in range(args.searches)]
+    await timed(
+        "rare race",
+        [(None, False, filters, limit, None) for filters in rare],
+        [prefix_expected("", filters) for filters in rare],
+    )
+
+    latencies = []
+    for filters in rare[:20]:
+        started = time.perf_counter()
+        [row for row in rows if filters.matches(row)][:limit]
+        latencies.append(time.perf_counter() - started)
+    report("rare race, full scan", latencies, limit)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--characters", type=int, default=200_000)
+    parser.add_argument("--searches", type=int, default=200, help="Searches per kind")
+    asyncio.run(run(parser.parse_args()))
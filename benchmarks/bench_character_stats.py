@@ -0,0 +1,148 @@
+"""
+Benchmark: community statistics from counts kept in memory against aggregating on every page view.
+
+Loads --characters characters into the embedded storage backend, then times:
+
+- aggregate:    characters.aggregate(), one pass over every character per view, what GROUP BY costs
+- endpoint:     GET /stats/characters served from the kept counts, and a 304 for a matching ETag
+- user count:   GET /stats/characters/users/{id}
+
+Then creates, updates (level-ups, a class change) and deletes characters through the character
+service and reconciles: the kept counts must match storage with no drift. Last, a level-up written
+straight to storage, the way bulk recompute does, shows the drift the next reconcile corrects.
+
+Usage:
+    python -m benchmarks.bench_character_stats [--characters 200000] [--views 200]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+# Before app.repositories picks the backend and settings are read
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+CLASSES = ["Barbarian", "Bard", "Cleric", "Druid", "Fighter", "Monk", "Paladin", "Ranger", "Rogue",
+           "Sorcerer", "Warlock", "Wizard"]
+RACES = ["Dwarf", "Elf", "Gnome", "Half-Elf", "Half-Orc", "Halfling", "Human", "Tiefling"]
+
+
+def report(name: str, latencies: list[float]) -> None:
+    latencies.sort()
+    n = len(latencies)
+    print(f"{name:28} p50 {latencies[n // 2] * 1e3:8.3f} ms  p99 {latencies[int(n * 0.99)] * 1e3:8.3f} ms")
+
+
+async def run(args) -> None:
+    from app import create_app
+    from app.repositories import characters
+    from app.schemas.characters import CharacterSection, State
+    from app.services import character_service
+    from app.services.character_service import character_stats
+    from benchmarks.fixtures import sample_state
+
+    rng = random.Random(11)
+    users = [str(uuid.uuid4()) for _ in range(max(1, args.characters // 4))]
+    now = datetime.now(timezone.utc).isoformat()
+    for n in range(args.characters):
+        characters.load(
+            {
+                "id": str(uuid.uuid4()),
+                "userId": users[n % len(users)],
+                "characterName": f"Character {n}",
+                "characterClass": rng.choice(CLASSES),
+                "race": rng.choice(RACES),
+                "level": rng.randint(1, 20),
+                **{column: {} for column in ("characterDetails", "stats", "status", "bonuses",
+                                             "savingThrows", "skills")},
+                "createdAt": now,
+                "updatedAt": now,
+            }
+        )
+    print(f"{args.characters} characters loaded")
+
+    app = create_app()
+    async with app.router.lifespan_context(app):  # Starts character_stats with a first reconcile
+        latencies = []
+        for _ in range(max(1, args.views // 20)):
+            started = time.perf_counter()
+            await characters.aggregate()
+            latencies.append(time.perf_counter() - started)
+        report("aggregate per view", latencies)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            latencies = []
+            for _ in range(args.views):
+                started = time.perf_counter()
+                response = await client.get("/stats/characters")
+                latencies.append(time.perf_counter() - started)
+            report("GET /stats/characters", latencies)
+            print(f"{'':28} {len(response.content)} byte body")
+            etag = response.headers["ETag"]
+            latencies = []
+            for _ in range(args.views):
+                started = time.perf_counter()
+                response = await client.get("/stats/characters", headers={"If-None-Match": etag})
+                latencies.append(time.perf_counter() - started)
+            assert response.status_code == 304
+            report("  with If-None-Match (304)", latencies)
+            latencies = []
+            for user_id in rng.sample(users, min(args.views, len(users))):
+                started = time.perf_counter()
+                response = await client.get(f"/stats/characters/users/{user_id}")
+                latencies.append(time.perf_counter() - started)
+                assert response.json()["characters"] == 4 or args.characters < 4
+            report("GET .../users/{id}", latencies)
+
+        # Writes through the service, the kept counts follow them without a query
+        owner = users[0]
+        created = []
+        for seed in range(args.writes):
+            character = await character_service.create_character(owner, State(**sample_state(seed)))
+            created.append(character["id"])
+        for character_id in created[: args.writes // 2]:
+            await character_service.patch_section(
+                character_id,
+                owner,
+                CharacterSection.characterDetails,
+                [{"op": "replace", "path": "/level", "value": rng.randint(1, 20)}],
+            )
+        details = (await character_service.get_character(created[-1], owner))["characterDetails"]
+        details["characterClass"]["className"] = "Wizard"
+        await character_service.update_section(
+            created[-1], owner, CharacterSection.characterDetails, details
+        )
+        for character_id in created[: args.writes // 4]:
+            await character_service.delete_character(character_id, owner)
+        applied = character_stats.applied
+        await character_stats.reconcile()
+        print(f"service writes: {applied} counted, drift after reconcile {character_stats.last_drift}")
+        assert character_stats.last_drift == 0
+
+        # A level-up written straight to storage is only picked up by the reconcile
+        leveled = created[args.writes // 4 : args.writes // 2]
+        changes = []
+        for character_id in leveled:
+            _, details = await characters.get_column(character_id, "characterDetails")
+            changes.append((character_id, {"characterDetails": {**details, "level": 21}, "level": 21}))
+        await characters.update_many(changes)
+        await character_stats.reconcile()
+        print(f"bypassing level-up of {len(leveled)}: drift {character_stats.last_drift} corrected, "
+              f"{character_stats.counts['level'][21]} characters now at level 21")
+        assert character_stats.counts["level"][21] == len(leveled)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--characters", type=int, default=200_000)
+    parser.add_argument("--views", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--writes", type=int, default=200, help="Characters created through the service")
+    asyncio.run(run(parser.parse_args()))
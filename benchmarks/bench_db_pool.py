@@ -0,0 +1,103 @@
+"""
+Benchmark: throughput against a local Postgres as uvicorn workers and pool size grow.
+
+For every (workers, pool size) combination a server is started with WEB_CONCURRENCY and DB_POOL_SIZE
+set, waited on until /health/ready passes, then driven by concurrent clients for a fixed time on a
+database-bound endpoint. Needs DATABASE_URL pointing at a migrated database, e.g. the compose one.
+
+Usage:
+    python -m benchmarks.bench_db_pool [--workers 1 2 4] [--pool 2 5 10 20] [--concurrency 64] [--seconds 10]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("Server did not become ready")
+
+
+async def drive(client: httpx.AsyncClient, path: str, concurrency: int, seconds: float) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.monotonic() + seconds
+
+    async def user() -> None:
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+                ok = response.status_code == 200
+            except httpx.TransportError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    latencies.sort()
+    return {
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies) * 1e3 if latencies else None,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1e3 if latencies else None,
+        "errors": errors,
+    }
+
+
+async def run_one(args, workers: int, pool: int) -> dict:
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "DB_POOL_SIZE": str(pool)}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=30
+        ) as client:
+            await wait_ready(client)
+            await drive(client, args.path, args.concurrency, 1)  # Warm up
+            return await drive(client, args.path, args.concurrency, args.seconds)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def main(args) -> None:
+    print(f"{'workers':>7} {'pool':>5} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for workers in args.workers:
+        for pool in args.pool:
+            result = await run_one(args, workers, pool)
+            print(
+                f"{workers:>7} {pool:>5} {result['requests_per_second']:>9.0f} "
+                f"{result['p50_ms'] or 0:>8.1f} {result['p99_ms'] or 0:>8.1f} {result['errors']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--pool", type=int, nargs="+", default=[2, 5, 10, 20])
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent clients")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--path", default="/users?limit=20", help="Database bound endpoint to drive")
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(main(parser.parse_args()))
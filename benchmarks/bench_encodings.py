@@ -0,0 +1,69 @@
+"""
+Benchmark: payload size and CPU cost per encoding for a full State.
+
+Covers the representations the API can negotiate: JSON, JSON + gzip, JSON + brotli, MessagePack
+and MessagePack + gzip, using the levels configured in Settings.
+
+Usage:
+    python -m benchmarks.bench_encodings [--iterations 1000]
+"""
+
+import argparse
+import gzip
+import time
+
+import brotli
+import msgpack
+import orjson
+
+from app.config import settings
+from app.utils.serialization import dumps, packb
+from benchmarks.fixtures import sample_state
+
+
+def timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(args) -> None:
+    sheet = sample_state(1)
+    json_body = dumps(sheet)
+    msgpack_body = packb(sheet)
+    gzip_level = settings.COMPRESSION_GZIP_LEVEL
+    brotli_quality = settings.COMPRESSION_BROTLI_QUALITY
+
+    encodings = {
+        "json": (lambda: dumps(sheet), lambda body: orjson.loads(body)),
+        "json+gzip": (
+            lambda: gzip.compress(dumps(sheet), compresslevel=gzip_level),
+            lambda body: orjson.loads(gzip.decompress(body)),
+        ),
+        "json+br": (
+            lambda: brotli.compress(dumps(sheet), quality=brotli_quality),
+            lambda body: orjson.loads(brotli.decompress(body)),
+        ),
+        "msgpack": (lambda: packb(sheet), lambda body: msgpack.unpackb(body, strict_map_key=False)),
+        "msgpack+gzip": (
+            lambda: gzip.compress(packb(sheet), compresslevel=gzip_level),
+            lambda body: msgpack.unpackb(gzip.decompress(body), strict_map_key=False),
+        ),
+    }
+    print(f"raw json {len(json_body)} bytes, raw msgpack {len(msgpack_body)} bytes")
+    print(f"{'encoding':>13} {'bytes':>7} {'% of json':>10} {'encode us':>10} {'decode us':>10}")
+    for name, (encode, decode) in encodings.items():
+        body = encode()
+        encode_us = timed(encode, args.iterations)
+        decode_us = timed(lambda: decode(body), args.iterations)
+        print(
+            f"{name:>13} {len(body):>7} {len(body) / len(json_body) * 100:>9.1f}% "
+            f"{encode_us:>10.1f} {decode_us:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    main(parser.parse_args())
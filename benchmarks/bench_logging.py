@@ -0,0 +1,122 @@
+"""
+Benchmark: request latency with logging off, synchronous logging and the queued pipeline.
+
+A small ASGI app logs a handful of records per request, roughly what per-query DEBUG logging used to
+produce, and is driven by concurrent clients over httpx's in-process transport. Synchronous logging
+formats and writes each record on the event loop, the queued pipeline only hands records to a
+background thread, and drops them when the writer cannot keep up.
+
+Usage:
+    python -m benchmarks.bench_logging [--requests 5000] [--concurrency 50] [--records 10] [--write-latency-us 50]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.middleware.request_id import RequestIdMiddleware
+from app.utils.log import JsonFormatter, log_pipeline
+
+logger = logging.getLogger("bench.requests")
+
+
+def build_app(records: int) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.get("/item/{item_id}")
+    async def item(item_id: int):
+        for n in range(records):
+            logger.info("query %d for item %s", n, item_id, extra={"model": "Character"})
+        await asyncio.sleep(0)
+        return {"id": item_id}
+
+    return app
+
+
+class SlowStream:
+    """File wrapper whose writes block for a while, like stdout into a busy container log driver"""
+
+    def __init__(self, stream, write_latency: float):
+        self.stream = stream
+        self.write_latency = write_latency
+
+    def write(self, text: str) -> int:
+        if self.write_latency:
+            time.sleep(self.write_latency)
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def configure(mode: str, stream, queue_size: int) -> None:
+    root = logging.getLogger()
+    log_pipeline.stop()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    if mode == "off":
+        root.setLevel(logging.WARNING)
+    elif mode == "sync":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JsonFormatter())
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    else:
+        log_pipeline.configure(level="INFO", stream=stream, queue_size=queue_size)
+
+
+async def drive(app: FastAPI, total: int, concurrency: int) -> list[float]:
+    latencies: list[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(total))
+
+        async def user() -> None:
+            for n in remaining:
+                started = time.perf_counter()
+                await client.get(f"/item/{n}")
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return sorted(latencies)
+
+
+def main(args) -> None:
+    app = build_app(args.records)
+    path = args.output or os.path.join(tempfile.mkdtemp(), "bench.log")
+    print(f"{args.records} records per request, {args.write_latency_us}us per write")
+    print(f"{'mode':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'dropped':>8}")
+    for mode in ("off", "sync", "queued"):
+        with open(path, "a", buffering=1) as stream:  # Line buffered like a container's stdout
+            configure(mode, SlowStream(stream, args.write_latency_us / 1e6), args.queue_size)
+            started = time.perf_counter()
+            latencies = asyncio.run(drive(app, args.requests, args.concurrency))
+            elapsed = time.perf_counter() - started
+            dropped = log_pipeline.stats().get("dropped", 0) if mode == "queued" else 0
+            log_pipeline.stop()
+        print(
+            f"{mode:>6} {len(latencies) / elapsed:>8.0f} "
+            f"{statistics.median(latencies) * 1e3:>8.2f} "
+            f"{latencies[int(len(latencies) * 0.99) - 1] * 1e3:>8.2f} {dropped:>8}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--records", type=int, default=10, help="Log records per request")
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument(
+        "--write-latency-us", type=float, default=50, help="Blocking time per write, 0 for a plain file"
+    )
+    parser.add_argument("--output", help="Log file, a temporary file by default")
+    main(parser.parse_args())
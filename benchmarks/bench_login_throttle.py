@@ -0,0 +1,139 @@
+"""
+Benchmark: legitimate sign-in latency while an abusive client hammers /auth/signin.
+
+Drives the in-process app (embedded storage, real bcrypt) with two kinds of clients:
+
+- legitimate users, each from its own IP, signing in with the right password every --pace seconds;
+- an attacker sending --attack-rate wrong passwords per second for one victim account, over
+  --attack-concurrency connections, half from a single IP and half sprayed over --spray-ips addresses.
+  Several times what bcrypt can verify, but not a busy loop: the attacker's client shares the one
+  process with the app here and would otherwise eat the CPU the benchmark is trying to protect.
+
+Three phases: no attack, attack with throttling on, attack with throttling off. With throttling the
+attacker is answered with 429s before any bcrypt work and legitimate latency should stay at the
+no-attack level. Without it the attack queues on the password pool and legitimate users wait behind it.
+
+Usage:
+    python -m benchmarks.bench_login_throttle [--seconds 5] [--users 10] [--attack-rate 200]
+        [--hash-rounds 10]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+import httpx
+
+PASSWORD = "correct-password"
+
+
+def client_for(app, ip: str) -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=app, client=(ip, 40000))
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60)
+
+
+async def legitimate(
+    app, email: str, ip: str, pace: float, until: float, latencies: list, statuses: dict
+):
+    await asyncio.sleep(random.uniform(0, pace))  # Users do not all arrive at once
+    async with client_for(app, ip) as client:
+        while time.perf_counter() < until:
+            started = time.perf_counter()
+            body = {"email": email, "password": PASSWORD}
+            response = await client.post("/auth/signin", json=body)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            await asyncio.sleep(pace)
+
+
+async def attacker(
+    clients: list, victim: str, interval: float, until: float, statuses: dict, n: int
+):
+    body = {"email": victim, "password": "guess"}
+    while time.perf_counter() < until:
+        started = time.perf_counter()
+        client = clients[0] if n % 2 else clients[1 + n % (len(clients) - 1)]  # One IP or sprayed
+        n += 2
+        response = await client.post("/auth/signin", json=body)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        # Next request on schedule, Retry-After is ignored
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def phase(name: str, app, args, attack: bool, throttled: bool, phase_number: int) -> None:
+    from app.repositories import users
+    from app.auth import hash_password
+    from app.services.login_throttle import login_throttle
+
+    login_throttle.enabled = throttled
+    hashed = hash_password(PASSWORD)
+    emails = []
+    for n in range(args.users):  # Fresh accounts and IPs, no limits carried over between phases
+        email = f"user{phase_number}_{n}@example.com"
+        await users.create({"username": f"user{n}", "email": email, "password": hashed})
+        emails.append(email)
+    victim = f"victim{phase_number}@example.com"
+    await users.create({"username": "victim", "email": victim, "password": hashed})
+
+    until = time.perf_counter() + args.seconds
+    latencies: list[float] = []
+    legit_statuses: dict[int, int] = {}
+    attack_statuses: dict[int, int] = {}
+    tasks = [
+        legitimate(
+            app, email, f"10.{phase_number}.0.{n}", args.pace, until, latencies, legit_statuses
+        )
+        for n, email in enumerate(emails)
+    ]
+    clients = []
+    if attack:
+        clients = [client_for(app, f"192.0.2.{n}") for n in range(args.spray_ips + 1)]
+        interval = args.attack_concurrency / args.attack_rate
+        tasks += [
+            attacker(clients, victim, interval, until, attack_statuses, n)
+            for n in range(args.attack_concurrency)
+        ]
+    await asyncio.gather(*tasks)
+    for client in clients:
+        await client.aclose()
+
+    latencies.sort()
+    print(
+        f"{name:22} legit p50 {statistics.median(latencies) * 1e3:7.1f} ms  "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1e3:7.1f} ms  "
+        f"statuses {dict(sorted(legit_statuses.items()))}"
+    )
+    if attack:
+        print(f"{'':22} attacker statuses {dict(sorted(attack_statuses.items()))}")
+
+
+async def run(args) -> None:
+    from app import create_app
+    from app.services.login_throttle import login_throttle
+
+    app = create_app()
+    async with app.router.lifespan_context(app):
+        await phase("no attack", app, args, attack=False, throttled=True, phase_number=1)
+        await phase("attack, throttled", app, args, attack=True, throttled=True, phase_number=2)
+        await phase("attack, unthrottled", app, args, attack=True, throttled=False, phase_number=3)
+        print(f"throttle stats: {login_throttle.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=5, help="Length of each phase")
+    parser.add_argument("--users", type=int, default=10, help="Legitimate users signing in")
+    parser.add_argument("--pace", type=float, default=2.0, help="Seconds between a user's sign-ins")
+    parser.add_argument("--attack-rate", type=float, default=200, help="Attempts per second")
+    parser.add_argument("--attack-concurrency", type=int, default=50)
+    parser.add_argument("--spray-ips", type=int, default=50)
+    parser.add_argument("--hash-rounds", type=int, default=10, help="bcrypt cost")
+    args = parser.parse_args()
+    # Settings are read at import
+    os.environ["STORAGE_BACKEND"] = "memory"
+    os.environ["PASSWORD_HASH_ROUNDS"] = str(args.hash_rounds)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    asyncio.run(run(args))
@@ -0,0 +1,114 @@
+"""
+Benchmark: owner lookups for a party view of 50 characters, one query per owner vs batched.
+
+A party view loads every character and then the user owning each one. "direct" looks each owner up
+with its own find_by_id, the N+1 pattern. "batched" goes through user_service.get_user_by_id inside a
+request loader scope, so the concurrent lookups are collected into one find_many. Runs against the
+embedded storage backend with --query-latency-ms added to every repository call, on at most
+--pool-size at a time, to stand in for the database round trip and connection pool. The calls are
+counted as queries. With --concurrency > 1 several views run at once, batched views then also share
+queries across requests.
+
+Usage:
+    python -m benchmarks.bench_party_view [--characters 50] [--owners 50] [--views 200]
+        [--concurrency 1] [--query-latency-ms 0.5] [--pool-size 10]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ["STORAGE_BACKEND"] = "memory"  # Before app.repositories picks the backend
+
+
+class CountingUsers:
+    """Wraps a UserRepository, counting calls and adding a round trip on one of pool_size connections"""
+
+    def __init__(self, repository, latency: float, pool_size: int):
+        self.repository = repository
+        self.latency = latency
+        self.pool = asyncio.Semaphore(pool_size)
+        self.queries = 0
+
+    async def _call(self, method: str, *args):
+        self.queries += 1
+        async with self.pool:
+            await asyncio.sleep(self.latency)
+            return await getattr(self.repository, method)(*args)
+
+    async def find_by_id(self, user_id):
+        return await self._call("find_by_id", user_id)
+
+    async def find_many(self, field, values):
+        return await self._call("find_many", field, values)
+
+
+async def run(args) -> None:
+    from app.repositories import characters, users
+    from app.schemas.characters import State
+    from app.services import character_service, user_service
+    from app.utils.dataloader import loader_scope
+    from benchmarks.fixtures import sample_state
+
+    owners = [
+        await users.create({"username": f"player{n}", "email": f"player{n}@example.com"})
+        for n in range(args.owners)
+    ]
+    party = []
+    for n in range(args.characters):
+        state = State.model_validate(sample_state(n))
+        character = await character_service.create_character(owners[n % args.owners].id, state)
+        party.append(character["id"])
+
+    counting = CountingUsers(users, args.query_latency_ms / 1000, args.pool_size)
+    user_service.users = counting  # Loaders query through the module global
+
+    async def direct_view() -> list:
+        sheets = await asyncio.gather(*(characters.find_by_id(i) for i in party))
+        return await asyncio.gather(*(counting.find_by_id(sheet.userId) for sheet in sheets))
+
+    async def batched_view() -> list:
+        with loader_scope():  # What DataLoaderMiddleware does per request
+            sheets = await asyncio.gather(*(characters.find_by_id(i) for i in party))
+            return await asyncio.gather(
+                *(user_service.get_user_by_id(sheet.userId) for sheet in sheets)
+            )
+
+    for name, view in (("direct", direct_view), ("batched", batched_view)):
+        latencies: list[float] = []
+        remaining = iter(range(args.views))
+
+        async def client() -> None:
+            for _ in remaining:
+                started = time.perf_counter()
+                found = await view()
+                latencies.append(time.perf_counter() - started)
+                assert len(found) == args.characters and all(found)
+
+        counting.queries = 0
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        print(
+            f"{name:8} {counting.queries / args.views:7.2f} queries/view  "
+            f"p50 {statistics.median(latencies) * 1e3:7.3f} ms  "
+            f"p95 {latencies[int(len(latencies) * 0.95)] * 1e3:7.3f} ms  "
+            f"{args.views / elapsed:8.1f} views/s"
+        )
+    print(f"loader stats: {user_service.user_loader_stats.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--characters", type=int, default=50, help="Characters in the party")
+    parser.add_argument("--owners", type=int, default=50, help="Distinct users owning them")
+    parser.add_argument("--views", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1, help="Views running at once")
+    parser.add_argument(
+        "--query-latency-ms", type=float, default=0.5, help="Simulated database round trip"
+    )
+    parser.add_argument("--pool-size", type=int, default=10, help="Like DB_POOL_SIZE")
+    asyncio.run(run(parser.parse_args()))
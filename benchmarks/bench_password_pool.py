@@ -0,0 +1,59 @@
+"""
+Benchmark: signin password verification throughput against password pool size.
+
+Runs a burst of concurrent verify_password_async calls (the CPU bound part of /auth/signin) through
+pools of increasing size, and samples event loop lag meanwhile to show the loop stays responsive.
+
+Usage:
+    python -m benchmarks.bench_password_pool [--requests 64] [--rounds 12] [--kind thread]
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.auth import PasswordPool, hash_password, verify_password
+
+
+async def loop_lag(stop: asyncio.Event) -> float:
+    """Largest delay seen scheduling a 10 ms sleep while the burst runs"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.perf_counter() - start - 0.01)
+    return worst
+
+
+async def run(pool: PasswordPool, hashed: str, requests: int) -> tuple[float, float]:
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(pool.run(verify_password, "correct horse", hashed) for _ in range(requests))
+    )
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await lag_task
+
+
+async def main(args) -> None:
+    hashed = hash_password("correct horse", rounds=args.rounds)
+    print(f"{'workers':>8} {'signins/s':>10} {'elapsed s':>10} {'max loop lag ms':>16}")
+    for workers in args.workers:
+        pool = PasswordPool(kind=args.kind, workers=workers, max_queue=args.requests)
+        await run(pool, hashed, workers)  # Warm up workers
+        elapsed, lag = await run(pool, hashed, args.requests)
+        pool.shutdown()
+        print(
+            f"{workers:>8} {args.requests / elapsed:>10.1f} {elapsed:>10.2f} {lag * 1000:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--kind", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,165 @@
+"""
+Benchmark: characterDetails referencing rules catalog entries by id, against embedding the class, race
+and size in every sheet.
+
+Builds --characters realistic sheets whose class, race and size come from the catalog, the way a client
+picking them from GET /rules makes them, and compares embedded against referenced:
+
+- size:         bytes of the characterDetails column and of a PUT characterDetails request body
+- read:         orjson.loads of the column, plus expanding the ids of the referenced one
+- rules:        GET /rules, and a 304 for a matching ETag
+
+Then goes through the character service on the embedded backend: a character created with ids reads
+back with the entries, a class changed by id recomputes its derived values, an unknown id is a 422, and
+a bulk recompute stores a house-ruled class in full while untouched entries stay ids.
+
+Usage:
+    python -m benchmarks.bench_rules_catalog [--characters 10000] [--views 200]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+
+import httpx
+import orjson
+
+# Settings are read at import
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["AUTOSAVE_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def report(name: str, latencies: list[float]) -> None:
+    latencies.sort()
+    n = len(latencies)
+    print(f"{name:22} p50 {latencies[n // 2] * 1e3:7.3f} ms  p99 {latencies[int(n * 0.99)] * 1e3:7.3f} ms")
+
+
+def timed(fn, values: list) -> float:
+    """Microseconds per value"""
+    started = time.perf_counter()
+    for value in values:
+        fn(value)
+    return (time.perf_counter() - started) / len(values) * 1e6
+
+
+async def run(args) -> None:
+    from fastapi import HTTPException
+    from app import create_app
+    from app.repositories import characters, storage
+    from app.rules.catalog import rules_catalog
+    from app.schemas.characters import CharacterSection, State
+    from app.services import bulk_recompute, character_service
+    from app.services.character_service import _state_sections, _to_columns
+    from app.utils.serialization import dumps
+    from benchmarks.fixtures import sample_state
+
+    catalog = orjson.loads(rules_catalog.body)
+    rng = random.Random(3)
+
+    def catalog_state(seed: int) -> dict:
+        """A sample sheet with a catalog class, race and size, its derived values recomputed"""
+        state = sample_state(seed)
+        details = state["characterDetails"]
+        details["characterClass"] = rng.choice(sorted(catalog["classes"]))
+        details["race"] = rng.choice(sorted(catalog["races"]))
+        details["size"] = rng.choice(["medium"] * 8 + ["small"] * 2)
+        return state
+
+    states = [catalog_state(seed) for seed in range(args.characters)]
+    sheets = [_state_sections(State(**state)) for state in states]
+    embedded = [dumps(sheet["characterDetails"]) for sheet in sheets]
+    referenced = [dumps(_to_columns(sheet)["characterDetails"]) for sheet in sheets]
+    before, after = sum(map(len, embedded)), sum(map(len, referenced))
+    n = args.characters
+    print(f"{n} sheets, {len(catalog['classes'])} classes, {len(catalog['races'])} races in the catalog")
+    print(
+        f"{'characterDetails':22} {before / n:6.0f} B -> {after / n:5.0f} B "
+        f"({1 - after / before:.0%} smaller), "
+        f"{(before - after) / n:.0f} MB less per million characters"
+    )
+    bodies = [dumps(state["characterDetails"]) for state in states]  # What a client sends with ids
+    print(f"{'PUT body':22} {before / n:6.0f} B -> {sum(map(len, bodies)) / n:5.0f} B")
+
+    loads = timed(orjson.loads, embedded)
+    expand = timed(lambda body: rules_catalog.expand(orjson.loads(body)), referenced)
+    print(f"{'read':22} loads {loads:5.1f} us  loads + expand {expand:5.1f} us")
+    assert all(
+        rules_catalog.expand(orjson.loads(body)) == orjson.loads(full)
+        for body, full in zip(referenced, embedded)
+    )
+
+    app = create_app()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            latencies = []
+            for _ in range(args.views):
+                started = time.perf_counter()
+                response = await client.get("/rules")
+                latencies.append(time.perf_counter() - started)
+            report("GET /rules", latencies)
+            print(f"{'':22} {len(response.content)} byte body, {response.headers['Cache-Control']}")
+            etag = response.headers["ETag"]
+            latencies = []
+            for _ in range(args.views):
+                started = time.perf_counter()
+                response = await client.get("/rules", headers={"If-None-Match": etag})
+                latencies.append(time.perf_counter() - started)
+            assert response.status_code == 304
+            report("  with If-None-Match", latencies)
+
+        # Through the service
+        owner = str(uuid.uuid4())
+        state = sample_state(7)
+        state["characterDetails"].update(characterClass="fighter", race="dwarf", size="medium")
+        character = await character_service.create_character(owner, State(**state))
+        character_id = character["id"]
+        _, stored = await characters.get_column(character_id, "characterDetails")
+        assert (stored["characterClass"], stored["race"], stored["size"]) == ("fighter", "dwarf", "medium")
+        assert character["characterDetails"]["characterClass"] == catalog["classes"]["fighter"]
+        assert character["bonus"]["baseAttackBonus"] == 1
+
+        written = await character_service.patch_section(
+            character_id,
+            owner,
+            CharacterSection.characterDetails,
+            [{"op": "replace", "path": "/characterClass", "value": "wizard"}],
+        )
+        assert written["characterDetails"]["characterClass"]["className"] == "Wizard"
+        assert written["bonus"]["baseAttackBonus"] == 0
+        try:
+            await character_service.patch_section(
+                character_id,
+                owner,
+                CharacterSection.characterDetails,
+                [{"op": "replace", "path": "/race", "value": "dragon"}],
+            )
+            raise AssertionError("An unknown race id was accepted")
+        except HTTPException as e:
+            assert e.status_code == 422
+
+        fighter = await character_service.create_character(owner, State(**state))
+        result = await bulk_recompute.recompute_characters(
+            classes={"Fighter": {"baseAttack": 2}}, level_delta=1, user_id=owner
+        )
+        _, house_ruled = await characters.get_column(fighter["id"], "characterDetails")
+        _, untouched = await characters.get_column(character_id, "characterDetails")
+        assert house_ruled["characterClass"]["baseAttack"] == 2 and house_ruled["race"] == "dwarf"
+        assert untouched["characterClass"] == "wizard"
+        assert untouched["level"] == state["characterDetails"]["level"] + 1
+        print(
+            f"{'service':22} ids expand on read, a class changed by id recomputes, an unknown id is a 422, "
+            f"a bulk recompute of {result['scanned']} rows keeps unchanged entries as ids"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--characters", type=int, default=10_000)
+    parser.add_argument("--views", type=int, default=200, help="Requests per endpoint")
+    asyncio.run(run(parser.parse_args()))
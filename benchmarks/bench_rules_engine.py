@@ -0,0 +1,58 @@
+"""
+Benchmark: full versus incremental recomputation of derived stats per sheet.
+
+Usage:
+    python -m benchmarks.bench_rules_engine [--sheets 1000]
+"""
+
+import argparse
+import copy
+import time
+
+from app.rules.engine import RulesEngine
+from benchmarks.fixtures import sample_state
+
+EDITS = {  # Typical single field edits -> changed path
+    "dexterity score": (("stats", "scores", "dexterity"), 1),
+    "strength score": (("stats", "scores", "strength"), 2),
+    "skill ranks": (("skills", "skills", "Hide", "ranks"), 1),
+    "save magic mod": (("savingThrows", "will", "magicMod"), 1),
+}
+
+
+def main(args) -> None:
+    engine = RulesEngine()
+    sheets = [sample_state(seed) for seed in range(args.sheets)]
+    for sheet in sheets:
+        engine.recompute_all(sheet)  # Warm graph cache, normalise
+
+    print(f"{'edit':>16} {'full us':>9} {'incremental us':>15} {'speedup':>8}")
+    for name, (path, delta) in EDITS.items():
+        edited = copy.deepcopy(sheets)
+        for sheet in edited:
+            parent = sheet
+            for key in path[:-1]:
+                parent = parent[key]
+            parent[path[-1]] += delta
+
+        full_sheets = copy.deepcopy(edited)
+        start = time.perf_counter()
+        for sheet in full_sheets:
+            engine.recompute_all(sheet)
+        full = (time.perf_counter() - start) / args.sheets
+
+        start = time.perf_counter()
+        for sheet in edited:
+            engine.recompute(sheet, [path])
+        incremental = (time.perf_counter() - start) / args.sheets
+
+        assert edited == full_sheets, "incremental result differs from full recompute"
+        print(
+            f"{name:>16} {full * 1e6:>9.1f} {incremental * 1e6:>15.1f} {full / incremental:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sheets", type=int, default=1000)
+    main(parser.parse_args())
@@ -0,0 +1,49 @@
+"""
+Benchmark: encode/decode cost of a full State payload, generic path versus the fast path.
+
+Before: json.loads + State.model_validate on the request, jsonable_encoder + json.dumps on the response
+(what FastAPI does for a declared body and a returned dict).
+After: State.model_validate_json straight from bytes, orjson on the response.
+
+Usage:
+    python -m benchmarks.bench_serialization [--iterations 2000]
+"""
+
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from app.schemas.characters import State
+from app.utils.serialization import dumps
+from benchmarks.fixtures import sample_state
+
+
+def timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(args) -> None:
+    sheet = sample_state(1)
+    body = json.dumps(sheet).encode("utf-8")
+    response = {"id": "8c3e7f0e-2a41-4c55-9a4e-0f1e3c1b2a77", "updatedAt": "2025-03-24T10:15:00Z", **sheet}
+
+    rows = [
+        ("decode+validate", lambda: State.model_validate(json.loads(body)), lambda: State.model_validate_json(body)),
+        ("encode response", lambda: json.dumps(jsonable_encoder(response)).encode("utf-8"), lambda: dumps(response)),
+    ]
+    print(f"payload: {len(body)} bytes")
+    print(f"{'step':>16} {'before us':>10} {'after us':>9} {'speedup':>8}")
+    for name, before, after in rows:
+        b, a = timed(before, args.iterations), timed(after, args.iterations)
+        print(f"{name:>16} {b:>10.1f} {a:>9.1f} {b / a:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    main(parser.parse_args())
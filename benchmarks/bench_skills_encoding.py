@@ -0,0 +1,170 @@
+"""
+Benchmark: the compact skills column, parallel arrays keyed by catalog index, against storing the
+skills section in its API shape.
+
+Builds --characters realistic sheets (derived values recomputed the way the service stores them) and
+compares, verbose against compact:
+
+- size:         bytes of the skills column and of the whole row's JSON columns, and zlib-compressed,
+                roughly what Postgres keeps for a TOASTed jsonb value
+- decode:       orjson.loads of the column, plus expanding the compact one back to the API shape
+- recompute:    bulk recompute of every sheet parsed from its stored row, which reads and writes the
+                compact skills arrays in place instead of expanding them
+- round trip:   every sheet decodes back to exactly what was encoded
+
+Then goes through the character service on the embedded backend: create, GET, a skills patch, a
+section read, history and a bulk recompute all see the API shape, and a row stored before the compact
+format is read as it is and converted by its next skills write.
+
+Usage:
+    python -m benchmarks.bench_skills_encoding [--characters 10000]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+import orjson
+
+# Settings are read at import
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["AUTOSAVE_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def timed(fn, values: list) -> float:
+    """Microseconds per value"""
+    started = time.perf_counter()
+    for value in values:
+        fn(value)
+    return (time.perf_counter() - started) / len(values) * 1e6
+
+
+def report(name: str, verbose: list[bytes], compact: list[bytes]) -> None:
+    before, after = sum(map(len, verbose)), sum(map(len, compact))
+    zipped_before = sum(len(zlib.compress(body)) for body in verbose)
+    zipped_after = sum(len(zlib.compress(body)) for body in compact)
+    n = len(verbose)
+    print(
+        f"{name:22} {before / n:7.0f} B -> {after / n:6.0f} B ({1 - after / before:4.0%} smaller)   "
+        f"compressed {zipped_before / n:6.0f} B -> {zipped_after / n:5.0f} B "
+        f"({1 - zipped_after / zipped_before:4.0%} smaller)"
+    )
+
+
+async def run(args) -> None:
+    from app.repositories import characters, storage
+    from app.rules.skills import decode_skills, encode_skills
+    from app.schemas.characters import CharacterSection, State
+    from app.services import bulk_recompute, character_service
+    from app.services.bulk_recompute import recompute_chunk
+    from app.services.character_service import _state_sections, _to_columns, character_history
+    from app.utils.serialization import dumps
+    from benchmarks.fixtures import sample_state
+
+    sheets = [_state_sections(State(**sample_state(seed))) for seed in range(args.characters)]
+    skills = [sheet["skills"] for sheet in sheets]
+    verbose = [dumps(section) for section in skills]
+    compact = [dumps(encode_skills(section)) for section in skills]
+    learned = sum(skill["ranks"] > 0 for section in skills for skill in section["skills"].values())
+    print(
+        f"{args.characters} sheets, {len(skills[0]['skills'])} skills each, "
+        f"{learned / args.characters:.1f} with ranks on average"
+    )
+    report("skills column", verbose, compact)
+    # Only the skills column differs, characterDetails keeps its entries rather than catalog ids
+    details = [{"characterDetails": sheet["characterDetails"]} for sheet in sheets]
+    rows_verbose = [
+        dumps({**_to_columns(sheet), **extra, "skills": sheet["skills"]})
+        for sheet, extra in zip(sheets, details)
+    ]
+    rows_compact = [dumps({**_to_columns(sheet), **extra}) for sheet, extra in zip(sheets, details)]
+    report("whole row", rows_verbose, rows_compact)
+
+    loads = timed(orjson.loads, verbose)
+    loads_compact = timed(orjson.loads, compact)
+    expand = timed(lambda body: decode_skills(orjson.loads(body)), compact)
+    print(
+        f"{'decode':22} loads {loads:5.1f} us  compact loads {loads_compact:5.1f} us  "
+        f"compact loads + expand {expand:5.1f} us"
+    )
+    assert all(decode_skills(orjson.loads(body)) == section for body, section in zip(compact, skills))
+    print(f"{'round trip':22} {args.characters} sheets decode to exactly what was encoded")
+
+    timings = {}
+    for name, rows in (("verbose", rows_verbose), ("compact", rows_compact)):
+        started = time.perf_counter()
+        parsed = [orjson.loads(body) for body in rows]
+        chunk = [{"bonus": row.pop("bonuses"), **row} for row in parsed]
+        recompute_chunk(chunk, {"Rogue": {"baseAttack": 9}}, level_delta=1)
+        timings[name] = (time.perf_counter() - started) / len(rows) * 1e6
+        if name == "verbose":
+            expected = [sheet["skills"] for sheet in chunk]
+        else:
+            assert [decode_skills(sheet["skills"]) for sheet in chunk] == expected
+    print(
+        f"{'recompute from rows':22} verbose {timings['verbose']:5.1f} us  "
+        f"compact {timings['compact']:5.1f} us per sheet, same skillMods"
+    )
+
+    # Through the service
+    await storage.connect()
+    owner = str(uuid.uuid4())
+    character = await character_service.create_character(owner, State(**sample_state(1)))
+    character_id = character["id"]
+    await character_history.flush(character_id)
+    _, stored = await characters.get_column(character_id, "skills")
+    assert stored["catalog"] == 1 and character["skills"] == decode_skills(stored)
+    assert (await character_service.get_character(character_id, owner))["skills"] == character["skills"]
+    await character_service.patch_section(
+        character_id,
+        owner,
+        CharacterSection.skills,
+        [{"op": "replace", "path": "/skills/Hide/ranks", "value": 7}],
+    )
+    section = await character_service.get_section(character_id, owner, CharacterSection.skills)
+    assert section["skills"]["Hide"]["ranks"] == 7
+    await character_history.flush(character_id)
+    _, version = await character_history.sheet_at(character_id, 2)
+    assert version["skills"] == section
+
+    # A row written before the compact format, read as it is until its next skills write
+    legacy = sample_state(2)
+    now = datetime.now(timezone.utc).isoformat()
+    legacy_id = str(uuid.uuid4())
+    characters.load(
+        {
+            "id": legacy_id,
+            "userId": owner,
+            **{column: value for column, value in _to_columns(_state_sections(State(**legacy))).items()},
+            "skills": _state_sections(State(**legacy))["skills"],
+            "createdAt": now,
+            "updatedAt": now,
+        }
+    )
+    before = await character_service.get_section(legacy_id, owner, CharacterSection.skills)
+    result = await bulk_recompute.recompute_characters(classes={"Rogue": {"baseAttack": 9}}, level_delta=1)
+    assert await character_service.get_section(legacy_id, owner, CharacterSection.skills) == before
+    await character_service.patch_section(
+        legacy_id,
+        owner,
+        CharacterSection.skills,
+        [{"op": "replace", "path": "/skillPoints/current", "value": 0}],
+    )
+    _, stored = await characters.get_column(legacy_id, "skills")
+    after = await character_service.get_section(legacy_id, owner, CharacterSection.skills)
+    assert "catalog" in stored and after["skills"] == before["skills"]
+    print(
+        f"{'service':22} create, GET, patch, history and a bulk recompute of {result['scanned']} rows "
+        f"read the API shape, the legacy row is converted by its next skills write"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--characters", type=int, default=10_000)
+    asyncio.run(run(parser.parse_args()))
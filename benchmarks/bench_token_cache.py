@@ -0,0 +1,54 @@
+"""
+Benchmark: verify_access_token with and without the verified token cache.
+
+Replays a stream of requests where a set of active users keep re-sending their access tokens, and
+reports the per-call cost and the share of one CPU core it would take to sustain the target request rate.
+
+Usage:
+    python -m benchmarks.bench_token_cache [--requests 10000] [--users 500] [--rate 10000]
+"""
+
+import argparse
+import random
+import time
+
+from app.utils.auth import (
+    create_access_token,
+    token_cache,
+    verify_access_token,
+)
+
+
+def replay(tokens: list[str]) -> float:
+    start = time.perf_counter()
+    for token in tokens:
+        verify_access_token(token)
+    return time.perf_counter() - start
+
+
+def main(args) -> None:
+    users = [create_access_token(data={"sub": str(i)}) for i in range(args.users)]
+    stream = [random.choice(users) for _ in range(args.requests)]
+
+    max_entries = token_cache.max_entries
+    token_cache.max_entries = 0  # Disable
+    uncached = replay(stream)
+
+    token_cache.max_entries = max_entries
+    token_cache.clear()
+    token_cache.hits = token_cache.misses = 0
+    cached = replay(stream)
+
+    print(f"{'mode':>9} {'us/call':>9} {'core % at ' + str(args.rate) + ' req/s':>22}")
+    for mode, elapsed in (("uncached", uncached), ("cached", cached)):
+        per_call = elapsed / args.requests
+        print(f"{mode:>9} {per_call * 1e6:>9.1f} {per_call * args.rate * 100:>22.1f}")
+    print("cache stats:", token_cache.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rate", type=int, default=10000)
+    main(parser.parse_args())
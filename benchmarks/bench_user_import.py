@@ -0,0 +1,127 @@
+"""
+Benchmark: bulk user import against creating the same users one create_user() call at a time.
+
+Generates --users signups as NDJSON and CSV, with --bad-rows invalid rows and as many duplicates (in the
+file and already stored) mixed in, and imports them into the embedded storage backend:
+
+- create_user: one existence check, one bcrypt hash on the sign-in pool and one insert per user,
+  what looping over the signup endpoint does.
+- import ndjson / csv: import_users(), one conflict query and one insert per batch with the hashes
+  spread over --workers processes.
+- POST /users/import: the NDJSON import streamed through the endpoint.
+
+Usage:
+    python -m benchmarks.bench_user_import [--users 500] [--bad-rows 20] [--workers 4] [--hash-rounds 10]
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+
+import httpx
+
+FIELDS = ("email", "username", "password", "oauth_provider", "oauth_id")
+
+
+def signups(prefix: str, n: int, bad_rows: int) -> list[dict]:
+    rows = [
+        {
+            "email": f"{prefix}{i}@example.com",
+            "username": f"{prefix}_{i}",
+            "password": f"password-{i}",
+            "oauth_provider": "manual",
+            "oauth_id": None,
+        }
+        for i in range(n)
+    ]
+    for i in range(bad_rows):  # Spread over the file: invalid, repeated, already stored
+        rows.insert(i * len(rows) // bad_rows, {**rows[i], "email": "not-an-email"})
+        rows.insert(i * len(rows) // bad_rows, dict(rows[-1 - i]))
+    return rows
+
+
+def as_ndjson(rows: list[dict]) -> bytes:
+    return b"".join(json.dumps(row).encode() + b"\n" for row in rows)
+
+
+def as_csv(rows: list[dict]) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode()
+
+
+async def chunked(data: bytes, size: int = 16 * 1024):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+def report(name: str, created: int, seconds: float, extra: str = "") -> None:
+    print(f"{name:18} {created:6d} created in {seconds:6.2f} s  {created / seconds:8.1f} users/s  {extra}")
+
+
+async def run(args) -> None:
+    from app import create_app
+    from app.repositories import users
+    from app.schemas.users import UserSignUp
+    from app.services.user_import import import_users, parse_rows
+    from app.services.user_service import create_user
+
+    app = create_app()
+    async with app.router.lifespan_context(app):
+        rows = signups("single", args.users, 0)
+        started = time.perf_counter()
+        for row in rows:
+            await create_user(UserSignUp(**row))
+        report("create_user", len(rows), time.perf_counter() - started)
+
+        for fmt, encode in (("ndjson", as_ndjson), ("csv", as_csv)):
+            rows = signups(fmt, args.users, args.bad_rows)
+            stored = f"{fmt}{args.users // 2}@example.com"  # Already there before the import
+            await users.create({"email": stored, "username": "stored", "password": None})
+            result = await import_users(parse_rows(fmt, chunked(encode(rows))))
+            report(
+                f"import {fmt}",
+                result["created"],
+                result["seconds"],
+                f"duplicates {result['duplicates']}  invalid {result['invalid']}",
+            )
+
+        rows = signups("http", args.users, args.bad_rows)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            started = time.perf_counter()
+            response = await client.post(
+                "/users/import",
+                content=chunked(as_ndjson(rows)),
+                headers={"X-Import-Token": os.environ["USER_IMPORT_TOKEN"]},
+            )
+            result = response.json()
+            report(
+                "POST /users/import",
+                result["created"],
+                time.perf_counter() - started,
+                f"duplicates {result['duplicates']}  invalid {result['invalid']}",
+            )
+            print(f"{'':18} first error: {result['errors'][0]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--bad-rows", type=int, default=20, help="Invalid rows, as many duplicates")
+    parser.add_argument("--workers", type=int, default=4, help="Import hashing processes")
+    parser.add_argument("--hash-rounds", type=int, default=10, help="bcrypt cost")
+    args = parser.parse_args()
+    # Settings are read at import
+    os.environ["STORAGE_BACKEND"] = "memory"
+    os.environ["PASSWORD_HASH_ROUNDS"] = str(args.hash_rounds)
+    os.environ["USER_IMPORT_WORKERS"] = str(args.workers)
+    os.environ.setdefault("USER_IMPORT_TOKEN", "bench")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    asyncio.run(run(args))
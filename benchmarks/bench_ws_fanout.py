@@ -0,0 +1,86 @@
+"""
+Benchmark: fan-out of live character updates to hundreds of subscribers per character.
+
+Drives the EventHub behind /characters/ws with the in-process broker. Each subscriber is a task
+draining its queue the way a WebSocket connection's sender does, decoding every event as a client
+would. A share of subscribers are deliberately slow and should be dropped instead of holding back
+the others. Reports delivery throughput, publish-to-receive latency and dropped connections.
+
+Usage:
+    python -m benchmarks.bench_ws_fanout [--characters 6] [--subscribers 300] [--events 200] [--slow 0.02]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import orjson
+
+from app.services.events import EventHub, LocalBroker
+
+
+async def consume(subscriber, latencies: list[float], delay: float) -> None:
+    while not subscriber.dropped.is_set():  # A dropped connection is closed, its backlog discarded
+        event = orjson.loads(await subscriber.queue.get())
+        latencies.append(time.perf_counter() - event["sentAt"])
+        await asyncio.sleep(delay)  # Time spent writing to the socket, 0 just yields
+
+
+async def run(args) -> None:
+    hub = EventHub(LocalBroker(), queue_size=args.queue_size)
+    await hub.start()
+    latencies: list[float] = []
+    subscribers, consumers = [], []
+    slow = 0
+    characters = [f"character-{i}" for i in range(args.characters)]
+    for character_id in characters:
+        for _ in range(args.subscribers):
+            subscriber = hub.subscriber()
+            hub.subscribe(subscriber, character_id)
+            is_slow = random.random() < args.slow
+            slow += is_slow
+            delay = 0.05 if is_slow else 0
+            subscribers.append(subscriber)
+            consumers.append(asyncio.create_task(consume(subscriber, latencies, delay)))
+
+    ops = [{"op": "replace", "path": "/status/health/currentHealth", "value": 7}]
+    started = time.perf_counter()
+    for n in range(args.events):
+        for character_id in characters:
+            await hub.publish(
+                character_id, {"type": "patch", "ops": ops, "sentAt": time.perf_counter()}
+            )
+        await asyncio.sleep(args.interval)  # Let consumers run between bursts
+    while any(s.queue.qsize() and not s.dropped.is_set() for s in subscribers):  # Drain
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    for task in consumers:
+        task.cancel()
+    await hub.stop()
+
+    latencies.sort()
+    stats = hub.stats()
+    print(f"subscribers:        {len(consumers)} ({slow} slow)")
+    print(f"events published:   {stats['published']}")
+    print(f"deliveries:         {len(latencies)} received ({len(latencies) / elapsed:,.0f}/s)")
+    print(f"dropped slow:       {stats['dropped_subscribers']}")
+    print(
+        "latency ms:         "
+        f"p50 {statistics.median(latencies) * 1e3:.2f}  "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1e3:.2f}  "
+        f"max {latencies[-1] * 1e3:.2f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--characters", type=int, default=6, help="Characters in the party")
+    parser.add_argument("--subscribers", type=int, default=300, help="Subscribers per character")
+    parser.add_argument("--events", type=int, default=200, help="Updates per character")
+    parser.add_argument("--interval", type=float, default=0.005, help="Seconds between update bursts")
+    parser.add_argument("--slow", type=float, default=0.02, help="Share of slow subscribers")
+    parser.add_argument("--queue-size", type=int, default=64)
+    random.seed(1)
+    asyncio.run(run(parser.parse_args()))
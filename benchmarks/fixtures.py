@@ -0,0 +1,146 @@
+"""Realistic character sheets in the API shape, shared by the benchmarks"""
+
+import random
+
+SKILLS = {  # 3.5e skill list -> key ability
+    "Appraise": "intelligence",
+    "Balance": "dexterity",
+    "Bluff": "charisma",
+    "Climb": "strength",
+    "Concentration": "constitution",
+    "Craft": "intelligence",
+    "Decipher Script": "intelligence",
+    "Diplomacy": "charisma",
+    "Disable Device": "intelligence",
+    "Disguise": "charisma",
+    "Escape Artist": "dexterity",
+    "Forgery": "intelligence",
+    "Gather Information": "charisma",
+    "Handle Animal": "charisma",
+    "Heal": "wisdom",
+    "Hide": "dexterity",
+    "Intimidate": "charisma",
+    "Jump": "strength",
+    "Knowledge (arcana)": "intelligence",
+    "Knowledge (history)": "intelligence",
+    "Knowledge (religion)": "intelligence",
+    "Knowledge (the planes)": "intelligence",
+    "Listen": "wisdom",
+    "Move Silently": "dexterity",
+    "Open Lock": "dexterity",
+    "Perform": "charisma",
+    "Profession": "wisdom",
+    "Ride": "dexterity",
+    "Search": "intelligence",
+    "Sense Motive": "wisdom",
+    "Sleight of Hand": "dexterity",
+    "Spellcraft": "intelligence",
+    "Spot": "wisdom",
+    "Survival": "wisdom",
+    "Swim": "strength",
+    "Tumble": "dexterity",
+    "Use Magic Device": "charisma",
+    "Use Rope": "dexterity",
+}
+ABILITIES = ["strength", "dexterity", "constitution", "intelligence", "wisdom", "charisma"]
+CLASSES = [
+    ("Fighter", 1, 2, (2, 0, 0)),
+    ("Wizard", 0, 2, (0, 0, 2)),
+    ("Rogue", 0, 8, (0, 2, 0)),
+    ("Cleric", 0, 2, (2, 0, 2)),
+    ("Bard", 0, 6, (0, 2, 2)),
+]
+RACES = [("Human", 0, 4), ("Elf", 0, 0), ("Dwarf", 0, 0), ("Halfling", 0, 0), ("Gnome", 0, 0)]
+
+
+def sample_state(seed: int = 0) -> dict:
+    """A complete State dict with consistent derived values"""
+    rng = random.Random(seed)
+    class_name, bab, skill, (fort, ref, will) = rng.choice(CLASSES)
+    race_name, race_base, race_bonus = rng.choice(RACES)
+    scores = {a: rng.randint(8, 18) for a in ABILITIES}
+    modifiers = {a: (scores[a] - 10) // 2 for a in ABILITIES}
+    level = rng.randint(1, 20)
+    class_skills = rng.sample(sorted(SKILLS), 12)
+
+    def save(base, ability):
+        misc, magic, temp = rng.randint(0, 2), rng.randint(0, 2), 0
+        return {
+            "miscMod": misc,
+            "magicMod": magic,
+            "tempMod": temp,
+            "total": base + modifiers[ability] + misc + magic + temp,
+        }
+
+    skills = {}
+    for name, ability in SKILLS.items():
+        ranks = rng.randint(0, level + 3) if name in class_skills else 0
+        misc = rng.choice([0, 0, 0, 2])
+        skills[name] = {
+            "learned": ranks > 0,
+            "abilityName": ability,
+            "ranks": ranks,
+            "miscMod": misc,
+            "skillMod": ranks + modifiers[ability] + misc,
+        }
+
+    return {
+        "characterDetails": {
+            "characterName": f"{rng.choice(['Ara', 'Bram', 'Cel', 'Dax', 'Eri'])}{seed}",
+            "playerName": f"player{seed % 997}",
+            "characterClass": {
+                "className": class_name,
+                "baseAttack": bab,
+                "baseSkill": skill,
+                "classSkills": class_skills,
+                "specials": ["Bonus Feat"] if class_name == "Fighter" else [],
+                "spells": (
+                    {
+                        "spellsPerDay": {str(i): max(0, 4 - i) for i in range(7)},
+                        "spellsKnown": {str(i): max(0, 6 - i) for i in range(7)},
+                    }
+                    if class_name in ("Wizard", "Cleric", "Bard")
+                    else None
+                ),
+                "baseSave": {"fortitudeBase": fort, "reflexBase": ref, "willBase": will},
+            },
+            "baseAttack": bab,
+            "baseSkill": skill,
+            "race": {"raceName": race_name, "raceBase": race_base, "raceBonus": race_bonus},
+            "alignment": "TRUE_NEUTRAL",
+            "deity": "Pelor",
+            "level": level,
+            "size": {"sizeName": "MEDIUM", "ACMod": 0},
+            "ACMod": 0,
+            "age": rng.randint(16, 120),
+            "sex": rng.choice(["M", "F"]),
+            "height": rng.randint(90, 200),
+            "weight": rng.randint(30, 120),
+            "eyes": "brown",
+            "hair": "black",
+        },
+        "stats": {
+            "scores": scores,
+            "modifiers": modifiers,
+            "tempScores": None,
+            "tempModifiers": None,
+        },
+        "status": {
+            "armorClass": {"aBonus": 4, "naturalArmor": 0, "miscModifier": 0},
+            "health": {"maxHealth": 8 * level, "currentHealth": 8 * level, "damage": 0, "hitDie": 8},
+            "speed": {"speed": 30},
+        },
+        "bonus": {
+            "baseAttackBonus": bab,
+            "initiative": {"initiativeTotal": modifiers["dexterity"], "miscModifier": 0},
+        },
+        "savingThrows": {
+            "fortitude": save(fort, "constitution"),
+            "reflex": save(ref, "dexterity"),
+            "will": save(will, "wisdom"),
+        },
+        "skills": {
+            "skillPoints": {"maximum": (skill + 1) * (level + 3), "current": 0},
+            "skills": skills,
+        },
+    }
@@ -0,0 +1,292 @@
+"""
+Load test: drive the real app through the auth, user and character endpoints and catch regressions.
+
+By default the app from create_app() runs in process behind httpx's ASGI transport, lifespan included,
+so the database in DATABASE_URL (e.g. the compose Postgres) is used directly, or the embedded engine with
+--storage memory when no database is at hand. With --base-url the same scenarios go over real sockets to
+a running server instead.
+
+Every scenario runs --requests iterations spread over --concurrency clients. Results are printed as
+JSON with throughput and p50/p95/p99 latency per operation. With --baseline they are compared against
+a stored run and the process exits 1 if any operation got slower or lost throughput beyond --tolerance.
+
+Usage:
+    python -m benchmarks.loadtest [--scenarios signin verify ...] [--requests 500] [--concurrency 20]
+        [--storage memory] [--base-url http://localhost:8000] [--baseline benchmarks/baselines/local.json [--update-baseline]]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import AsyncExitStack
+
+import httpx
+
+from benchmarks.fixtures import sample_state
+
+SCENARIOS = ("signup", "signin", "refresh", "verify", "user_lookup", "character_crud")
+PASSWORD = "loadtest-password"
+
+
+class Recorder:
+    """Latencies and failures per operation"""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.elapsed: dict[str, float] = {}
+
+    async def call(self, op: str, request, expected: int = 200) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            response = None
+        elapsed = time.perf_counter() - started
+        self.latencies.setdefault(op, [])
+        if response is None or response.status_code != expected:
+            self.errors[op] = self.errors.get(op, 0) + 1
+            return None
+        self.latencies[op].append(elapsed)
+        return response
+
+    def results(self) -> dict:
+        results = {}
+        for op, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            elapsed = self.elapsed.get(op, 0)
+
+            def percentile(p: float) -> float | None:
+                if not latencies:
+                    return None
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e3, 3)
+
+            results[op] = {
+                "requests": len(latencies),
+                "errors": self.errors.get(op, 0),
+                "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+                "p50_ms": percentile(0.50),
+                "p95_ms": percentile(0.95),
+                "p99_ms": percentile(0.99),
+            }
+        return results
+
+
+class Account:
+    def __init__(self, user_id: str, email: str, access_token: str, refresh_token: str):
+        self.user_id = user_id
+        self.email = email
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.refreshing = asyncio.Lock()  # Refresh tokens rotate, a concurrent reuse would revoke them
+
+    @property
+    def auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+
+def _signup_body(tag: str) -> dict:
+    return {
+        "email": f"load_{tag}@example.com",
+        "username": f"load_{tag}"[:30],
+        "password": PASSWORD,
+    }
+
+
+def _refresh_cookie(response: httpx.Response) -> str:
+    """refresh_token from Set-Cookie, read directly as the client's cookie jar drops it over plain http"""
+    for header in response.headers.get_list("set-cookie"):
+        name, _, value = header.split(";", 1)[0].partition("=")
+        if name == "refresh_token":
+            return value
+    raise KeyError("refresh_token")
+
+
+async def create_accounts(client: httpx.AsyncClient, count: int, run_id: str) -> list[Account]:
+    async def create(n: int) -> Account:
+        body = _signup_body(f"{run_id}_{n}")
+        response = await client.post("/users/signup", json=body)
+        response.raise_for_status()
+        user_id = response.json()["id"]
+        response = await client.post("/auth/signin", json={"email": body["email"], "password": PASSWORD})
+        response.raise_for_status()
+        return Account(user_id, body["email"], response.json()["access_token"], _refresh_cookie(response))
+
+    return list(await asyncio.gather(*(create(n) for n in range(count))))
+
+
+# One iteration of each scenario, operations recorded under their own names
+
+
+async def signup(client, recorder, account, n, run_id):
+    await recorder.call("signup", client.post("/users/signup", json=_signup_body(f"{run_id}_s{n}")))
+
+
+async def signin(client, recorder, account, n, run_id):
+    body = {"email": account.email, "password": PASSWORD}
+    await recorder.call("signin", client.post("/auth/signin", json=body))
+
+
+async def refresh(client, recorder, account, n, run_id):
+    async with account.refreshing:
+        headers = {"Cookie": f"refresh_token={account.refresh_token}"}
+        response = await recorder.call("refresh", client.post("/auth/refresh", headers=headers))
+        if response is not None:
+            account.refresh_token = _refresh_cookie(response)
+
+
+async def verify(client, recorder, account, n, run_id):
+    params = {"refresh_token": account.refresh_token}
+    await recorder.call("verify", client.post("/auth/verify", params=params, headers=account.auth))
+
+
+async def user_lookup(client, recorder, account, n, run_id):
+    await recorder.call("user_lookup", client.get(f"/users/{account.user_id}"))
+
+
+async def character_crud(client, recorder, account, n, run_id):
+    created = await recorder.call(
+        "character_create",
+        client.post("/characters", json=sample_state(n), headers=account.auth),
+        expected=201,
+    )
+    if created is None:
+        return
+    path = f"/characters/{created.json()['id']}"
+    await recorder.call("character_get", client.get(path, headers=account.auth))
+    patch = [{"op": "replace", "path": "/health/currentHealth", "value": n % 20}]
+    await recorder.call(
+        "character_patch", client.patch(f"{path}/status", json=patch, headers=account.auth)
+    )
+    await recorder.call("character_list", client.get("/characters", headers=account.auth))
+    await recorder.call("character_delete", client.delete(path, headers=account.auth), expected=204)
+
+
+async def run_scenario(name, client, recorder, accounts, requests, concurrency, run_id) -> None:
+    scenario = globals()[name]
+    iterations = iter(range(requests))
+    before = {op: len(latencies) for op, latencies in recorder.latencies.items()}
+
+    async def client_loop() -> None:
+        for n in iterations:
+            await scenario(client, recorder, accounts[n % len(accounts)], n, run_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    for op, latencies in recorder.latencies.items():
+        if len(latencies) != before.get(op):
+            recorder.elapsed[op] = recorder.elapsed.get(op, 0) + elapsed
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions against a baseline: slower p95/p99, lower throughput or new errors"""
+    problems = []
+    for op, base in baseline.items():
+        current = results.get(op)
+        if current is None:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if base.get(key) and current.get(key) and current[key] > base[key] * (1 + tolerance):
+                problems.append(f"{op}: {key} {current[key]} > baseline {base[key]}")
+        if (
+            base.get("throughput_rps")
+            and current.get("throughput_rps")
+            and current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance)
+        ):
+            problems.append(
+                f"{op}: throughput {current['throughput_rps']} < baseline {base['throughput_rps']}"
+            )
+        if current["errors"] > base.get("errors", 0):
+            problems.append(f"{op}: {current['errors']} errors, baseline {base.get('errors', 0)}")
+    return problems
+
+
+async def run(args) -> dict:
+    async with AsyncExitStack() as stack:
+        if args.base_url:
+            client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+        else:
+            from app import create_app  # After the environment overrides below
+
+            app = create_app()
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=60
+            )
+        await stack.enter_async_context(client)
+
+        run_id = uuid.uuid4().hex[:8]
+        recorder = Recorder()
+        accounts = await create_accounts(client, args.users, run_id)
+        for name in args.scenarios:
+            await run_scenario(
+                name, client, recorder, accounts, args.requests, args.concurrency, run_id
+            )
+        return recorder.results()
+
+
+def main(args) -> int:
+    # Settings are read at import, so overrides go into the environment before the app is loaded
+    if args.hash_rounds:
+        os.environ["PASSWORD_HASH_ROUNDS"] = str(args.hash_rounds)
+    if args.storage:
+        os.environ["STORAGE_BACKEND"] = args.storage
+    if not args.base_url:  # In process every account signs in from the one test client address
+        os.environ.setdefault("LOGIN_THROTTLE_ENABLED", "false")
+
+    results = asyncio.run(run(args))
+    report = {
+        "config": {
+            "target": args.base_url or "asgi",
+            "storage": None if args.base_url else args.storage or os.environ.get("STORAGE_BACKEND", "prisma"),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    if args.update_baseline or not os.path.exists(args.baseline):
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    problems = compare(results, baseline, args.tolerance)
+    if problems:
+        print("PERFORMANCE REGRESSION", file=sys.stderr)
+        for problem in problems:
+            print(f"  {problem}", file=sys.stderr)
+        return 1
+    print(f"No regressions against {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="Iterations per scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients")
+    parser.add_argument("--users", type=int, default=20, help="Accounts created up front")
+    parser.add_argument("--base-url", help="Run over real sockets against this server")
+    parser.add_argument(
+        "--storage", choices=("prisma", "memory"), help="Storage backend of the in-process app"
+    )
+    parser.add_argument("--hash-rounds", type=int, help="bcrypt cost for the in-process app")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    parser.add_argument("--baseline", help="Baseline report to compare against, created if missing")
+    parser.add_argument("--update-baseline", action="store_true", help="Overwrite the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown, 0.2 = 20%%")
+    sys.exit(main(parser.parse_args()))
@@ -1,8 +1,18 @@
 # Entrypoint, app initializer
 
+import uvicorn
 from app import create_app
+from app.config import settings
 
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, reload=True)
+    # Workers need the import string, reload only works with a single process
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=settings.WEB_CONCURRENCY,
+        reload=settings.ENVIRONMENT == "development" and settings.WEB_CONCURRENCY == 1,
+        timeout_graceful_shutdown=settings.SHUTDOWN_DRAIN_SECONDS,
+    )
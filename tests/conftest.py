@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+# Settings are read at import. The Prisma backend runs against TEST_DATABASE_URL, a migrated database
+# the tests may write to, and is skipped without it
+if os.environ.get("TEST_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/unused")
+os.environ.setdefault("JWT_SECRET", "test")
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")  # bcrypt's minimum, sign-ins in tests stay fast
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,113 @@
+import asyncio
+import statistics
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.services.login_throttle import LoginThrottle
+from app.utils.throttle import MemoryThrottleStore
+
+pytestmark = pytest.mark.anyio
+
+PASSWORD = "correct-password"
+
+
+def throttle() -> LoginThrottle:
+    return LoginThrottle(
+        store=MemoryThrottleStore(),
+        ip_rate_per_minute=30,
+        ip_burst=10,
+        email_rate_per_minute=10,
+        email_burst=5,
+        backoff_after=5,
+        backoff_base_seconds=1.0,
+        backoff_max_seconds=900,
+        failure_window_seconds=900,
+        max_concurrent_verifications=8,
+    )
+
+
+async def test_failed_then_correct_sign_in_is_admitted():
+    login = throttle()
+    await login.admit("198.51.100.1", "mira@example.com")
+    await login.failed("mira@example.com")
+    await login.admit("198.51.100.1", "mira@example.com")
+    await login.succeeded("mira@example.com")
+    await login.admit("198.51.100.1", "Mira@Example.com ")
+
+
+async def test_backoff_does_not_touch_the_rate_bucket():
+    login = throttle()
+    for _ in range(5):
+        await login.admit("198.51.100.1", "mira@example.com")
+        await login.failed("mira@example.com")
+    with pytest.raises(HTTPException) as e:
+        await login.admit("198.51.100.2", "mira@example.com")
+    assert e.value.status_code == 429 and int(e.value.headers["Retry-After"]) <= 1
+    assert login.rejected_backoff == 1 and login.rejected_email == 0
+
+
+@pytest.fixture
+async def app():
+    from app import create_app
+
+    app = create_app()
+    async with app.router.lifespan_context(app):
+        yield app
+
+
+def client_for(app, ip: str) -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=app, client=(ip, 40000))
+    return httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60)
+
+
+async def sign_in(client: httpx.AsyncClient, email: str, password: str) -> tuple[int, float]:
+    started = time.perf_counter()
+    response = await client.post("/auth/signin", json={"email": email, "password": password})
+    return response.status_code, time.perf_counter() - started
+
+
+async def test_legitimate_user_during_attack(app):
+    from app.auth import hash_password
+    from app.repositories import users
+
+    hashed = hash_password(PASSWORD)
+    for name in ("baseline", "legit", "victim"):
+        await users.create({"username": name, "email": f"{name}@example.com", "password": hashed})
+
+    async with client_for(app, "10.0.0.1") as client:
+        baseline = [await sign_in(client, "baseline@example.com", PASSWORD) for _ in range(4)]
+    assert [code for code, _ in baseline] == [200] * 4
+
+    attacking = True
+    attack_statuses: dict[int, int] = {}
+
+    async def attacker(client: httpx.AsyncClient, email: str):
+        while attacking:
+            code, _ = await sign_in(client, email, "guess")
+            attack_statuses[code] = attack_statuses.get(code, 0) + 1
+            await asyncio.sleep(0.001)
+
+    # Guesses at the victim, two connections from one abusive IP and the rest sprayed over others
+    clients = [client_for(app, f"192.0.2.{n}") for n in range(9)]
+    attack = [asyncio.create_task(attacker(client, "victim@example.com")) for client in clients]
+    attack.append(asyncio.create_task(attacker(clients[0], "victim@example.com")))
+    try:
+        await asyncio.sleep(0.2)  # Well into the attack, the abusive IP and the victim are limited
+        async with client_for(app, "10.0.0.2") as client:
+            typo = await sign_in(client, "legit@example.com", "correct-pasword")
+            legit = [await sign_in(client, "legit@example.com", PASSWORD) for _ in range(3)]
+    finally:
+        attacking = False
+        await asyncio.gather(*attack)
+        for client in clients:
+            await client.aclose()
+
+    assert typo[0] == 400
+    assert [code for code, _ in legit] == [200] * 3
+    assert attack_statuses[429] > 10 * sum(n for code, n in attack_statuses.items() if code != 429)
+    # Attackers are turned away before any bcrypt work, so they do not slow the legitimate user down
+    expected = statistics.median(latency for _, latency in baseline)
+    assert max(latency for _, latency in legit) < 5 * expected + 0.05
@@ -0,0 +1,234 @@
+"""
+Contract of app.repositories.base, run against every storage backend.
+
+The Prisma backend needs TEST_DATABASE_URL pointing at a database with the migrations applied and a
+generated client, it is skipped otherwise. Each test works on users and characters of its own, so the
+database does not have to be empty.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.repositories.base import JSON_COLUMNS, CharacterFilters, DuplicateError
+from app.utils.pagination import decode_cursor, encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["memory", "prisma"])
+async def storage(request):
+    if request.param == "memory":
+        from app.repositories.memory import MemoryStorage
+
+        backend = MemoryStorage()
+    else:
+        if not os.environ.get("TEST_DATABASE_URL"):
+            pytest.skip("TEST_DATABASE_URL is not set")
+        try:
+            from app.repositories.prisma_backend import PrismaStorage
+        except ImportError as e:  # Client not generated
+            pytest.skip(f"Prisma client unavailable: {e}")
+        backend = PrismaStorage()
+    await backend.connect()
+    yield backend
+    await backend.disconnect()
+
+
+async def create_user(storage, email: str | None = None) -> str:
+    user = await storage.users.create(
+        {
+            "username": "tester",
+            "email": email or f"{uuid.uuid4().hex}@example.com",
+            "password": None,
+            "oauth_provider": "manual",
+            "oauth_id": None,
+        }
+    )
+    return user.id
+
+
+def character(
+    user_id: str, name: str = "Mira", characterClass: str = "Rogue", race: str = "Elf", level: int = 1
+) -> dict:
+    return {
+        "userId": user_id,
+        "characterName": name,
+        "characterClass": characterClass,
+        "race": race,
+        "level": level,
+        **{column: {"column": column} for column in JSON_COLUMNS if column != "inventory"},
+    }
+
+
+async def test_duplicate_email(storage):
+    email = f"{uuid.uuid4().hex}@example.com"
+    await create_user(storage, email)
+    with pytest.raises(DuplicateError):
+        await create_user(storage, email)
+
+
+async def test_duplicate_version(storage):
+    created = await storage.characters.create(character(await create_user(storage)))
+    row = {"characterId": created.id, "version": 1, "snapshot": True, "data": {"a": 1}, "size": 8}
+    await storage.character_versions.append(row)
+    with pytest.raises(DuplicateError):
+        await storage.character_versions.append(row)
+
+
+async def test_duplicate_session(storage):
+    user_id = await create_user(storage)
+    session = {
+        "id": str(uuid.uuid4()),
+        "familyId": str(uuid.uuid4()),
+        "userId": user_id,
+        "expiresAt": datetime.now(timezone.utc) + timedelta(days=1),
+    }
+    await storage.sessions.create(session)
+    await storage.sessions.rotate(session["id"], {**session, "id": str(uuid.uuid4())})
+    with pytest.raises(DuplicateError):
+        await storage.sessions.create(session)
+    assert (await storage.sessions.find_by_id(session["id"])).usedAt is not None  # Not reset
+
+
+async def test_reads_return_fresh_objects(storage):
+    created = await storage.characters.create(character(await create_user(storage)))
+    _, stats = await storage.characters.get_column(created.id, "stats")
+    stats["column"] = "changed"
+    assert await storage.characters.get_column(created.id, "stats") == (created.userId, {"column": "stats"})
+
+
+async def test_writes_to_deleted_character_are_ignored(storage):
+    characters = storage.characters
+    created = await characters.create(character(await create_user(storage)))
+    await storage.character_versions.append(
+        {"characterId": created.id, "version": 1, "snapshot": True, "data": {"a": 1}, "size": 8}
+    )
+    assert await characters.delete(created.id) is True
+
+    await characters.update(created.id, {"level": 2})
+    await characters.update_many([(created.id, {"level": 3})])
+    assert await characters.delete(created.id) is False
+    assert await characters.find_by_id(created.id) is None
+    assert await characters.owner_of(created.id) is None
+    assert await characters.get_column(created.id, "stats") is None
+    assert await storage.character_versions.chain(created.id) == []
+
+
+async def test_list_page_keyset_order(storage):
+    user_id = await create_user(storage)
+    for n in range(5):
+        await storage.characters.create(character(user_id, name=f"Mira {n}"))
+
+    seen, after = [], None
+    while True:
+        rows = await storage.characters.list_page(user_id, 2, after, ["characterName"])
+        if not rows:
+            break
+        assert len(rows) <= 2
+        seen += rows
+        after = decode_cursor(encode_cursor(rows[-1]["createdAt"], rows[-1]["id"]))
+
+    keys = [(row["createdAt"], str(row["id"])) for row in seen]
+    assert keys == sorted(keys) and len(set(keys)) == 5
+    assert sorted(row["characterName"] for row in seen) == [f"Mira {n}" for n in range(5)]
+
+
+async def test_rotate_is_atomic(storage):
+    user_id = await create_user(storage)
+    family_id = str(uuid.uuid4())
+    expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+
+    def session() -> dict:
+        return {"id": str(uuid.uuid4()), "familyId": family_id, "userId": user_id, "expiresAt": expires_at}
+
+    first = session()
+    await storage.sessions.create(first)
+    results = await asyncio.gather(*(storage.sessions.rotate(first["id"], session()) for _ in range(10)))
+    assert results.count(True) == 1
+    assert (await storage.sessions.find_by_id(first["id"])).usedAt is not None
+
+    successor = session()
+    await storage.sessions.create(successor)
+    await storage.sessions.revoke_family(family_id)
+    assert await storage.sessions.rotate(successor["id"], session()) is False
+
+
+async def test_update_many(storage):
+    user_id = await create_user(storage)
+    first = await storage.characters.create(character(user_id))
+    second = await storage.characters.create(character(user_id))
+    deleted = await storage.characters.create(character(user_id))
+    await storage.characters.delete(deleted.id)
+
+    await storage.characters.update_many(
+        [
+            (first.id, {"level": 5, "stats": {"column": "first"}}),
+            (deleted.id, {"level": 5}),
+            (second.id, {"level": 5, "stats": {"column": "second"}}),
+        ]
+    )
+    for created, stats in ((first, "first"), (second, "second")):
+        row = await storage.characters.find_by_id(created.id)
+        assert row.level == 5 and row.stats == {"column": stats}
+        assert row.updatedAt >= created.updatedAt
+    # Search columns are reindexed with the write
+    rows = await storage.characters.search(
+        None, False, CharacterFilters(userId=user_id, min_level=5), 10, None, 0.3
+    )
+    assert {str(row["id"]) for row in rows} == {first.id, second.id}
+
+
+async def test_search(storage):
+    user_id = await create_user(storage)
+    prefix = f"Zq{uuid.uuid4().hex[:6]}"
+    for name in ("Mira", "Miro", "Borin"):
+        await storage.characters.create(character(user_id, name=f"{prefix} {name}"))
+    await storage.characters.create(character(user_id, name=f"{prefix} Mirabel", race="Human"))
+    mine = CharacterFilters(userId=user_id)
+
+    rows = await storage.characters.search(f"{prefix.upper()} MI", False, mine, 10, None, 0.3)
+    assert [row["characterName"] for row in rows] == [f"{prefix} {n}" for n in ("Mira", "Mirabel", "Miro")]
+    assert rows[0]["nameKey"] == f"{prefix} mira".lower()
+    rest = await storage.characters.search(
+        f"{prefix} mi", False, mine, 10, (rows[0]["nameKey"], str(rows[0]["id"])), 0.3
+    )
+    assert rest == rows[1:]
+
+    elves = CharacterFilters(userId=user_id, race="Elf")
+    rows = await storage.characters.search(f"{prefix} Mira", True, elves, 10, None, 0.3)
+    assert rows[0]["characterName"] == f"{prefix} Mira"
+    assert [row["score"] for row in rows] == sorted((row["score"] for row in rows), reverse=True)
+    assert all(row["race"] == "Elf" for row in rows)
+
+
+async def test_aggregate(storage):
+    user_id = await create_user(storage)
+    before = await storage.characters.aggregate()
+    created = [
+        await storage.characters.create(character(user_id, characterClass="Bard", level=level))
+        for level in (1, 1, 2)
+    ]
+    after = await storage.characters.aggregate()
+    assert after["total"] - before["total"] == 3
+    assert after["characterClass"]["Bard"] - before["characterClass"].get("Bard", 0) == 3
+    assert after["level"][1] - before["level"].get(1, 0) == 2
+    assert after["userId"][user_id] == 3
+
+    await storage.characters.delete(created[0].id)
+    assert (await storage.characters.aggregate())["userId"][user_id] == 2
+
+
+async def test_catalog_references(storage):
+    user_id = await create_user(storage)
+    class_id = f"class-{uuid.uuid4().hex}"
+    referencing = character(user_id)
+    referencing["characterDetails"] = {"characterClass": class_id, "race": {"raceName": class_id}}
+    await storage.characters.create(referencing)
+
+    references = await storage.characters.catalog_references(["characterClass", "race"])
+    assert class_id in references["characterClass"]
+    assert class_id not in references["race"]  # Embedded entries are not references